@@ -0,0 +1,470 @@
+"""
+Async Worker Runtime
+
+Alternative to the prefork/solo Celery worker for the I/O-bound reply
+pipeline. One long-lived event loop per process runs many task coroutines
+concurrently, consuming the same Redis broker queues Celery publishes to:
+- Messages move atomically into a per-consumer processing list, so a crash
+  never loses a task - every consumer heartbeats, and the lists of
+  consumers whose heartbeat expired are put back on their queues
+- Results go through the Celery result backend, so AsyncResult, chords and
+  /task-status keep working
+- SIGTERM/SIGINT stops fetching and drains in-flight tasks
+
+Run with:
+    python async_worker.py --queues interactive,scheduled --concurrency 20
+"""
+import sys
+import os
+
+# Ensure the backend directory is in Python path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+import argparse
+import asyncio
+import base64
+import inspect
+import json
+import logging
+import signal
+import socket
+import time
+import traceback
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import redis.asyncio as redis
+from celery import signature
+from celery.app.task import Context
+
+from config import settings
+from worker import celery_app, get_redis_url, check_queue_latency
+from services.metrics import TASK_SECONDS, start_exporter
+from utils.log import bind_context, configure_logging
+from utils.tracing import activate, configure_tracing, span
+from tasks import ASYNC_TASKS
+
+logger = logging.getLogger(__name__)
+
+PROCESSING_PREFIX = "async_worker:processing:"
+# A consumer whose heartbeat is older than this is presumed dead and its
+# processing lists are recovered by the next consumer to look
+HEARTBEAT_TTL = 60
+
+
+class AsyncTaskConsumer:
+    """Consume Celery task messages from Redis and run them on one event loop"""
+
+    def __init__(
+        self,
+        queues: List[str],
+        concurrency: int = 20,
+        drain_seconds: int = 30,
+        poll_interval: float = 0.5,
+        name: Optional[str] = None
+    ):
+        self.queues = queues  # Listed in priority order
+        self.concurrency = concurrency
+        self.drain_seconds = drain_seconds
+        self.poll_interval = poll_interval
+        # Unique per process - several consumers can share a host or dyno.
+        # No ':' in it, so processing keys split cleanly into name and queue.
+        host = (os.getenv("DYNO") or socket.gethostname()).replace(":", "-")
+        self.name = name or f"{host}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.redis: Optional[redis.Redis] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._in_flight: set = set()
+
+    def _processing_key(self, queue: str) -> str:
+        return f"{PROCESSING_PREFIX}{self.name}:{queue}"
+
+    @staticmethod
+    def _heartbeat_key(name: str) -> str:
+        return f"async_worker:heartbeat:{name}"
+
+    # ============================================
+    # LIFECYCLE
+    # ============================================
+
+    async def run(self):
+        """Fetch and execute tasks until stopped, then drain"""
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._stopping = asyncio.Event()
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self._stopping.set)
+
+        await self._startup()
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+        try:
+            while not self._stopping.is_set():
+                if not await self._acquire_slot():
+                    break
+
+                try:
+                    fetched = await self._fetch()
+                except Exception as e:
+                    self._slots.release()
+                    logger.error("Broker fetch failed: %s", e)
+                    await self._sleep_unless_stopping(self.poll_interval * 4)
+                    continue
+
+                if fetched is None:
+                    self._slots.release()
+                    await self._sleep_unless_stopping(self.poll_interval)
+                    continue
+
+                queue, raw = fetched
+                task = asyncio.create_task(self._handle(queue, raw))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+        finally:
+            await self._drain()
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            await self._shutdown()
+
+    async def _startup(self):
+        from dotenv import load_dotenv
+        load_dotenv()
+
+        self.redis = redis.from_url(get_redis_url(), encoding="utf-8", decode_responses=True)
+        await self.redis.ping()
+
+        # Initialize Redis cache if available
+        try:
+            from services.cache import init_cache
+            await init_cache()
+        except Exception as e:
+            logger.warning("Redis cache init failed: %s", e)
+
+        # Alive before the first fetch, so nobody recovers our lists
+        await self._beat()
+        await self._recover_dead_consumers()
+
+        logger.info(
+            "Async worker started: name=%s queues=%s concurrency=%d",
+            self.name, ",".join(self.queues), self.concurrency
+        )
+
+        if settings.WORKER_METRICS_PORT:
+            port = start_exporter(settings.WORKER_METRICS_PORT)
+            logger.info("Metrics exporter on http://0.0.0.0:%d/metrics", port)
+
+    async def _drain(self):
+        """Give in-flight tasks the grace period, then requeue what's left"""
+        if self._in_flight:
+            logger.info("Draining %d in-flight tasks (up to %ds)", len(self._in_flight), self.drain_seconds)
+            _, pending = await asyncio.wait(set(self._in_flight), timeout=self.drain_seconds)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                logger.warning("%d tasks cancelled - returning them to the queue", len(pending))
+
+        await self._recover()
+
+    async def _shutdown(self):
+        import database_pg
+        await database_pg.close_db()
+
+        if settings.USE_REDIS:
+            from services.cache import close_cache
+            await close_cache()
+
+        if self.redis:
+            await self.redis.delete(self._heartbeat_key(self.name))
+            await self.redis.close()
+
+        logger.info("Async worker stopped")
+
+    async def _acquire_slot(self) -> bool:
+        """Wait for a free concurrency slot - False if asked to stop meanwhile"""
+        acquire = asyncio.ensure_future(self._slots.acquire())
+        stop = asyncio.ensure_future(self._stopping.wait())
+        await asyncio.wait({acquire, stop}, return_when=asyncio.FIRST_COMPLETED)
+        stop.cancel()
+
+        if not acquire.done():
+            acquire.cancel()
+            return False
+        if self._stopping.is_set():
+            self._slots.release()
+            return False
+        return True
+
+    async def _sleep_unless_stopping(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    # ============================================
+    # BROKER
+    # ============================================
+
+    async def _fetch(self) -> Optional[tuple]:
+        """Move the oldest message of the first non-empty queue into our processing list"""
+        for queue in self.queues:
+            # Producers LPUSH, so the oldest message sits at the right end
+            raw = await self.redis.lmove(queue, self._processing_key(queue), 'RIGHT', 'LEFT')
+            if raw is not None:
+                return queue, raw
+        return None
+
+    async def _ack(self, queue: str, raw: str):
+        await self.redis.lrem(self._processing_key(queue), 1, raw)
+
+    async def _requeue(self, processing_key: str, queue: str):
+        """Move a processing list back to the front of its queue"""
+        recovered = 0
+        while await self.redis.lmove(processing_key, queue, 'RIGHT', 'RIGHT'):
+            recovered += 1
+        if recovered:
+            logger.warning("Returned %d unfinished messages from %s to '%s'", recovered, processing_key, queue)
+
+    async def _recover(self):
+        """Put messages this consumer was holding back at the front of their queues"""
+        for queue in self.queues:
+            await self._requeue(self._processing_key(queue), queue)
+
+    async def _recover_dead_consumers(self):
+        """Requeue the processing lists of consumers that stopped heartbeating
+
+        Covers crashed consumers on any host, whatever queues they served.
+        Lists of live consumers are left alone - they're still running them.
+        """
+        async for key in self.redis.scan_iter(match=f"{PROCESSING_PREFIX}*"):
+            name, _, queue = key[len(PROCESSING_PREFIX):].partition(":")
+            if not queue or name == self.name:
+                continue
+            if await self.redis.exists(self._heartbeat_key(name)):
+                continue
+            await self._requeue(key, queue)
+
+    # ============================================
+    # HEARTBEAT
+    # ============================================
+
+    async def _beat(self):
+        await self.redis.set(self._heartbeat_key(self.name), int(time.time()), ex=HEARTBEAT_TTL)
+
+    async def _heartbeat_loop(self):
+        """Refresh our heartbeat and sweep up after dead consumers"""
+        while True:
+            await asyncio.sleep(HEARTBEAT_TTL / 3)
+            try:
+                await self._beat()
+                await self._recover_dead_consumers()
+            except Exception as e:
+                logger.warning("Heartbeat failed: %s", e)
+
+    @staticmethod
+    def _decode(raw: str) -> Dict:
+        """Decode a kombu/Celery message envelope (task protocol 1 or 2)"""
+        envelope = json.loads(raw)
+        headers = envelope.get('headers') or {}
+        properties = envelope.get('properties') or {}
+
+        if envelope.get('content-type') not in (None, 'application/json'):
+            raise ValueError(f"Unsupported content type {envelope.get('content-type')}")
+
+        body = envelope['body']
+        if properties.get('body_encoding') == 'base64':
+            body = base64.b64decode(body)
+        payload = json.loads(body)
+
+        if 'task' in headers:
+            # Protocol 2: metadata in headers, body is [args, kwargs, embed]
+            args, kwargs, embed = payload
+            return {
+                'id': headers['id'],
+                'task': headers['task'],
+                'args': args,
+                'kwargs': kwargs,
+                'retries': headers.get('retries') or 0,
+                'eta': headers.get('eta'),
+                'timelimit': headers.get('timelimit'),
+                'group': headers.get('group'),
+                'group_index': headers.get('group_index'),
+                'root_id': headers.get('root_id'),
+                'parent_id': headers.get('parent_id'),
+                'published_at': headers.get('published_at'),
+                'traceparent': headers.get('traceparent'),
+                'callbacks': embed.get('callbacks'),
+                'errbacks': embed.get('errbacks'),
+                'chain': embed.get('chain'),
+                'chord': embed.get('chord'),
+            }
+
+        # Protocol 1: everything lives in the body
+        return {
+            'id': payload['id'],
+            'task': payload['task'],
+            'args': payload.get('args') or [],
+            'kwargs': payload.get('kwargs') or {},
+            'retries': payload.get('retries') or 0,
+            'eta': payload.get('eta'),
+            'timelimit': payload.get('timelimit'),
+            'group': payload.get('taskset'),
+            'group_index': None,
+            'root_id': None,
+            'parent_id': None,
+            'published_at': None,
+            'traceparent': None,
+            'callbacks': payload.get('callbacks'),
+            'errbacks': payload.get('errbacks'),
+            'chain': None,
+            'chord': payload.get('chord'),
+        }
+
+    # ============================================
+    # EXECUTION
+    # ============================================
+
+    async def _handle(self, queue: str, raw: str):
+        try:
+            await self._execute(queue, self._decode(raw))
+        except asyncio.CancelledError:
+            # Not acked - stays in the processing list and _recover() requeues it
+            raise
+        except Exception as e:
+            logger.exception("Dropping unprocessable message from '%s': %s", queue, e)
+            await self._ack(queue, raw)
+        else:
+            await self._ack(queue, raw)
+        finally:
+            self._slots.release()
+
+    async def _execute(self, queue: str, message: Dict):
+        # Each message runs in its own asyncio task, so this stays per-task
+        bind_context(task_id=message['id'], task=message['task'])
+        activate(message['traceparent'])
+        backend = celery_app.backend
+        request = Context(
+            id=message['id'],
+            task=message['task'],
+            args=message['args'],
+            kwargs=message['kwargs'],
+            retries=message['retries'],
+            group=message['group'],
+            group_index=message['group_index'],
+            root_id=message['root_id'],
+            parent_id=message['parent_id'],
+            callbacks=message['callbacks'],
+            errbacks=message['errbacks'],
+            chain=message['chain'],
+            chord=message['chord'],
+            delivery_info={'routing_key': queue},
+            hostname=self.name,
+        )
+
+        check_queue_latency(queue, message['published_at'], message['task'])
+
+        func = ASYNC_TASKS.get(message['task'])
+        if func is None:
+            error = NotImplementedError(f"Task {message['task']} has no async implementation")
+            await asyncio.to_thread(backend.mark_as_failure, message['id'], error, None, request)
+            return
+
+        # Honour countdown/eta - the slot stays reserved while we wait
+        if message['eta']:
+            eta = datetime.fromisoformat(message['eta'])
+            if eta.tzinfo is None:
+                eta = eta.replace(tzinfo=timezone.utc)
+            delay = (eta - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        # Celery sends timelimit as [soft, hard]
+        timelimit = message['timelimit'] or (None, None)
+        hard_limit = timelimit[1] or celery_app.conf.task_time_limit
+
+        kwargs = message['kwargs']
+        if 'attempt' in inspect.signature(func).parameters:
+            # Retry-aware coroutines get the retry count (self.request.retries under Celery)
+            kwargs = {**kwargs, 'attempt': message['retries']}
+
+        started = time.perf_counter()
+        try:
+            with span(f"task {message['task']}", task_id=message['id'], queue=queue):
+                result = await asyncio.wait_for(
+                    func(*message['args'], **kwargs),
+                    timeout=hard_limit
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            TASK_SECONDS.observe(time.perf_counter() - started, task=message['task'], status='failure')
+            tb = traceback.format_exc()
+            if await self._maybe_retry(queue, message, request, exc, tb):
+                return
+            logger.error("Task %s[%s] failed: %s", message['task'], message['id'], exc, exc_info=exc)
+            await asyncio.to_thread(backend.mark_as_failure, message['id'], exc, tb, request)
+            return
+
+        TASK_SECONDS.observe(time.perf_counter() - started, task=message['task'], status='success')
+
+        # mark_as_done also reports chord parts, so chord callbacks fire as usual
+        await asyncio.to_thread(backend.mark_as_done, message['id'], result, request)
+
+        for callback in message['callbacks'] or []:
+            await asyncio.to_thread(
+                signature(callback, app=celery_app).apply_async, (result,)
+            )
+
+    async def _maybe_retry(self, queue: str, message: Dict, request: Context, exc: Exception, tb: str) -> bool:
+        """Republish the message if the Celery task declares autoretry for this error"""
+        task = celery_app.tasks.get(message['task'])
+        autoretry_for = tuple(getattr(task, 'autoretry_for', ()) or ())
+        if not autoretry_for or not isinstance(exc, autoretry_for):
+            return False
+
+        max_retries = task.max_retries
+        if max_retries is not None and message['retries'] >= max_retries:
+            return False
+
+        logger.warning(
+            "Retrying %s[%s] in %ss: %s", message['task'], message['id'], task.default_retry_delay, exc
+        )
+        await asyncio.to_thread(celery_app.backend.mark_as_retry, message['id'], exc, tb, request)
+        await asyncio.to_thread(
+            celery_app.send_task,
+            message['task'],
+            args=message['args'],
+            kwargs=message['kwargs'],
+            task_id=message['id'],
+            countdown=task.default_retry_delay,
+            retries=message['retries'] + 1,
+            queue=queue,
+        )
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async-native task worker")
+    parser.add_argument("--queues", default=settings.ASYNC_WORKER_QUEUES,
+                        help="Comma-separated queues, highest priority first")
+    parser.add_argument("--concurrency", type=int, default=settings.ASYNC_WORKER_CONCURRENCY)
+    parser.add_argument("--drain-seconds", type=int, default=settings.ASYNC_WORKER_DRAIN_SECONDS)
+    args = parser.parse_args()
+
+    configure_logging()
+    configure_tracing()
+    consumer = AsyncTaskConsumer(
+        queues=[q.strip() for q in args.queues.split(',') if q.strip()],
+        concurrency=args.concurrency,
+        drain_seconds=args.drain_seconds,
+        poll_interval=settings.ASYNC_WORKER_POLL_INTERVAL,
+    )
+    asyncio.run(consumer.run())
+
+
+if __name__ == '__main__':
+    main()
@@ -35,6 +35,10 @@ class Settings(BaseSettings):
     GOOGLE_CLIENT_SECRET: str = os.getenv("GOOGLE_CLIENT_SECRET", "")
     REDIRECT_URI: str = os.getenv("REDIRECT_URI", "http://localhost:8000/api/auth/callback")
     
+    # Google endpoints - point both at tests/fake_youtube.py for offline runs
+    YOUTUBE_API_BASE_URL: str = os.getenv("YOUTUBE_API_BASE_URL", "https://www.googleapis.com/youtube/v3")
+    GOOGLE_OAUTH_TOKEN_URL: str = os.getenv("GOOGLE_OAUTH_TOKEN_URL", "https://oauth2.googleapis.com/token")
+    
     # YouTube API (REQUIRED - set in environment variables)
     YOUTUBE_API_KEY: str = os.getenv("YOUTUBE_API_KEY", "")
     
@@ -43,6 +47,43 @@ class Settings(BaseSettings):
     USER_DAILY_REPLY_LIMIT: int = 500  # Per-user limit to prevent hogging
     REPLY_COST: int = 50
     FETCH_COST: int = 1
+    QUOTA_BURST_FRACTION: float = 0.2  # Share of the daily limit spendable up front; the rest is released evenly over the day
+    QUOTA_READ_PAGES_PER_VIDEO: int = 2  # Comment pages budgeted per video per tick
+    
+    # Pacing
+    HUMAN_DELAY_SCALE: float = 1.0  # Multiplier for human-like pauses, page pacing and per-channel staggering (0 = none, for benchmarks)
+    
+    # Channel sync
+    SYNC_MAX_NEW_VIDEOS: int = 500  # Cap on new uploads fetched per sync (stats refresh covers all known videos)
+    
+    # Adaptive polling
+    ADAPTIVE_TARGET_COMMENTS_PER_CHECK: float = 5.0  # Aim for this many new comments per check
+    ADAPTIVE_RATE_SMOOTHING: float = 0.3  # EWMA weight of the latest observed rate
+    ADAPTIVE_MIN_INTERVAL_MINUTES: int = 5
+    ADAPTIVE_MAX_INTERVAL_MINUTES: int = 1440
+    
+    # Reply outbox delivery
+    OUTBOX_CLAIM_TIMEOUT_SECONDS: int = 300  # Claims older than this are presumed dead and reclaimed
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    
+    # Worker runtime
+    WORKER_DB_POOL_MAX_SIZE: int = 2  # Raise for the async worker, which shares one pool across many tasks
+    ASYNC_WORKER_QUEUES: str = "interactive,scheduled,bulk,cache"  # Comma-separated broker queues, highest priority first
+    ASYNC_WORKER_CONCURRENCY: int = 20  # Task coroutines running at once per process
+    ASYNC_WORKER_DRAIN_SECONDS: int = 30  # Grace period for in-flight tasks on shutdown
+    ASYNC_WORKER_POLL_INTERVAL: float = 0.5
+    
+    # Observability
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json" if "DYNO" in os.environ else "text"  # JSON lines on Heroku, readable text locally
+    LOG_LEVELS: str = ""  # Per-module overrides, e.g. "services.youtube_client=WARNING,tasks=DEBUG"
+    LOG_SAMPLE_BURST: int = 20  # Identical INFO/DEBUG messages allowed per window (0 = no sampling)
+    LOG_SAMPLE_WINDOW_SECONDS: float = 60.0
+    TRACING_EXPORTER: str = ""  # "console", "file" or "otel" (opentelemetry API); empty = off
+    TRACING_FILE: str = "traces.jsonl"  # JSON lines, one span each (TRACING_EXPORTER=file)
+    TRACING_SAMPLE_RATE: float = 1.0  # Fraction of traces recorded
+    METRICS_TOKEN: str = ""  # If set, /metrics requires "Authorization: Bearer <token>"
+    WORKER_METRICS_PORT: int = 0  # Worker processes serve /metrics from this port upward (0 = off)
     
     class Config:
         env_file = ".env"
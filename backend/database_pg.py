@@ -9,17 +9,36 @@ Features:
 import asyncpg
 from asyncpg.pool import Pool
 from contextlib import asynccontextmanager
-from typing import Optional, List, Dict, Set
+from typing import Optional, List, Dict, Set, Tuple
 from datetime import datetime
 import json
+import logging
 import os
+import time
 
 from config import settings
+from services.metrics import DB_ACQUIRE_SECONDS, DB_QUERIES
+from utils.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 # Connection pool - global instance
 pool: Optional[Pool] = None
 
 
+def _connection_init(pool_name: str):
+    """Per-connection setup: count statements for reply_db_queries_total"""
+    def count_query(record):
+        # Skip the pool's own reset on release
+        if "RESET ALL" not in record.query:
+            DB_QUERIES.inc(pool=pool_name)
+
+    async def init(conn):
+        if hasattr(conn, "add_query_logger"):  # asyncpg >= 0.29
+            conn.add_query_logger(count_query)
+    return init
+
+
 async def init_db():
     """Initialize PostgreSQL connection pool and create tables"""
     global pool
@@ -45,6 +64,7 @@ async def init_db():
             max_inactive_connection_lifetime=300,
             command_timeout=60,
             ssl=ssl_context,
+            init=_connection_init("web"),
         )
     else:
         # Local development - can use larger pool
@@ -54,6 +74,7 @@ async def init_db():
             max_size=20,
             max_inactive_connection_lifetime=300,
             command_timeout=60,
+            init=_connection_init("web"),
         )
     
     # Create tables
@@ -132,6 +153,31 @@ async def init_db():
         except Exception as e:
             print(f"Note: replied_comments table creation skipped: {e}")
         
+        # Reply outbox table (reply intents awaiting delivery to YouTube)
+        try:
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS reply_outbox (
+                    id SERIAL PRIMARY KEY,
+                    comment_id VARCHAR(255) UNIQUE NOT NULL,
+                    video_id VARCHAR(255) NOT NULL,
+                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                    comment_text TEXT,
+                    comment_author VARCHAR(255),
+                    keyword_matched VARCHAR(100),
+                    reply_text TEXT NOT NULL,
+                    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    reply_id VARCHAR(255),
+                    claimed_at TIMESTAMP,
+                    sent_at TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    updated_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+        except Exception as e:
+            print(f"Note: reply_outbox table creation skipped: {e}")
+        
         # Create indexes for fast lookups - wrap all in try-except
         try:
             await conn.execute("""
@@ -158,6 +204,14 @@ async def init_db():
             """)
         except:
             pass
+        try:
+            # Keyset pagination for the video list (newest first)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_videos_user_published 
+                ON videos(user_id, (COALESCE(published_at, '-infinity'::timestamp)) DESC, id DESC)
+            """)
+        except:
+            pass
         try:
             await conn.execute("""
                 CREATE UNIQUE INDEX IF NOT EXISTS idx_comment_id_unique 
@@ -186,6 +240,22 @@ async def init_db():
             """)
         except:
             pass
+        try:
+            # Dashboard: a user's replies newest first / within a window
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_replied_user_time 
+                ON replied_comments(user_id, replied_at DESC)
+            """)
+        except:
+            pass
+        try:
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_outbox_deliverable 
+                ON reply_outbox(user_id, video_id, id) 
+                WHERE status IN ('pending', 'sending')
+            """)
+        except:
+            pass
 
         # User Templates table
         try:
@@ -215,6 +285,24 @@ async def init_db():
             """)
         except:
             pass
+        
+        # Migration: Adaptive polling columns
+        try:
+            await conn.execute("""
+                ALTER TABLE videos 
+                ADD COLUMN IF NOT EXISTS adaptive_schedule BOOLEAN DEFAULT FALSE,
+                ADD COLUMN IF NOT EXISTS min_interval_minutes INTEGER DEFAULT 5,
+                ADD COLUMN IF NOT EXISTS max_interval_minutes INTEGER DEFAULT 1440,
+                ADD COLUMN IF NOT EXISTS comment_rate_per_hour DOUBLE PRECISION,
+                ADD COLUMN IF NOT EXISTS newest_comment_at TIMESTAMP,
+                ADD COLUMN IF NOT EXISTS next_check_at TIMESTAMP
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_videos_next_check 
+                ON videos(next_check_at) WHERE auto_reply_enabled = true
+            """)
+        except:
+            pass
     
     print("✓ PostgreSQL database initialized with connection pool")
 
@@ -241,7 +329,9 @@ def get_pool() -> Pool:
 async def get_db_connection():
     """Get a connection from the pool"""
     p = get_pool()
+    started = time.perf_counter()
     async with p.acquire() as conn:
+        DB_ACQUIRE_SECONDS.observe(time.perf_counter() - started, pool="web")
         yield conn
 
 
@@ -268,16 +358,17 @@ async def get_or_create_worker_pool() -> Pool:
         ssl_context.verify_mode = ssl.CERT_NONE
     
     # Worker pool: very conservative settings for Celery
-    # Max 2 connections shared across all worker tasks
+    # Default 2 connections shared across all worker tasks
     worker_pool = await asyncpg.create_pool(
         dsn=settings.db_url,
         min_size=1,
-        max_size=2,  # Only 2 connections for all Celery tasks
+        max_size=settings.WORKER_DB_POOL_MAX_SIZE,
         max_inactive_connection_lifetime=60,  # Close idle connections quickly
         command_timeout=60,
         ssl=ssl_context,
+        init=_connection_init("worker"),
     )
-    print("✓ Worker connection pool created (max_size=2)")
+    logger.info("Worker connection pool created (max_size=%d)", settings.WORKER_DB_POOL_MAX_SIZE)
     return worker_pool
 
 
@@ -287,15 +378,33 @@ async def get_direct_connection():
     Uses a dedicated pool to prevent connection exhaustion.
     """
     worker_p = await get_or_create_worker_pool()
+    started = time.perf_counter()
     async with worker_p.acquire() as conn:
+        DB_ACQUIRE_SECONDS.observe(time.perf_counter() - started, pool="worker")
         yield conn
 
 
+@asynccontextmanager
+async def acquire_connection(use_direct: bool = False):
+    """Get a connection from the web pool, falling back to the worker pool
+    when the web pool isn't initialized (Celery worker)
+    """
+    if use_direct or pool is None:
+        async with get_direct_connection() as conn:
+            yield conn
+    else:
+        started = time.perf_counter()
+        async with pool.acquire() as conn:
+            DB_ACQUIRE_SECONDS.observe(time.perf_counter() - started, pool="web")
+            yield conn
+
+
 
 # ============================================
 # USER FUNCTIONS
 # ============================================
 
+@traced("db.get_user_by_id")
 async def get_user_by_id(user_id: int, use_direct=False) -> Optional[Dict]:
     """Get user by ID"""
     # Auto-use direct connection if pool not initialized (Celery worker)
@@ -325,6 +434,7 @@ async def get_user_by_google_id(google_id: str) -> Optional[Dict]:
         return dict(row) if row else None
 
 
+@traced("db.update_user_tokens")
 async def update_user_tokens(user_id: int, access_token: str, token_expiry: datetime = None):
     """Update user's access token after OAuth refresh"""
     query = """
@@ -339,7 +449,7 @@ async def update_user_tokens(user_id: int, access_token: str, token_expiry: date
     else:
         async with pool.acquire() as conn:
             await conn.execute(query, access_token, token_expiry, user_id)
-    print(f"✅ Updated tokens for user {user_id}, expires: {token_expiry}")
+    logger.info("Updated tokens for user %s, expires: %s", user_id, token_expiry)
 
 
 async def create_or_update_user(
@@ -395,44 +505,176 @@ async def get_user_videos(user_id: int) -> List[Dict]:
         return videos
 
 
+# Columns the video list needs - description and the JSONB settings are
+# only served by the per-video settings endpoint
+VIDEO_LIST_COLUMNS = """
+    id, video_id, title, thumbnail_url, published_at,
+    view_count, comment_count, auto_reply_enabled,
+    schedule_interval_minutes, last_checked_at
+"""
+
+
+async def get_user_videos_page(
+    user_id: int,
+    limit: int = 50,
+    after: Optional[Tuple[Optional[datetime], int]] = None,
+    auto_reply_enabled: Optional[bool] = None,
+    search: Optional[str] = None
+) -> List[asyncpg.Record]:
+    """One page of a user's videos, newest first
+    
+    Keyset-paginated on (published_at, id): `after` is the (published_at, id)
+    of the last row of the previous page, with published_at None when that
+    row had none. Returns up to `limit` rows.
+    """
+    conditions = ["user_id = $1"]
+    args: list = [user_id]
+    
+    if after is not None:
+        after_published_at, after_id = after
+        if after_published_at is None:
+            # Already in the NULL tail (sorted last) - only lower ids remain
+            args.append(after_id)
+            conditions.append(
+                f"COALESCE(published_at, '-infinity'::timestamp) = '-infinity'::timestamp AND id < ${len(args)}"
+            )
+        else:
+            args.extend(after)
+            conditions.append(
+                f"(COALESCE(published_at, '-infinity'::timestamp), id) < (${len(args) - 1}, ${len(args)})"
+            )
+    if auto_reply_enabled is not None:
+        args.append(auto_reply_enabled)
+        conditions.append(f"auto_reply_enabled = ${len(args)}")
+    if search:
+        args.append(f"%{search}%")
+        conditions.append(f"title ILIKE ${len(args)}")
+    
+    args.append(limit)
+    
+    async with acquire_connection() as conn:
+        rows = await conn.fetch(f"""
+            SELECT {VIDEO_LIST_COLUMNS}
+            FROM videos
+            WHERE {' AND '.join(conditions)}
+            ORDER BY COALESCE(published_at, '-infinity'::timestamp) DESC, id DESC
+            LIMIT ${len(args)}
+        """, *args)
+        # Records go straight to the response encoder
+        return rows
+
+
+# Due for a scheduled check: next_check_at has passed, or (rows not yet
+# scheduled) the fixed interval has elapsed since the last check
+_VIDEO_DUE = """(
+                v.next_check_at <= NOW()
+                OR (v.next_check_at IS NULL AND (v.last_checked_at IS NULL OR (NOW() - v.last_checked_at) >= (v.schedule_interval_minutes * interval '1 minute')))
+            )"""
+
+
+@traced("db.get_auto_reply_videos")
 async def get_auto_reply_videos(use_direct=False) -> List[Dict]:
-    """Get all videos with auto-reply enabled that are due for a check"""
-    # Auto-use direct connection if pool not initialized (Celery worker)
-    if use_direct or pool is None:
-        async with get_direct_connection() as conn:
-            rows = await conn.fetch("""
-                SELECT v.*, u.access_token, u.refresh_token
-                FROM videos v
-                JOIN users u ON v.user_id = u.id
-                WHERE v.auto_reply_enabled = true 
-                AND (v.last_checked_at IS NULL OR (NOW() - v.last_checked_at) >= (v.schedule_interval_minutes * interval '1 minute'))
-            """)
-            return [dict(row) for row in rows]
-    else:
-        async with pool.acquire() as conn:
-            rows = await conn.fetch("""
-                SELECT v.*, u.access_token, u.refresh_token
+    """Get all videos with auto-reply enabled that are due for a check
+    
+    Due means next_check_at has passed (falling back to last_checked_at +
+    schedule interval for rows not yet scheduled). Busiest videos come
+    first so a short quota budget goes where replies are most likely.
+    """
+    async with acquire_connection(use_direct) as conn:
+        rows = await conn.fetch("""
+            SELECT v.*, u.access_token, u.refresh_token
+            FROM videos v
+            JOIN users u ON v.user_id = u.id
+            WHERE v.auto_reply_enabled = true 
+            AND """ + _VIDEO_DUE + """
+            ORDER BY COALESCE(v.comment_rate_per_hour, 0) DESC, v.next_check_at NULLS FIRST
+        """)
+        return [dict(row) for row in rows]
+
+
+@traced("db.claim_due_videos")
+async def claim_due_videos(video_ids: List[str], use_direct=False) -> Dict[str, Optional[datetime]]:
+    """Atomically mark videos as checked if they are still due
+    
+    Returns {video_id: last_checked_at before the claim} for the videos this
+    caller won. Rows claimed by a concurrent tick are locked (skipped) or no
+    longer due, so each due check is handed out exactly once.
+    """
+    if not video_ids:
+        return {}
+    async with acquire_connection(use_direct) as conn:
+        rows = await conn.fetch("""
+            WITH due AS (
+                SELECT v.id, v.last_checked_at
                 FROM videos v
-                JOIN users u ON v.user_id = u.id
-                WHERE v.auto_reply_enabled = true 
-                AND (v.last_checked_at IS NULL OR (NOW() - v.last_checked_at) >= (v.schedule_interval_minutes * interval '1 minute'))
-            """)
-            return [dict(row) for row in rows]
+                WHERE v.video_id = ANY($1::text[])
+                AND v.auto_reply_enabled = true
+                AND """ + _VIDEO_DUE + """
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE videos 
+            SET last_checked_at = NOW(),
+                next_check_at = NOW() + videos.schedule_interval_minutes * interval '1 minute'
+            FROM due
+            WHERE videos.id = due.id
+            RETURNING videos.video_id, due.last_checked_at AS previous_checked_at
+        """, video_ids)
+        return {row['video_id']: row['previous_checked_at'] for row in rows}
+
+
+@traced("db.get_scheduled_video")
+async def get_scheduled_video(video_id: str, use_direct=False) -> Optional[Dict]:
+    """Videos row for a scheduled check (None once auto-reply is switched off)"""
+    async with acquire_connection(use_direct) as conn:
+        row = await conn.fetchrow("""
+            SELECT * FROM videos 
+            WHERE video_id = $1 AND auto_reply_enabled = true
+        """, video_id)
+        return dict(row) if row else None
 
 
 async def update_last_checked(video_id: str, use_direct=False):
-    """Update last_checked_at timestamp for a video"""
-    # Auto-use direct connection if pool not initialized (Celery worker)
-    if use_direct or pool is None:
-        async with get_direct_connection() as conn:
-            await conn.execute("""
-                UPDATE videos SET last_checked_at = NOW() WHERE video_id = $1
-            """, video_id)
-    else:
-        async with pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE videos SET last_checked_at = NOW() WHERE video_id = $1
-            """, video_id)
+    """Mark a video as checked and provisionally schedule the next check
+    
+    The provisional next_check_at uses the fixed interval; record_video_poll
+    replaces it once the check has finished.
+    """
+    async with acquire_connection(use_direct) as conn:
+        await conn.execute("""
+            UPDATE videos 
+            SET last_checked_at = NOW(),
+                next_check_at = NOW() + schedule_interval_minutes * interval '1 minute'
+            WHERE video_id = $1
+        """, video_id)
+
+
+@traced("db.record_video_poll")
+async def record_video_poll(
+    video_id: str,
+    comment_rate_per_hour: Optional[float],
+    newest_comment_at: Optional[datetime],
+    interval_minutes: int,
+    use_direct=False
+):
+    """Store the outcome of a check and when the video is due next"""
+    async with acquire_connection(use_direct) as conn:
+        await conn.execute("""
+            UPDATE videos 
+            SET comment_rate_per_hour = $2,
+                newest_comment_at = COALESCE($3, newest_comment_at),
+                next_check_at = NOW() + $4 * interval '1 minute'
+            WHERE video_id = $1
+        """, video_id, comment_rate_per_hour, newest_comment_at, interval_minutes)
+
+
+@traced("db.get_recent_reply_count")
+async def get_recent_reply_count(video_id: str, hours: int = 168, use_direct=False) -> int:
+    """Replies sent on a video within the last `hours` (seeds the comment rate)"""
+    async with acquire_connection(use_direct) as conn:
+        return await conn.fetchval("""
+            SELECT COUNT(*) FROM replied_comments 
+            WHERE video_id = $1 AND replied_at >= NOW() - $2 * interval '1 hour'
+        """, video_id, hours)
 
 
 async def update_video_settings(
@@ -454,10 +696,13 @@ async def update_video_settings(
                 reply_templates,
                 schedule_type,
                 schedule_interval_minutes,
+                adaptive_schedule,
+                min_interval_minutes,
+                max_interval_minutes,
                 created_at,
                 updated_at
             )
-            VALUES ($1, $2, $3, NOW(), $4, $5, $6, $7, $8, NOW(), NOW())
+            VALUES ($1, $2, $3, NOW(), $4, $5, $6, $7, $8, $9, $10, $11, NOW(), NOW())
             ON CONFLICT (video_id) 
             DO UPDATE SET
                 auto_reply_enabled = EXCLUDED.auto_reply_enabled,
@@ -465,6 +710,11 @@ async def update_video_settings(
                 reply_templates = EXCLUDED.reply_templates,
                 schedule_type = EXCLUDED.schedule_type,
                 schedule_interval_minutes = EXCLUDED.schedule_interval_minutes,
+                adaptive_schedule = EXCLUDED.adaptive_schedule,
+                min_interval_minutes = EXCLUDED.min_interval_minutes,
+                max_interval_minutes = EXCLUDED.max_interval_minutes,
+                -- Reschedule from last_checked_at under the new settings
+                next_check_at = NULL,
                 updated_at = NOW()
         """,
             user_id,
@@ -474,9 +724,16 @@ async def update_video_settings(
             json.dumps(settings_dict.get('keywords', [])),
             json.dumps(settings_dict.get('reply_templates', [])),
             settings_dict.get('schedule_type', 'hourly'),
-            settings_dict.get('schedule_interval_minutes', 60)
+            settings_dict.get('schedule_interval_minutes', 60),
+            settings_dict.get('adaptive_schedule', False),
+            settings_dict.get('min_interval_minutes', 5),
+            settings_dict.get('max_interval_minutes', 1440)
         )
-        return True
+    
+    # Compiled keyword/template cache in this process (others see the new updated_at)
+    from services.video_config import video_config_cache
+    video_config_cache.invalidate(video_id)
+    return True
 
 
 async def upsert_video(user_id: int, video_data: Dict) -> Dict:
@@ -559,11 +816,65 @@ async def upsert_videos_batch(user_id: int, videos: List[Dict]) -> int:
                 view_count = EXCLUDED.view_count,
                 comment_count = EXCLUDED.comment_count,
                 updated_at = NOW()
+            -- Skip the write entirely when nothing changed
+            WHERE (videos.title, videos.description, videos.view_count, videos.comment_count)
+                IS DISTINCT FROM
+                (EXCLUDED.title, EXCLUDED.description, EXCLUDED.view_count, EXCLUDED.comment_count)
         """, records)
         
         return len(records)
 
 
+# ============================================
+# INCREMENTAL SYNC HELPERS
+# ============================================
+
+async def get_user_video_ids(user_id: int) -> Set[str]:
+    """Video ids already synced for a user
+    
+    Placeholder rows created by update_video_settings (title "Video <id>")
+    are left out so the next sync fills in their real metadata.
+    """
+    async with acquire_connection() as conn:
+        rows = await conn.fetch("""
+            SELECT video_id FROM videos
+            WHERE user_id = $1
+            AND title IS DISTINCT FROM 'Video ' || video_id
+        """, user_id)
+        return {row['video_id'] for row in rows}
+
+
+async def update_video_stats_batch(user_id: int, stats: Dict[str, Dict]) -> int:
+    """Refresh view/comment counts - rows whose counts didn't change aren't written
+    
+    `stats` maps video_id -> YouTube statistics dict. Returns rows updated.
+    """
+    if not stats:
+        return 0
+    
+    video_ids = list(stats.keys())
+    view_counts = [int(stats[v].get('viewCount', 0)) for v in video_ids]
+    comment_counts = [int(stats[v].get('commentCount', 0)) for v in video_ids]
+    
+    async with acquire_connection() as conn:
+        result = await conn.execute("""
+            UPDATE videos v
+            SET view_count = s.view_count,
+                comment_count = s.comment_count,
+                updated_at = NOW()
+            FROM unnest($2::varchar[], $3::bigint[], $4::int[])
+                AS s(video_id, view_count, comment_count)
+            WHERE v.video_id = s.video_id
+            AND v.user_id = $1
+            AND (
+                v.view_count IS DISTINCT FROM s.view_count
+                OR v.comment_count IS DISTINCT FROM s.comment_count
+            )
+        """, user_id, video_ids, view_counts, comment_counts)
+        # "UPDATE <n>"
+        return int(result.split()[-1])
+
+
 # ============================================
 # DUPLICATE CHECK FUNCTIONS (CRITICAL)
 # ============================================
@@ -587,26 +898,24 @@ async def has_replied_to_comment(comment_id: str) -> bool:
             return result is not None
 
 
+@traced("db.has_replied_batch")
 async def has_replied_batch(comment_ids: List[str]) -> Set[str]:
-    """Batch check for multiple comments - 2-5ms for 100 comments"""
+    """Batch check for multiple comments - 2-5ms for 100 comments
+    
+    Comments already sitting in the reply outbox count as replied so they
+    are never queued twice.
+    """
     if not comment_ids:
         return set()
     
-    # Auto-use direct connection if pool not initialized (Celery worker)
-    if pool is None:
-        async with get_direct_connection() as conn:
-            rows = await conn.fetch(
-                "SELECT comment_id FROM replied_comments WHERE comment_id = ANY($1)",
-                comment_ids
-            )
-            return {row['comment_id'] for row in rows}
-    else:
-        async with pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT comment_id FROM replied_comments WHERE comment_id = ANY($1)",
-                comment_ids
-            )
-            return {row['comment_id'] for row in rows}
+    query = """
+        SELECT comment_id FROM replied_comments WHERE comment_id = ANY($1)
+        UNION
+        SELECT comment_id FROM reply_outbox WHERE comment_id = ANY($1)
+    """
+    async with acquire_connection() as conn:
+        rows = await conn.fetch(query, comment_ids)
+        return {row['comment_id'] for row in rows}
 
 
 async def mark_comment_replied(
@@ -635,7 +944,7 @@ async def mark_comment_replied(
                      comment_text, comment_author,
                      keyword_matched, reply_text)
             except Exception as e:
-                print(f"Error marking comment replied: {e}")
+                logger.error("Error marking comment %s replied: %s", comment_id, e)
     else:
         async with pool.acquire() as conn:
             try:
@@ -651,7 +960,7 @@ async def mark_comment_replied(
                      comment_text, comment_author,
                      keyword_matched, reply_text)
             except Exception as e:
-                print(f"Error marking comment replied: {e}")
+                logger.error("Error marking comment %s replied: %s", comment_id, e)
 
 
 # ============================================
@@ -690,13 +999,171 @@ async def mark_comments_replied_batch(replies: List[Dict]) -> int:
         return len(records)
 
 
+# ============================================
+# REPLY OUTBOX (crash-safe delivery)
+# ============================================
+#
+# Reply intents are written here before anything is posted to YouTube.
+# Lifecycle: pending -> sending (claimed) -> sent | failed
+# A row left in 'sending' past OUTBOX_CLAIM_TIMEOUT_SECONDS belongs to a
+# worker that died mid-delivery; it is reclaimed and verified against
+# YouTube before being re-posted. Once a reply has been posted the row is
+# never handed back to 'pending' - if recording it fails, it stays
+# 'sending' and the reclaim finds the reply instead of posting it again.
+
+@traced("db.enqueue_reply_intents")
+async def enqueue_reply_intents(replies: List[Dict]) -> int:
+    """Bulk insert reply intents - comments already queued are skipped"""
+    if not replies:
+        return 0
+    
+    records = [
+        (
+            r['comment_id'],
+            r['video_id'],
+            r['user_id'],
+            r.get('comment_text', ''),
+            r.get('comment_author', ''),
+            r.get('keyword_matched', ''),
+            r['reply_text']
+        )
+        for r in replies
+    ]
+    
+    async with acquire_connection() as conn:
+        await conn.executemany("""
+            INSERT INTO reply_outbox (
+                comment_id, video_id, user_id,
+                comment_text, comment_author,
+                keyword_matched, reply_text
+            )
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
+            ON CONFLICT (comment_id) DO NOTHING
+        """, records)
+    
+    return len(records)
+
+
+@traced("db.claim_reply_intents")
+async def claim_reply_intents(
+    user_id: int,
+    video_id: Optional[str] = None,
+    limit: int = 50,
+    comment_ids: Optional[List[str]] = None
+) -> List[Dict]:
+    """Claim deliverable intents for a user (optionally one video)
+    
+    Claims pending rows plus stale 'sending' rows, restricted to
+    `comment_ids` when given. SKIP LOCKED lets several
+    workers drain the same outbox without handing out a row twice.
+    Each returned dict carries `prev_status` so reclaimed rows can be
+    verified before re-posting.
+    """
+    async with acquire_connection() as conn:
+        rows = await conn.fetch("""
+            WITH claimable AS (
+                SELECT id, status AS prev_status
+                FROM reply_outbox
+                WHERE user_id = $1
+                AND ($2::varchar IS NULL OR video_id = $2)
+                AND ($5::varchar[] IS NULL OR comment_id = ANY($5))
+                AND (
+                    status = 'pending'
+                    OR (status = 'sending' AND claimed_at < NOW() - ($4 * interval '1 second'))
+                )
+                ORDER BY id
+                LIMIT $3
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE reply_outbox o
+            SET status = 'sending',
+                attempts = o.attempts + 1,
+                claimed_at = NOW(),
+                updated_at = NOW()
+            FROM claimable c
+            WHERE o.id = c.id
+            RETURNING o.*, c.prev_status
+        """, user_id, video_id, limit, settings.OUTBOX_CLAIM_TIMEOUT_SECONDS, comment_ids)
+        return [dict(row) for row in rows]
+
+
+@traced("db.complete_reply_intent")
+async def complete_reply_intent(outbox_id: int, reply_id: Optional[str] = None):
+    """Record a delivered reply - dedupe row and outbox status in one transaction"""
+    async with acquire_connection() as conn:
+        async with conn.transaction():
+            await conn.execute("""
+                INSERT INTO replied_comments (
+                    comment_id, video_id, user_id,
+                    comment_text, comment_author,
+                    keyword_matched, reply_text
+                )
+                SELECT comment_id, video_id, user_id,
+                       comment_text, comment_author,
+                       keyword_matched, reply_text
+                FROM reply_outbox
+                WHERE id = $1
+                ON CONFLICT (comment_id) DO NOTHING
+            """, outbox_id)
+            await conn.execute("""
+                UPDATE reply_outbox
+                SET status = 'sent', reply_id = $2, last_error = NULL,
+                    sent_at = NOW(), updated_at = NOW()
+                WHERE id = $1
+            """, outbox_id, reply_id)
+
+
+@traced("db.fail_reply_intent")
+async def fail_reply_intent(outbox_id: int, error: str):
+    """Record a failed delivery attempt - retried until OUTBOX_MAX_ATTEMPTS"""
+    async with acquire_connection() as conn:
+        await conn.execute("""
+            UPDATE reply_outbox
+            SET status = CASE WHEN attempts >= $3 THEN 'failed' ELSE 'pending' END,
+                last_error = $2,
+                claimed_at = NULL,
+                updated_at = NOW()
+            WHERE id = $1
+        """, outbox_id, error[:1000], settings.OUTBOX_MAX_ATTEMPTS)
+
+
+@traced("db.release_reply_intents")
+async def release_reply_intents(outbox_ids: List[int]):
+    """Hand claimed intents back untouched (e.g. quota ran out) - no attempt is charged"""
+    if not outbox_ids:
+        return
+    
+    async with acquire_connection() as conn:
+        await conn.execute("""
+            UPDATE reply_outbox
+            SET status = 'pending',
+                attempts = GREATEST(attempts - 1, 0),
+                claimed_at = NULL,
+                updated_at = NOW()
+            WHERE id = ANY($1) AND status = 'sending'
+        """, outbox_ids)
+
+
+async def get_outbox_pending_users() -> List[int]:
+    """Users that still have undelivered intents (pending or stale claims)"""
+    async with acquire_connection() as conn:
+        rows = await conn.fetch("""
+            SELECT DISTINCT user_id
+            FROM reply_outbox
+            WHERE status = 'pending'
+            OR (status = 'sending' AND claimed_at < NOW() - ($1 * interval '1 second'))
+        """, settings.OUTBOX_CLAIM_TIMEOUT_SECONDS)
+        return [row['user_id'] for row in rows]
+
+
 # ============================================
 # ANALYTICS FUNCTIONS
 # ============================================
 
 async def get_reply_stats(user_id: int, days: int = 7) -> Dict:
     """Get reply statistics"""
-    async with pool.acquire() as conn:
+    # Also called by the Redis QuotaManager in workers, where the web pool is None
+    async with acquire_connection() as conn:
         row = await conn.fetchrow(f"""
             SELECT 
                 COUNT(*) as total_replies,
@@ -710,6 +1177,56 @@ async def get_reply_stats(user_id: int, days: int = 7) -> Dict:
         return dict(row) if row else {}
 
 
+# USER_DAILY_REPLY_LIMIT counts replies over a rolling 24 hours, evaluated
+# by the database clock - enforcement and the dashboard both use this
+REPLY_LIMIT_WINDOW = "replied_at > NOW() - INTERVAL '1 day'"
+
+
+async def get_user_reply_count(user_id: int, use_direct: bool = False) -> int:
+    """Replies counted against the user's daily reply limit"""
+    async with acquire_connection(use_direct) as conn:
+        return await conn.fetchval(
+            f"SELECT COUNT(*) FROM replied_comments WHERE user_id = $1 AND {REPLY_LIMIT_WINDOW}",
+            user_id
+        )
+
+
+async def get_dashboard_data(user_id: int, recent_limit: int = 50) -> Dict:
+    """Everything the analytics dashboard shows, in one round trip
+    
+    Returns replies_this_week, replies_today (the REPLY_LIMIT_WINDOW count)
+    and recent_replies (newest first, with video_title).
+    """
+    async with acquire_connection() as conn:
+        row = await conn.fetchrow(f"""
+            WITH week AS (
+                SELECT replied_at
+                FROM replied_comments
+                WHERE user_id = $1
+                AND replied_at > NOW() - INTERVAL '7 days'
+            ),
+            recent AS (
+                SELECT rc.*, v.title AS video_title
+                FROM replied_comments rc
+                LEFT JOIN videos v ON rc.video_id = v.video_id
+                WHERE rc.user_id = $1
+                ORDER BY rc.replied_at DESC
+                LIMIT $2
+            )
+            SELECT
+                (SELECT COUNT(*) FROM week) AS replies_this_week,
+                (SELECT COUNT(*) FROM week WHERE {REPLY_LIMIT_WINDOW}) AS replies_today,
+                COALESCE(
+                    (SELECT json_agg(recent ORDER BY recent.replied_at DESC) FROM recent),
+                    '[]'
+                ) AS recent_replies
+        """, user_id, recent_limit)
+        
+        data = dict(row)
+        data['recent_replies'] = json.loads(data['recent_replies'])
+        return data
+
+
 async def get_recent_replies(user_id: int, limit: int = 50) -> List[Dict]:
     """Get recent replies with video info"""
     async with pool.acquire() as conn:
@@ -744,7 +1261,7 @@ async def get_chart_data(user_id: int, days: int = 7) -> List[Dict]:
 # TEMPLATE FUNCTIONS
 # ============================================
 
-async def get_user_templates(user_id: int) -> List[Dict]:
+async def get_user_templates(user_id: int) -> List[asyncpg.Record]:
     """Get all templates for a user"""
     async with pool.acquire() as conn:
         rows = await conn.fetch("""
@@ -752,14 +1269,8 @@ async def get_user_templates(user_id: int) -> List[Dict]:
             WHERE user_id = $1 
             ORDER BY created_at DESC
         """, user_id)
-        # Convert created_at to ISO format string for JSON serialization
-        results = []
-        for row in rows:
-            r = dict(row)
-            if isinstance(r.get('created_at'), datetime):
-                r['created_at'] = r['created_at'].isoformat()
-            results.append(r)
-        return results
+        # Records go straight to the response encoder
+        return rows
 
 
 async def create_user_template(user_id: int, template_text: str) -> Dict:
@@ -15,17 +15,32 @@ from database_pg import (
     update_user_tokens,
     create_or_update_user,
     get_user_videos,
+    get_user_videos_page,
     get_auto_reply_videos,
     update_last_checked,
+    claim_due_videos,
+    get_scheduled_video,
+    record_video_poll,
+    get_recent_reply_count,
     update_video_settings,
     upsert_video,
     upsert_videos_batch,
+    get_user_video_ids,
+    update_video_stats_batch,
     has_replied_to_comment,
     has_replied_batch,
     mark_comment_replied,
     mark_comments_replied_batch,
+    enqueue_reply_intents,
+    claim_reply_intents,
+    complete_reply_intent,
+    fail_reply_intent,
+    release_reply_intents,
+    get_outbox_pending_users,
     get_reply_stats,
+    get_user_reply_count,
     get_recent_replies,
+    get_dashboard_data,
     get_chart_data,
     get_user_templates,
     create_user_template,
@@ -44,17 +59,32 @@ __all__ = [
     'update_user_tokens',
     'create_or_update_user',
     'get_user_videos',
+    'get_user_videos_page',
     'get_auto_reply_videos',
     'update_last_checked',
+    'claim_due_videos',
+    'get_scheduled_video',
+    'record_video_poll',
+    'get_recent_reply_count',
     'update_video_settings',
     'upsert_video',
     'upsert_videos_batch',
+    'get_user_video_ids',
+    'update_video_stats_batch',
     'has_replied_to_comment',
     'has_replied_batch',
     'mark_comment_replied',
     'mark_comments_replied_batch',
+    'enqueue_reply_intents',
+    'claim_reply_intents',
+    'complete_reply_intent',
+    'fail_reply_intent',
+    'release_reply_intents',
+    'get_outbox_pending_users',
     'get_reply_stats',
+    'get_user_reply_count',
     'get_recent_replies',
+    'get_dashboard_data',
     'get_chart_data',
     'get_user_templates',
     'create_user_template',
@@ -1,13 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from typing import Optional
 from config import settings
+from utils.serialization import RecordJSONResponse
 
 # Lifespan context manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     # Startup
+    from utils.log import configure_logging
+    from utils.tracing import configure_tracing
+    configure_logging()
+    configure_tracing()
     print("🚀 Starting YouTube Auto-Reply API...")
     print(f"   Environment: {'Heroku' if settings.IS_HEROKU else 'Local (Docker)'}")
     
@@ -42,7 +48,8 @@ app = FastAPI(
     title="YouTube Auto-Reply API",
     description="Automated YouTube comment reply system - Production Ready",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=RecordJSONResponse
 )
 
 # CORS middleware
@@ -57,6 +64,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Video list pagination
 )
 
 # Import and register routers
@@ -78,6 +86,15 @@ async def health_check():
         "redis": bool(settings.REDIS_URL)
     }
 
+# Metrics (Prometheus text format) for this process
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Pipeline metrics - see services/metrics.py"""
+    if settings.METRICS_TOKEN and authorization != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    from services.metrics import render_metrics, CONTENT_TYPE
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -39,6 +39,10 @@ async def get_current_user(authorization: str = Header(None)):
             algorithms=["HS256"]
         )
         
+        # Scoped tokens (e.g. progress stream tokens) are not sessions
+        if payload.get('scope'):
+            raise HTTPException(401, "Invalid token scope")
+        
         # Check if this is a Better Auth token (has 'source' field)
         if payload.get('source') == 'better_auth':
             email = payload.get('email')
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Header, HTTPException
-from db import get_reply_stats, get_user_by_id, get_recent_replies, get_chart_data as db_get_chart_data
+from db import get_dashboard_data, get_chart_data as db_get_chart_data
+from services.cache import cache_manager
+from utils.serialization import RecordJSONResponse
 from config import settings
+from typing import Dict, List
 import jwt
 
 router = APIRouter()
@@ -14,53 +17,34 @@ async def get_current_user_from_header(authorization: str = Header(None)):
 
 
 
-async def get_quota_manager():
-    """Get quota manager - Redis-based in production, in-memory locally"""
-    if settings.USE_REDIS:
-        from services.cache import cache_manager, QuotaManager
-        return QuotaManager(cache_manager)
-    else:
-        from services.quota_manager import QuotaManager
-        return QuotaManager()
-
-
 @router.get("/")
 async def get_analytics(authorization: str = Header(None)):
-    """Get analytics dashboard data"""
+    """Get analytics dashboard data (cached, invalidated by reply writes)"""
     user = await get_current_user_from_header(authorization)
+    return RecordJSONResponse(await cache_manager.read_through(
+        "analytics", user['id'], lambda: build_analytics(user), variant="dashboard"
+    ))
+
+
+async def build_analytics(user: Dict) -> Dict:
+    """Assemble the dashboard payload (single database round trip)"""
+    data = await get_dashboard_data(user['id'], recent_limit=50)
     
-    # Get reply stats
-    stats_7d = await get_reply_stats(user['id'], days=7)
-    
-    # Get per-user quota usage (not global)
-    quota_mgr = await get_quota_manager()
-    
-    # Get THIS user's reply count today and remaining
-    user_replies_today = await quota_mgr.get_user_reply_count(user['id'])
-    user_remaining = await quota_mgr.get_user_remaining_replies(user['id'])
-    user_daily_limit = quota_mgr.user_daily_limit
+    user_replies_today = data['replies_today']
+    user_daily_limit = settings.USER_DAILY_REPLY_LIMIT
     
     # Calculate percentage of user's daily limit used
     user_quota_percent = int((user_replies_today / user_daily_limit) * 100) if user_daily_limit > 0 else 0
     
-    # Get recent replies (using the db abstraction)
-    recent_replies = await get_recent_replies(user['id'], limit=50)
-    
-    # Serialize datetime objects for JSON response
-    for reply in recent_replies:
-        for key, value in reply.items():
-            if hasattr(value, 'isoformat'):
-                reply[key] = value.isoformat()
-    
     return {
-        "total_replies": stats_7d.get('total_replies', 0) if stats_7d else 0,
+        "total_replies": data['replies_this_week'],
         "replies_today": user_replies_today,
-        "replies_this_week": stats_7d.get('total_replies', 0) if stats_7d else 0,
+        "replies_this_week": data['replies_this_week'],
         "quota_used": user_quota_percent,
         "quota_units_used": user_replies_today,
         "user_daily_limit": user_daily_limit,
-        "user_remaining": user_remaining,
-        "recent_replies": recent_replies
+        "user_remaining": max(0, user_daily_limit - user_replies_today),
+        "recent_replies": data['recent_replies']
     }
 
 
@@ -68,12 +52,11 @@ async def get_analytics(authorization: str = Header(None)):
 async def get_chart_data_endpoint(authorization: str = Header(None), days: int = 7):
     """Get chart data for analytics"""
     user = await get_current_user_from_header(authorization)
-    
-    chart_data = await db_get_chart_data(user['id'], days=days)
-    
-    # Serialize date objects
-    for item in chart_data:
-        if 'date' in item and hasattr(item['date'], 'isoformat'):
-            item['date'] = item['date'].isoformat()
-    
-    return chart_data
+    return RecordJSONResponse(await cache_manager.read_through(
+        "analytics", user['id'], lambda: build_chart_data(user['id'], days), variant=f"chart:{days}"
+    ))
+
+
+async def build_chart_data(user_id: int, days: int) -> List[Dict]:
+    """Daily reply counts for the chart"""
+    return await db_get_chart_data(user_id, days=days)
@@ -1,23 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict
+from typing import Dict
 from pydantic import BaseModel
 
 from middleware.auth_middleware import get_current_user
 import database_pg as database
+from utils.serialization import RecordJSONResponse
 
 router = APIRouter()
 
 class TemplateCreate(BaseModel):
     template_text: str
 
-@router.get("/", response_model=List[Dict])
+@router.get("/", response_class=RecordJSONResponse)
 async def get_templates(
     current_user: Dict = Depends(get_current_user)
 ):
     """Get all saved templates for the current user"""
     user_id = current_user['id']
     templates = await database.get_user_templates(user_id)
-    return templates
+    return RecordJSONResponse(templates)
 
 @router.post("/", response_model=Dict)
 async def create_template(
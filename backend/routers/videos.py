@@ -1,14 +1,24 @@
-from fastapi import APIRouter, Header, HTTPException
-from typing import List, Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Dict, Tuple
+from datetime import datetime
 from pydantic import BaseModel
 from db import (
-    get_user_videos, update_video_settings, get_db_connection, 
+    get_user_videos_page, update_video_settings, get_db_connection, 
     upsert_video, upsert_videos_batch, get_user_by_id
 )
 from services.youtube_client import AsyncYouTubeClient
+from services.video_config import video_display_title
+from services.cache import cache_manager, invalidate_user_caches
+from utils.serialization import RecordJSONResponse
 import jwt
 from config import settings
+import base64
 import json
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -18,6 +28,9 @@ class VideoSettings(BaseModel):
     reply_templates: List[str]
     schedule_type: Optional[str] = "hourly"
     schedule_interval_minutes: Optional[int] = 60  # Default 1 hour, range: 1-1440 (24 hours)
+    adaptive_schedule: Optional[bool] = False  # Poll busy videos more often, quiet ones less
+    min_interval_minutes: Optional[int] = 5  # Adaptive bounds
+    max_interval_minutes: Optional[int] = 1440
 
 class VideoUpsert(BaseModel):
     video_id: str
@@ -36,16 +49,75 @@ async def get_current_user_from_header(authorization: str = Header(None)):
     """Extract user from Authorization header - delegates to centralized middleware"""
     return await get_current_user(authorization)
 
+def _encode_cursor(video: Dict) -> str:
+    # null marks the NULL published_at tail (sorted last, as -infinity)
+    published_at = video['published_at'].isoformat() if video['published_at'] else None
+    raw = json.dumps([published_at, video['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        published_at, video_pk = json.loads(base64.urlsafe_b64decode(padded))
+        published_at = datetime.fromisoformat(published_at) if published_at is not None else None
+        # Cursors issued before the null marker used datetime.min
+        if published_at == datetime.min:
+            published_at = None
+        return published_at, int(video_pk)
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Invalid cursor")
+
+
 @router.get("/")
-async def list_videos(authorization: str = Header(None)):
-    """Get all videos for authenticated user"""
+async def list_videos(
+    authorization: str = Header(None),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    auto_reply_enabled: Optional[bool] = None,
+    search: Optional[str] = Query(None, max_length=100)
+):
+    """List the user's videos, newest first
+    
+    Keyset-paginated: when more videos exist the X-Next-Cursor header holds
+    the `cursor` for the next page. Rows are a list projection - the full
+    settings come from /{video_id}/settings.
+    """
     user = await get_current_user_from_header(authorization)
-    videos = await get_user_videos(user['id'])
-    return videos
+    after = _decode_cursor(cursor) if cursor else None
+    
+    async def load_page() -> Dict:
+        videos = await get_user_videos_page(
+            user['id'],
+            limit=limit + 1,
+            after=after,
+            auto_reply_enabled=auto_reply_enabled,
+            search=search
+        )
+        next_cursor = None
+        if len(videos) > limit:
+            videos = videos[:limit]
+            next_cursor = _encode_cursor(videos[-1])
+        return {"videos": videos, "next_cursor": next_cursor}
+    
+    page = await cache_manager.read_through(
+        "videos",
+        user['id'],
+        load_page,
+        variant=json.dumps([limit, cursor, auto_reply_enabled, search]),
+        ttl=300
+    )
+    
+    headers = {"X-Next-Cursor": page["next_cursor"]} if page["next_cursor"] else None
+    return RecordJSONResponse(page["videos"], headers=headers)
 
 @router.get("/sync")
-async def sync_videos(authorization: str = Header(None)):
-    """Sync videos from YouTube - Background job"""
+async def sync_videos(authorization: str = Header(None), backfill: bool = False):
+    """Sync videos from YouTube - Background job
+    
+    `backfill=true` also fetches older uploads missing from the library
+    (channels first synced when only the newest 100 videos were kept).
+    """
     user = await get_current_user_from_header(authorization)
     
     # Check if user has YouTube tokens
@@ -68,7 +140,7 @@ async def sync_videos(authorization: str = Header(None)):
         from tasks import sync_user_videos
         
         # Submit background job
-        task = sync_user_videos.delay(user['id'])
+        task = sync_user_videos.delay(user['id'], backfill=backfill)
         
         return {
             "status": "processing",
@@ -87,30 +159,14 @@ async def sync_videos(authorization: str = Header(None)):
             on_token_refresh=update_user_tokens
         )
         
+        from services.video_sync import sync_channel_videos
+        
         try:
-            videos = await youtube.get_channel_videos(user['channel_id'])
+            result = await sync_channel_videos(youtube, user, backfill=backfill)
         except Exception as e:
             raise HTTPException(500, f"Failed to fetch videos: {str(e)}")
         
-        # Save to database using batch operation
-        video_data = []
-        for video in videos:
-            snippet = video['snippet']
-            stats = video.get('statistics', {})
-            
-            video_data.append({
-                'video_id': video['contentDetails']['videoId'],
-                'title': snippet['title'],
-                'description': snippet.get('description', ''),
-                'thumbnail_url': snippet['thumbnails']['high']['url'],
-                'published_at': snippet['publishedAt'],
-                'view_count': int(stats.get('viewCount', 0)),
-                'comment_count': int(stats.get('commentCount', 0))
-            })
-        
-        synced_count = await upsert_videos_batch(user['id'], video_data)
-        
-        return {"synced": synced_count}
+        return {"synced": result['synced'], "stats_updated": result['stats_updated']}
 
 
 @router.post("/upsert-batch")
@@ -136,6 +192,7 @@ async def upsert_videos_from_frontend(
     ]
     
     synced_count = await upsert_videos_batch(user['id'], video_data)
+    await invalidate_user_caches(user['id'], analytics=False)
     
     return {"synced": synced_count, "message": f"Synced {synced_count} videos to backend"}
 
@@ -148,7 +205,9 @@ async def get_video_settings(video_id: str, authorization: str = Header(None)):
     async with get_db_connection() as conn:
         row = await conn.fetchrow(
             """
-            SELECT auto_reply_enabled, keywords, reply_templates, schedule_type, schedule_interval_minutes
+            SELECT auto_reply_enabled, keywords, reply_templates, schedule_type, schedule_interval_minutes,
+                   adaptive_schedule, min_interval_minutes, max_interval_minutes,
+                   comment_rate_per_hour, next_check_at
             FROM videos
             WHERE video_id = $1 AND user_id = $2
             """,
@@ -162,7 +221,12 @@ async def get_video_settings(video_id: str, authorization: str = Header(None)):
                 "keywords": [],
                 "reply_templates": [],
                 "schedule_type": "hourly",
-                "schedule_interval_minutes": 60
+                "schedule_interval_minutes": 60,
+                "adaptive_schedule": False,
+                "min_interval_minutes": 5,
+                "max_interval_minutes": 1440,
+                "comment_rate_per_hour": None,
+                "next_check_at": None
             }
         
         video_settings = dict(row)
@@ -172,6 +236,9 @@ async def get_video_settings(video_id: str, authorization: str = Header(None)):
         video_settings['reply_templates'] = json.loads(video_settings['reply_templates'] or '[]')
         video_settings['auto_reply_enabled'] = bool(video_settings['auto_reply_enabled'])
         video_settings['schedule_interval_minutes'] = video_settings.get('schedule_interval_minutes') or 60
+        video_settings['adaptive_schedule'] = bool(video_settings['adaptive_schedule'])
+        video_settings['min_interval_minutes'] = video_settings.get('min_interval_minutes') or 5
+        video_settings['max_interval_minutes'] = video_settings.get('max_interval_minutes') or 1440
         
         return video_settings
 
@@ -189,6 +256,7 @@ async def update_settings(
         user['id'],
         video_settings.model_dump()
     )
+    await invalidate_user_caches(user['id'], analytics=False)
     return {"success": True}
 
 @router.post("/{video_id}/trigger-reply")
@@ -239,34 +307,38 @@ async def trigger_reply(video_id: str, authorization: str = Header(None)):
             "failed": 0
         }
     
-    # FORCE SYNCHRONOUS PROCESSING for reliability on Heroku Free Tier
-    # The Redis/Celery path is causing SSL issues and 'stuck processing' states
-    # Synchronous processing provides immediate feedback and is robust
-    if False:  # Disabled Celery path temporarily
+    # Queue the job and return immediately - progress streams over SSE from
+    # /progress/{job_id}, so there's no need to cap replies for the request
+    if settings.USE_REDIS:
         try:
             from tasks import process_video_replies
+            from services.progress import register_job, create_stream_token
+            
+            job_id = uuid.uuid4().hex
+            await register_job(job_id, user['id'])
             
-            # Submit background job
-            task = process_video_replies.delay(
-                video_id,
-                user['id'],
-                video['keywords'],
-                video['reply_templates'],
-                max_comments=1000  # Process up to 1000 comments
+            process_video_replies.apply_async(
+                args=(video_id, user['id'], video['keywords'], video['reply_templates']),
+                kwargs={
+                    "max_comments": 1000,  # Process up to 1000 comments
+                    "video_title": video_display_title(video),
+                    "job_id": job_id
+                },
+                task_id=job_id
             )
             
             return {
                 "status": "processing",
-                "task_id": task.id,
+                "task_id": job_id,
                 "message": "Reply processing started in background.",
-                "websocket_url": f"/ws/{user['id']}"
+                "progress_url": f"/api/videos/progress/{job_id}?token={create_stream_token(job_id, user['id'])}"
             }
         except Exception as redis_error:
             # Redis/Celery unavailable - log and fall through to synchronous processing
-            print(f"⚠️ Celery unavailable ({type(redis_error).__name__}), falling back to synchronous processing")
+            logger.warning("Celery unavailable (%s), falling back to synchronous processing", type(redis_error).__name__)
             # Fall through to synchronous processing below
     
-    # Synchronous processing (free-tier friendly, immediate results)
+    # Synchronous fallback (local development / broker down)
     from services.reply_engine import ReplyEngine
     from services.quota_manager import QuotaManager
     from database_pg import update_user_tokens
@@ -285,38 +357,91 @@ async def trigger_reply(video_id: str, authorization: str = Header(None)):
     if remaining < 100:
         raise HTTPException(503, "Insufficient quota")
     
-    # Fetch comments
-    comments = await youtube.get_video_comments(video_id)
-    
-    # Filter by keywords
-    filtered = engine.filter_comments_by_keywords(
-        comments,
-        video['keywords']
-    )
-    
-    # Filter non-replied
-    to_reply = await engine.filter_non_replied(filtered)
-    
-    # Reply (limit to 20 for manual trigger in sync mode)
-    results = await engine.reply_to_comments_batch(
-        to_reply[:20],
+    # Stream comments - filtering, dedupe and replies run page by page and
+    # pagination stops once the reply cap is reached
+    # (limit to 20 for manual trigger in sync mode)
+    stats = await engine.reply_to_comment_stream(
+        youtube.iter_comment_pages(video_id),
         video_id,
         user['id'],
-        video['reply_templates']
+        video['keywords'],
+        video['reply_templates'],
+        max_replies=20,
+        batch_size=20,
+        video_title=video_display_title(video)
     )
     
-    succeeded = sum(1 for r in results if r.get('success'))
-    failed = sum(1 for r in results if not r.get('success'))
-    
     return {
-        "total_comments": len(comments),
-        "qualified": len(filtered),
-        "non_replied": len(to_reply),
-        "replied": succeeded,
-        "failed": failed
+        "total_comments": stats['total_comments'],
+        "qualified": stats['matched_keywords'],
+        "non_replied": stats['new_comments'],
+        "replied": stats['succeeded'],
+        "failed": stats['failed']
     }
 
 
+@router.post("/progress/{job_id}/token")
+async def create_progress_token(job_id: str, authorization: str = Header(None)):
+    """Fresh stream token for a job (the one from trigger-reply expired)"""
+    user = await get_current_user_from_header(authorization)
+    
+    if not settings.USE_REDIS:
+        raise HTTPException(404, "Progress streaming not available in local mode")
+    
+    from services.progress import get_job_owner, create_stream_token
+    
+    if await get_job_owner(job_id) != user['id']:
+        raise HTTPException(404, "Job not found")
+    
+    token = create_stream_token(job_id, user['id'])
+    return {"token": token, "progress_url": f"/api/videos/progress/{job_id}?token={token}"}
+
+
+@router.get("/progress/{job_id}")
+async def stream_job_progress(
+    job_id: str,
+    authorization: str = Header(None),
+    token: Optional[str] = None
+):
+    """Server-Sent Events stream of a trigger-reply job's progress
+    
+    EventSource can't set headers, so browsers pass the job's stream token
+    (from trigger-reply or /progress/{job_id}/token) as ?token=. Session
+    JWTs are only accepted in the Authorization header.
+    Events: started, scan, reply, retrying (the job will run again), then
+    done or error.
+    """
+    if not settings.USE_REDIS:
+        raise HTTPException(404, "Progress streaming not available in local mode")
+    
+    from services.progress import get_job_owner, stream_progress, verify_stream_token
+    
+    if authorization:
+        user_id = (await get_current_user_from_header(authorization))['id']
+    elif token:
+        user_id = verify_stream_token(token, job_id)
+        if user_id is None:
+            raise HTTPException(401, "Invalid or expired stream token")
+    else:
+        raise HTTPException(401, "Not authenticated")
+    
+    if await get_job_owner(job_id) != user_id:
+        raise HTTPException(404, "Job not found")
+    
+    async def event_source():
+        async for event in stream_progress(job_id):
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event['event']}\nid: {event['seq']}\ndata: {json.dumps(event, default=str)}\n\n"
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/task-status/{task_id}")
 async def get_task_status(
     task_id: str,
@@ -364,7 +489,7 @@ async def get_task_status(
             }
     except Exception as e:
         # Redis/Celery unavailable - task status cannot be retrieved
-        print(f"⚠️ Task status check failed ({type(e).__name__}): {e}")
+        logger.warning("Task status check failed (%s): %s", type(e).__name__, e)
         return {
             "status": "unknown",
             "error": "Task tracking temporarily unavailable. Task may have completed synchronously.",
@@ -9,6 +9,7 @@ from database import init_db, close_db, get_auto_reply_videos
 from services.youtube_client import AsyncYouTubeClient
 from services.reply_engine import ReplyEngine
 from services.quota_manager import QuotaManager
+from services.video_config import video_display_title
 from utils.human_delays import HumanDelayGenerator
 import logging
 
@@ -109,7 +110,8 @@ async def process_single_video(video: dict) -> int:
             batch,
             video['video_id'],
             video['user_id'],
-            video['reply_templates']
+            video['reply_templates'],
+            video_title=video_display_title(video)
         )
         
         replied_count = sum(1 for r in results if r['success'])
@@ -0,0 +1,117 @@
+"""
+Adaptive Polling Scheduler
+
+Estimates each video's comment arrival rate and derives when it should be
+checked next:
+- Rate is an EWMA of new comments seen per hour at each poll
+- First estimate is seeded from replied_comments history
+- Interval targets a fixed number of new comments per check, clamped to
+  the video's min/max interval
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from config import settings
+
+HISTORY_WINDOW_HOURS = 7 * 24
+
+
+def parse_published_at(value: Optional[str]) -> Optional[datetime]:
+    """YouTube publishedAt ("2024-01-01T12:00:00Z") -> naive UTC datetime"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def format_published_at(value: Optional[datetime]) -> Optional[str]:
+    """Naive UTC datetime -> YouTube publishedAt format (string-comparable)"""
+    if value is None:
+        return None
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def seed_rate_from_history(replies_in_window: int) -> float:
+    """Lower-bound comments/hour from replies sent in the history window"""
+    return replies_in_window / HISTORY_WINDOW_HOURS
+
+
+def update_comment_rate(
+    previous_rate: Optional[float],
+    new_comments: int,
+    elapsed_hours: float,
+    smoothing: float = None
+) -> float:
+    """Blend the rate observed since the last poll into the running estimate"""
+    if smoothing is None:
+        smoothing = settings.ADAPTIVE_RATE_SMOOTHING
+
+    if elapsed_hours <= 0:
+        return previous_rate or 0.0
+
+    observed = new_comments / elapsed_hours
+    if previous_rate is None:
+        return observed
+    return smoothing * observed + (1 - smoothing) * previous_rate
+
+
+def next_interval_minutes(
+    rate_per_hour: float,
+    min_minutes: int,
+    max_minutes: int,
+    target_comments: float = None
+) -> int:
+    """Minutes until the next check, aiming for `target_comments` new comments"""
+    if target_comments is None:
+        target_comments = settings.ADAPTIVE_TARGET_COMMENTS_PER_CHECK
+
+    min_minutes = max(1, min_minutes or 1)
+    max_minutes = max(min_minutes, max_minutes or min_minutes)
+
+    if rate_per_hour <= 0:
+        return max_minutes
+
+    minutes = int(target_comments / rate_per_hour * 60)
+    return max(min_minutes, min(max_minutes, minutes))
+
+
+def plan_next_check(video: Dict, stats: Dict, replies_in_window: int = 0) -> Dict:
+    """Work out the poll bookkeeping for a video after a check
+
+    `video` is the videos row as it was before the check, `stats` the
+    reply_to_comment_stream result. Returns the values for record_video_poll.
+    """
+    now = datetime.utcnow()
+    newest = parse_published_at(stats.get('newest_published_at')) or video.get('newest_comment_at')
+
+    if not video.get('adaptive_schedule'):
+        return {
+            "comment_rate_per_hour": video.get('comment_rate_per_hour'),
+            "newest_comment_at": newest,
+            "interval_minutes": video.get('schedule_interval_minutes') or 60,
+        }
+
+    previous_rate = video.get('comment_rate_per_hour')
+    if previous_rate is None:
+        previous_rate = seed_rate_from_history(replies_in_window)
+
+    last_checked = video.get('last_checked_at')
+    if last_checked and video.get('newest_comment_at'):
+        elapsed_hours = (now - last_checked).total_seconds() / 3600
+        rate = update_comment_rate(previous_rate, stats.get('arrived_since_last_poll', 0), elapsed_hours)
+    else:
+        # First adaptive poll - no baseline to measure arrivals against
+        rate = previous_rate
+
+    return {
+        "comment_rate_per_hour": rate,
+        "newest_comment_at": newest,
+        "interval_minutes": next_interval_minutes(
+            rate,
+            video.get('min_interval_minutes') or settings.ADAPTIVE_MIN_INTERVAL_MINUTES,
+            video.get('max_interval_minutes') or settings.ADAPTIVE_MAX_INTERVAL_MINUTES,
+        ),
+    }
+
+
+def next_check_at(interval_minutes: int) -> datetime:
+    return datetime.utcnow() + timedelta(minutes=interval_minutes)
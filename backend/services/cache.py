@@ -7,19 +7,30 @@ Features:
 - Session and token caching
 - Replied comments bloom filter-like cache
 """
+import asyncio
+import logging
 import redis.asyncio as redis
-from typing import Optional, List, Dict, Set
+from typing import Optional, List, Dict, Set, Any, Awaitable, Callable
 from datetime import date
 import json
 
 from config import settings
+from utils import serialization
+from services.metrics import QUOTA_UNITS, REDIS_SECONDS
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
 
 
 class CacheManager:
     """Redis-based caching for high-performance operations"""
     
+    # Max seconds one process may hold a recompute lock
+    FILL_LOCK_SECONDS = 10
+    
     def __init__(self):
         self.redis: Optional[redis.Redis] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
     
     async def connect(self):
         """Initialize Redis connection"""
@@ -71,22 +82,20 @@ class CacheManager:
     # VIDEO CACHING
     # ============================================
     
-    async def get_user_videos(self, user_id: int) -> Optional[List[Dict]]:
-        """Get cached videos for user"""
-        data = await self.redis.get(f"videos:{user_id}")
-        return json.loads(data) if data else None
+    async def get_user_videos(self, user_id: int, variant: str = "") -> Optional[List[Dict]]:
+        """Get cached videos for user (`variant` = page/filter params)"""
+        key = await self.versioned_key("videos", user_id, variant)
+        data = await self.redis.get(key)
+        return serialization.loads(data) if data else None
     
-    async def set_user_videos(self, user_id: int, videos: List[Dict], ttl: int = 300):
+    async def set_user_videos(self, user_id: int, videos: List[Dict], variant: str = "", ttl: int = 300):
         """Cache videos for 5 minutes"""
-        await self.redis.setex(
-            f"videos:{user_id}",
-            ttl,
-            json.dumps(videos, default=str)
-        )
+        key = await self.versioned_key("videos", user_id, variant)
+        await self.redis.setex(key, ttl, serialization.dumps(videos))
     
     async def invalidate_user_videos(self, user_id: int):
-        """Invalidate videos cache after sync"""
-        await self.redis.delete(f"videos:{user_id}")
+        """Invalidate every cached videos page for a user"""
+        await self.bump_version("videos", user_id)
     
     # ============================================
     # REPLIED COMMENTS CACHE (Fast duplicate check)
@@ -105,7 +114,8 @@ class CacheManager:
         for cid in comment_ids:
             pipe.sismember("replied_comments", cid)
         
-        results = await pipe.execute()
+        with REDIS_SECONDS.time(operation="replied_check"), span("redis.replied_check", comments=len(comment_ids)):
+            results = await pipe.execute()
         return {cid for cid, is_member in zip(comment_ids, results) if is_member}
     
     async def mark_comment_replied(self, comment_id: str):
@@ -126,18 +136,98 @@ class CacheManager:
     # ANALYTICS CACHING
     # ============================================
     
-    async def get_analytics(self, user_id: int) -> Optional[Dict]:
+    async def get_analytics(self, user_id: int, variant: str = "") -> Optional[Dict]:
         """Get cached analytics"""
-        data = await self.redis.get(f"analytics:{user_id}")
-        return json.loads(data) if data else None
+        key = await self.versioned_key("analytics", user_id, variant)
+        data = await self.redis.get(key)
+        return serialization.loads(data) if data else None
     
-    async def set_analytics(self, user_id: int, analytics: Dict, ttl: int = 60):
+    async def set_analytics(self, user_id: int, analytics: Dict, variant: str = "", ttl: int = 60):
         """Cache analytics for 1 minute"""
-        await self.redis.setex(
-            f"analytics:{user_id}",
-            ttl,
-            json.dumps(analytics, default=str)
-        )
+        key = await self.versioned_key("analytics", user_id, variant)
+        await self.redis.setex(key, ttl, serialization.dumps(analytics))
+    
+    async def invalidate_analytics(self, user_id: int):
+        """Invalidate cached analytics after replies are written"""
+        await self.bump_version("analytics", user_id)
+    
+    # ============================================
+    # READ-THROUGH RESPONSE CACHE
+    # ============================================
+    
+    async def versioned_key(self, namespace: str, user_id: int, variant: str = "") -> str:
+        """Cache key under the user's current version of `namespace`
+        
+        Bumping the version orphans every variant at once (all pages and
+        filters); the orphans simply expire.
+        """
+        version = await self.redis.get(f"{namespace}_ver:{user_id}") or 0
+        return f"{namespace}:{user_id}:v{version}:{variant}"
+    
+    async def bump_version(self, namespace: str, user_id: int):
+        await self.redis.incr(f"{namespace}_ver:{user_id}")
+    
+    async def read_through(
+        self,
+        namespace: str,
+        user_id: int,
+        compute: Callable[[], Awaitable[Any]],
+        variant: str = "",
+        ttl: int = 60
+    ) -> Any:
+        """Return the cached value, or compute and cache it
+        
+        Recomputes are single-flight: concurrent misses in this process share
+        one computation, and across processes only the holder of a short
+        Redis lock computes while the others wait for its result.
+        Falls back to `compute()` if Redis is unavailable.
+        """
+        if self.redis is None:
+            return await compute()
+        
+        try:
+            with REDIS_SECONDS.time(operation="cache_read"), span("redis.cache_read", namespace=namespace):
+                key = await self.versioned_key(namespace, user_id, variant)
+                data = await self.redis.get(key)
+            if data is not None:
+                return serialization.loads(data)
+        except Exception as e:
+            logger.warning("Cache read failed for %s:%s: %s", namespace, user_id, e)
+            return await compute()
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fill(key, compute, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+    
+    async def _fill(self, key: str, compute: Callable[[], Awaitable[Any]], ttl: int) -> Any:
+        lock_key = f"lock:{key}"
+        try:
+            locked = await self.redis.set(lock_key, "1", nx=True, ex=self.FILL_LOCK_SECONDS)
+        except Exception as e:
+            logger.warning("Cache lock failed for %s: %s", key, e)
+            return await compute()
+        
+        if not locked:
+            # Another process is computing - wait for its result
+            deadline = asyncio.get_running_loop().time() + self.FILL_LOCK_SECONDS
+            while asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(0.05)
+                data = await self.redis.get(key)
+                if data is not None:
+                    return serialization.loads(data)
+            return await compute()
+        
+        try:
+            value = await compute()
+            # Round-trip through JSON so hits and misses return the same shape
+            encoded = serialization.dumps(value)
+            await self.redis.setex(key, ttl, encoded)
+            return serialization.loads(encoded)
+        finally:
+            await self.redis.delete(lock_key)
 
 
 class QuotaManager:
@@ -176,9 +266,8 @@ class QuotaManager:
         # Note: In Redis mode, we track quota units, not reply count
         # Each reply costs 50 units, so we divide by 50 to get approximate reply count
         # For exact count, we fall back to DB
-        from db import get_reply_stats
-        stats = await get_reply_stats(user_id, days=1)
-        return stats.get('total_replies', 0) if stats else 0
+        from db import get_user_reply_count
+        return await get_user_reply_count(user_id)
     
     async def can_user_reply(self, user_id: int) -> bool:
         """Check if user hasn't exceeded their daily limit"""
@@ -196,12 +285,15 @@ class QuotaManager:
         return (current + cost) <= self.daily_limit
     
     async def track_request(self, cost: int, user_id: Optional[int] = None):
-        """Track API request quota usage"""
-        key = self._get_quota_key(user_id)
+        """Track API request quota usage (per-user and project-wide)"""
+        keys = {self._get_quota_key(user_id), self._get_quota_key()}
         pipe = self.cache.redis.pipeline()
-        pipe.incrby(key, cost)
-        pipe.expire(key, 86400 * 2)  # 2 day TTL for safety
-        await pipe.execute()
+        for key in keys:
+            pipe.incrby(key, cost)
+            pipe.expire(key, 86400 * 2)  # 2 day TTL for safety
+        with REDIS_SECONDS.time(operation="quota_track"), span("redis.quota_track", **{"youtube.quota_cost": cost}):
+            await pipe.execute()
+        QUOTA_UNITS.inc(cost)
     
     async def get_remaining_quota(self, user_id: Optional[int] = None) -> int:
         """Get remaining quota for today"""
@@ -238,6 +330,19 @@ async def init_cache():
     quota_manager = QuotaManager(cache_manager)
 
 
+async def invalidate_user_caches(user_id: int, videos: bool = True, analytics: bool = True):
+    """Drop a user's cached video lists / analytics (no-op without Redis)"""
+    if cache_manager.redis is None:
+        return
+    try:
+        if videos:
+            await cache_manager.invalidate_user_videos(user_id)
+        if analytics:
+            await cache_manager.invalidate_analytics(user_id)
+    except Exception as e:
+        logger.warning("Cache invalidation failed for user %s: %s", user_id, e)
+
+
 async def close_cache():
     """Close cache on shutdown"""
     await cache_manager.close()
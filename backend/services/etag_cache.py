@@ -0,0 +1,89 @@
+"""
+Conditional GET Cache for YouTube Data API responses
+
+Keeps the ETag and body of cacheable GET responses so repeat requests can
+send If-None-Match and reuse the stored body on 304 Not Modified.
+- Redis-backed when the cache is connected (shared by web and workers)
+- In-process LRU fallback otherwise, or if Redis errors
+"""
+import copy
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Never part of the cache key - tokens rotate, the resource doesn't
+_EXCLUDED_PARAMS = {"access_token", "key"}
+
+
+class EtagCache:
+    """ETag + response body store keyed by URL and params"""
+
+    def __init__(self, max_local_entries: int = 1000, ttl: int = 86400):
+        self.max_local_entries = max_local_entries
+        self.ttl = ttl
+        self._local: "OrderedDict[str, Tuple[str, Dict]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(url: str, params: Dict, scope: Optional[str] = None) -> str:
+        """Cache key from URL + params, without credentials
+
+        `scope` separates responses that depend on who is asking
+        (e.g. mine=true) rather than on the URL alone.
+        """
+        parts = sorted(
+            (k, str(v)) for k, v in params.items() if k not in _EXCLUDED_PARAMS
+        )
+        raw = json.dumps([url, parts, scope], separators=(",", ":"))
+        return "etag:" + hashlib.sha1(raw.encode()).hexdigest()
+
+    def _redis(self):
+        from services.cache import cache_manager
+        return cache_manager.redis
+
+    async def get(self, key: str) -> Optional[Tuple[str, Dict]]:
+        """Return (etag, body) if cached"""
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                data = await redis_client.get(key)
+                if data:
+                    entry = json.loads(data)
+                    return entry["etag"], entry["body"]
+                return None
+            except Exception as e:
+                logger.warning("ETag cache read failed, using local cache: %s", e)
+
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        self._local.move_to_end(key)
+        etag, body = entry
+        # Callers mutate response dicts - hand out a copy
+        return etag, copy.deepcopy(body)
+
+    async def set(self, key: str, etag: str, body: Dict):
+        """Store a response body under its ETag"""
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                await redis_client.setex(
+                    key,
+                    self.ttl,
+                    json.dumps({"etag": etag, "body": body})
+                )
+                return
+            except Exception as e:
+                logger.warning("ETag cache write failed, using local cache: %s", e)
+
+        self._local[key] = (etag, copy.deepcopy(body))
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_local_entries:
+            self._local.popitem(last=False)
+
+
+# Global instance
+etag_cache = EtagCache()
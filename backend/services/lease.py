@@ -0,0 +1,219 @@
+"""
+Redis Leases with Fencing Tokens
+
+Guards work that must not run twice at once - the scheduler tick and the
+check of each video - without serialising unrelated work:
+- A lease is a Redis key holding its holder, fencing token, start time and
+  last heartbeat; it expires unless the holder keeps heartbeating
+- Fencing tokens increase on every acquire, so a holder that was reclaimed
+  can tell (heartbeat/is_held fail) before it writes anything
+- A run that still heartbeats but has gone past max_runtime counts as
+  stuck and may be taken over by the next acquirer
+- Without Redis every acquire succeeds (single-process deployments)
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+from services.cache import cache_manager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 120
+
+# Replace the lease only if it still holds the value we read / own
+_SWAP_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _lease_key(name: str) -> str:
+    return f"lease:{name}"
+
+
+def _fence_key(name: str) -> str:
+    return f"lease_fence:{name}"
+
+
+def default_holder() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Lease:
+    """A held lease; `token` is its fencing token"""
+
+    def __init__(self, name: str, holder: str, token: int, ttl: int, started_at: float):
+        self.name = name
+        self.holder = holder
+        self.token = token
+        self.ttl = ttl
+        self.started_at = started_at
+        self.heartbeat_at = started_at
+        self.lost = False
+        self._raw = self._encode()
+
+    def _encode(self) -> str:
+        return json.dumps({
+            "holder": self.holder,
+            "token": self.token,
+            "started_at": self.started_at,
+            "heartbeat_at": self.heartbeat_at,
+        })
+
+    async def heartbeat(self) -> bool:
+        """Extend the lease; False (and `lost` set) if it was reclaimed"""
+        redis_client = cache_manager.redis
+        if redis_client is None or self.lost:
+            return not self.lost
+
+        previous = self._raw
+        self.heartbeat_at = time.time()
+        self._raw = self._encode()
+        swapped = await redis_client.eval(
+            _SWAP_SCRIPT, 1, _lease_key(self.name), previous, self._raw, self.ttl
+        )
+        if not swapped:
+            self.lost = True
+        return not self.lost
+
+    async def is_held(self) -> bool:
+        """Check the fencing token is still current before a write"""
+        redis_client = cache_manager.redis
+        if redis_client is None or self.lost:
+            return not self.lost
+        current = await redis_client.get(_lease_key(self.name))
+        if current is None or json.loads(current)["token"] != self.token:
+            self.lost = True
+        return not self.lost
+
+    async def release(self):
+        redis_client = cache_manager.redis
+        if redis_client is None or self.lost:
+            return
+        await redis_client.eval(_RELEASE_SCRIPT, 1, _lease_key(self.name), self._raw)
+
+    def __repr__(self):
+        return f"Lease({self.name!r}, holder={self.holder!r}, token={self.token})"
+
+
+async def acquire_lease(
+    name: str,
+    ttl: int = DEFAULT_TTL,
+    max_runtime: Optional[int] = None,
+    holder: Optional[str] = None
+) -> Optional[Lease]:
+    """Take the lease, or None if someone else holds it
+
+    A lease whose holder stopped heartbeating simply expires after `ttl`.
+    With `max_runtime`, a holder that keeps heartbeating for longer than
+    that is treated as stuck and the lease is reclaimed.
+    """
+    holder = holder or default_holder()
+    redis_client = cache_manager.redis
+    if redis_client is None:
+        return Lease(name, holder, 0, ttl, time.time())
+
+    token = await redis_client.incr(_fence_key(name))
+    lease = Lease(name, holder, token, ttl, time.time())
+    if await redis_client.set(_lease_key(name), lease._raw, nx=True, ex=ttl):
+        return lease
+
+    if max_runtime is None:
+        return None
+
+    current = await redis_client.get(_lease_key(name))
+    if current is None:
+        # Expired in between - try once more
+        if await redis_client.set(_lease_key(name), lease._raw, nx=True, ex=ttl):
+            return lease
+        return None
+
+    info = json.loads(current)
+    if time.time() - info["started_at"] < max_runtime:
+        return None
+
+    # Stuck run - take over only if nobody else did first
+    if await redis_client.eval(_SWAP_SCRIPT, 1, _lease_key(name), current, lease._raw, ttl):
+        logger.warning("Reclaimed stuck lease %s from %s (token %s)", name, info['holder'], info['token'])
+        return lease
+    return None
+
+
+async def _keep_alive(lease: Lease, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if not await lease.heartbeat():
+                logger.warning("Lease %s was reclaimed by another holder", lease.name)
+                return
+        except Exception as e:
+            # Keep trying - the lease only lapses after a full TTL
+            logger.warning("Lease heartbeat failed for %s: %s", lease.name, e)
+
+
+@asynccontextmanager
+async def hold_lease(
+    name: str,
+    ttl: int = DEFAULT_TTL,
+    max_runtime: Optional[int] = None,
+    holder: Optional[str] = None
+) -> AsyncIterator[Optional[Lease]]:
+    """Hold a lease for the duration of the block, heartbeating at ttl/3
+
+    Yields None if the lease is taken; the block should then skip its work.
+    """
+    lease = await acquire_lease(name, ttl, max_runtime, holder)
+    if lease is None:
+        yield None
+        return
+
+    keep_alive = asyncio.create_task(_keep_alive(lease, ttl / 3))
+    try:
+        yield lease
+    finally:
+        keep_alive.cancel()
+        try:
+            await lease.release()
+        except Exception as e:
+            logger.warning("Lease release failed for %s: %s", name, e)
+
+
+async def held_leases(names: Iterable[str]) -> Set[str]:
+    """Which of `names` are currently leased (one round trip)"""
+    names = list(names)
+    redis_client = cache_manager.redis
+    if redis_client is None or not names:
+        return set()
+    values = await redis_client.mget([_lease_key(n) for n in names])
+    return {name for name, value in zip(names, values) if value is not None}
+
+
+async def get_lease_info(name: str) -> Optional[Dict]:
+    """Holder, token, start time and heartbeat age of a lease - for spotting stuck runs"""
+    redis_client = cache_manager.redis
+    if redis_client is None:
+        return None
+    current = await redis_client.get(_lease_key(name))
+    if current is None:
+        return None
+    info = json.loads(current)
+    now = time.time()
+    info["running_seconds"] = now - info["started_at"]
+    info["heartbeat_age_seconds"] = now - info["heartbeat_at"]
+    return info
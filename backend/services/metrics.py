@@ -0,0 +1,293 @@
+"""
+Pipeline Metrics (Prometheus text exposition format)
+
+A small in-process registry - no client library or collector needed:
+- Counters and histograms with labels, rendered by render_metrics()
+- The API serves them at /metrics; worker processes can run their own
+  exporter (start_exporter) since tasks run outside the web process
+- Each process keeps its own numbers (gunicorn workers, Celery children);
+  scrape every process and sum in the query
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds - covers a sub-ms Redis call up to a multi-minute task
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of the block (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def get_count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return int(entry[-1]) if entry else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(entry)) for key, entry in self._values.items()]
+        lines = []
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(entry[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(entry[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets=buckets))
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+# ============================================
+# PIPELINE METRICS
+# ============================================
+
+YOUTUBE_REQUEST_SECONDS = histogram(
+    "reply_youtube_request_seconds",
+    "YouTube Data API request latency",
+    ("endpoint", "method", "status")
+)
+
+QUOTA_UNITS = counter(
+    "reply_quota_units_total",
+    "YouTube API quota units charged"
+)
+
+COMMENTS = counter(
+    "reply_comments_total",
+    "Comments through the reply pipeline by stage (fetched, matched, deduped, replied, failed)",
+    ("stage",)
+)
+
+DB_ACQUIRE_SECONDS = histogram(
+    "reply_db_pool_acquire_seconds",
+    "Time waiting for a Postgres connection from the pool",
+    ("pool",)
+)
+
+DB_QUERIES = counter(
+    "reply_db_queries_total",
+    "Postgres statements executed",
+    ("pool",)
+)
+
+REDIS_SECONDS = histogram(
+    "reply_redis_command_seconds",
+    "Redis round-trip latency by operation",
+    ("operation",)
+)
+
+SCHEDULER_LAG_SECONDS = histogram(
+    "reply_scheduler_lag_seconds",
+    "How late due videos were picked up (now - next_check_at)",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+)
+
+QUEUE_WAIT_SECONDS = histogram(
+    "reply_task_queue_wait_seconds",
+    "Time tasks waited in the broker before starting",
+    ("queue",)
+)
+
+TASK_SECONDS = histogram(
+    "reply_task_duration_seconds",
+    "Background task run time",
+    ("task", "status")
+)
+
+
+def endpoint_name(url: str) -> str:
+    """/youtube/v3/commentThreads?... -> commentThreads (bounded label values)"""
+    return url.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+
+
+def record_comment_stats(stats: Dict):
+    """Count one reply_to_comment_stream run's stats by stage"""
+    matched = stats.get("matched_keywords", 0)
+    new = stats.get("new_comments", 0)
+    COMMENTS.inc(stats.get("total_comments", 0), stage="fetched")
+    COMMENTS.inc(matched, stage="matched")
+    COMMENTS.inc(max(0, matched - new), stage="deduped")
+    COMMENTS.inc(stats.get("succeeded", 0), stage="replied")
+    COMMENTS.inc(stats.get("failed", 0), stage="failed")
+
+
+# ============================================
+# WORKER EXPORTER
+# ============================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the worker log
+
+
+_exporter: Optional[ThreadingHTTPServer] = None
+
+
+def start_exporter(port: int, attempts: int = 16) -> Optional[int]:
+    """Serve /metrics from a daemon thread; returns the bound port
+
+    Prefork children each need their own port, so the first free port in
+    [port, port + attempts) is used.
+    """
+    global _exporter
+    if _exporter is not None:
+        return _exporter.server_address[1]
+
+    for candidate in range(port, port + attempts):
+        try:
+            _exporter = ThreadingHTTPServer(("0.0.0.0", candidate), _MetricsHandler)
+        except OSError:
+            continue
+        _exporter.daemon_threads = True
+        threading.Thread(target=_exporter.serve_forever, name="metrics-exporter", daemon=True).start()
+        return candidate
+
+    logger.warning("Metrics exporter: no free port in %d-%d", port, port + attempts - 1)
+    return None
@@ -0,0 +1,148 @@
+"""
+Job Progress Events over Redis
+
+Workers publish progress for a job to a pub/sub channel; the web process
+relays them to the browser as Server-Sent Events.
+- Every event is also appended to a short-lived log, so a client that
+  connects after the job started replays what it missed
+- A job ends with a "done" or "error" event
+- EventSource can't send headers, so the stream is opened with a short-lived
+  token scoped to one job instead of the session JWT in the URL
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional
+
+import jwt
+
+from config import settings
+from services.cache import cache_manager
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_TTL = 3600
+TERMINAL_EVENTS = ("done", "error")
+
+# Only checked when the stream (re)connects - a live stream outlasts it
+STREAM_TOKEN_TTL = 600
+STREAM_TOKEN_SCOPE = "job_progress"
+
+
+def _channel(job_id: str) -> str:
+    return f"progress:{job_id}"
+
+
+def _log_key(job_id: str) -> str:
+    return f"progress_log:{job_id}"
+
+
+def _seq_key(job_id: str) -> str:
+    return f"progress_seq:{job_id}"
+
+
+def _owner_key(job_id: str) -> str:
+    return f"progress_owner:{job_id}"
+
+
+class ProgressPublisher:
+    """Publishes events for one job (no-op without Redis)"""
+
+    def __init__(self, job_id: Optional[str]):
+        self.job_id = job_id
+
+    async def publish(self, event: str, **data):
+        redis_client = cache_manager.redis
+        if not self.job_id or redis_client is None:
+            return
+
+        try:
+            # Sequence numbers let subscribers drop events they already replayed
+            seq = await redis_client.incr(_seq_key(self.job_id))
+            payload = json.dumps({"event": event, "seq": seq, **data}, default=str)
+            pipe = redis_client.pipeline()
+            pipe.rpush(_log_key(self.job_id), payload)
+            pipe.expire(_log_key(self.job_id), PROGRESS_TTL)
+            pipe.expire(_seq_key(self.job_id), PROGRESS_TTL)
+            pipe.publish(_channel(self.job_id), payload)
+            await pipe.execute()
+        except Exception as e:
+            # Progress is best-effort - never fail the job over it
+            logger.warning("Progress publish failed for %s: %s", self.job_id, e)
+
+    async def report(self, event: str, data: Dict):
+        """ReplyEngine on_progress callback"""
+        await self.publish(event, **data)
+
+
+async def register_job(job_id: str, user_id: int):
+    """Record who may watch a job's progress"""
+    await cache_manager.redis.setex(_owner_key(job_id), PROGRESS_TTL, str(user_id))
+
+
+def create_stream_token(job_id: str, user_id: int) -> str:
+    """Token that only opens the progress stream of `job_id`
+
+    Carries no user_id/sub claim, so get_current_user can't take it for a
+    session token.
+    """
+    now = datetime.utcnow()
+    return jwt.encode({
+        "scope": STREAM_TOKEN_SCOPE,
+        "job_id": job_id,
+        "owner": user_id,
+        "iat": now,
+        "exp": now + timedelta(seconds=STREAM_TOKEN_TTL),
+    }, settings.SECRET_KEY, algorithm="HS256")
+
+
+def verify_stream_token(token: str, job_id: str) -> Optional[int]:
+    """Owner's user id if `token` is a valid stream token for `job_id`"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return None
+    if payload.get("scope") != STREAM_TOKEN_SCOPE or payload.get("job_id") != job_id:
+        return None
+    return payload.get("owner")
+
+
+async def get_job_owner(job_id: str) -> Optional[int]:
+    owner = await cache_manager.redis.get(_owner_key(job_id))
+    return int(owner) if owner else None
+
+
+async def stream_progress(job_id: str, heartbeat: float = 15.0) -> AsyncIterator[Dict]:
+    """Yield a job's events - backlog first, then live - until it finishes
+
+    Yields None every `heartbeat` seconds without events so the caller can
+    keep the connection alive.
+    """
+    redis_client = cache_manager.redis
+    pubsub = redis_client.pubsub()
+    # Subscribe before reading the backlog so nothing falls in between
+    await pubsub.subscribe(_channel(job_id))
+    try:
+        last_seq = 0
+        for raw in await redis_client.lrange(_log_key(job_id), 0, -1):
+            event = json.loads(raw)
+            last_seq = max(last_seq, event["seq"])
+            yield event
+            if event["event"] in TERMINAL_EVENTS:
+                return
+
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=heartbeat)
+            if message is None:
+                yield None
+                continue
+            event = json.loads(message["data"])
+            if event["seq"] <= last_seq:
+                continue  # Already replayed from the log
+            last_seq = event["seq"]
+            yield event
+            if event["event"] in TERMINAL_EVENTS:
+                return
+    finally:
+        await pubsub.unsubscribe(_channel(job_id))
+        await pubsub.close()
@@ -1,7 +1,8 @@
 from datetime import datetime, date
 from typing import Dict
 from config import settings
-from database_pg import get_direct_connection, get_pool
+from database_pg import get_direct_connection, get_pool, get_user_reply_count
+from services.metrics import QUOTA_UNITS
 
 class QuotaManager:
     """Manage YouTube API quota - using persistent Database storage"""
@@ -36,26 +37,10 @@ class QuotaManager:
         return usage
     
     async def get_user_reply_count(self, user_id: int) -> int:
-        """Get THIS user's reply count today (for dashboard display)"""
-        pool = get_pool()
-        today = date.today()
-        
-        # Count actual replies sent today
-        query = """
-            SELECT COUNT(*) FROM replied_comments 
-            WHERE user_id = $1 AND DATE(replied_at) = $2
-        """
-        
+        """Replies counted against THIS user's daily limit (rolling 24 hours)"""
         count = 0
         try:
-            if pool:
-                async with pool.acquire() as conn:
-                    val = await conn.fetchval(query, user_id, today)
-                    count = val or 0
-            else:
-                async with get_direct_connection() as conn:
-                    val = await conn.fetchval(query, user_id, today)
-                    count = val or 0
+            count = await get_user_reply_count(user_id) or 0
         except Exception as e:
             print(f"Error reading user reply count: {e}")
             
@@ -102,6 +87,7 @@ class QuotaManager:
     
     async def track_request(self, cost: int, user_id: int = None):
         """Track API request - persist to DB"""
+        QUOTA_UNITS.inc(cost)
         if user_id:
             pool = get_pool()
             today = date.today()
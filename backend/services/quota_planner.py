@@ -0,0 +1,237 @@
+"""
+Quota Budget Planner
+
+Splits the day's remaining YouTube API units across users and videos at
+each scheduler tick:
+- Spending is paced over the day (a burst allowance on top of a linear
+  release) so early heavy users can't drain the quota by mid-day
+- Users are weighted by fairness (replies left today) and expected yield
+  (comment rate of their due videos)
+- Each user's share is split into read (comment list) and write (reply)
+  units, then handed to their videos as explicit budgets
+- Budgets handed to jobs that are still queued or running are reserved
+  (in Redis) and count as spent until the job finishes, so the next tick
+  doesn't hand out the same units again
+"""
+import json
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# YouTube's quota day runs midnight to midnight Pacific time
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+# Hash of {task_id: reservation} for dispatched jobs - keyed by the
+# dispatch, so a late finisher can't release a newer dispatch's budget
+RESERVATIONS_KEY = "quota_reserved"
+# A reservation older than this belongs to a job that died without
+# releasing it (matches the video lease's max runtime)
+RESERVATION_MAX_AGE = 1800
+
+
+class QuotaBudget:
+    """Unit budget for one video job"""
+
+    __slots__ = ("read_units", "write_units")
+
+    def __init__(self, read_units: int = 0, write_units: int = 0):
+        self.read_units = read_units
+        self.write_units = write_units
+
+    @property
+    def max_pages(self) -> int:
+        return self.read_units // settings.FETCH_COST
+
+    @property
+    def max_replies(self) -> int:
+        return self.write_units // settings.REPLY_COST
+
+    def spend_read(self, units: int = None) -> bool:
+        """Charge one comment page; False once the read allowance is used up"""
+        units = settings.FETCH_COST if units is None else units
+        self.read_units = max(0, self.read_units - units)
+        return self.read_units >= settings.FETCH_COST
+
+    def spend_write(self, units: int = None):
+        units = settings.REPLY_COST if units is None else units
+        self.write_units = max(0, self.write_units - units)
+
+    def to_dict(self) -> Dict:
+        return {"read_units": self.read_units, "write_units": self.write_units}
+
+    def __repr__(self):
+        return f"QuotaBudget(read_units={self.read_units}, write_units={self.write_units})"
+
+
+def quota_day_fraction(now: Optional[datetime] = None) -> float:
+    """How much of the current Pacific quota day has passed (0.0-1.0)
+
+    `now` is naive UTC. Measured against the day's real length, so the
+    23 and 25 hour days at DST changes still run from 0 to 1.
+    """
+    now = (now or datetime.utcnow()).replace(tzinfo=timezone.utc)
+    local = now.astimezone(QUOTA_TIMEZONE)
+    # Subtracting in the same zone compares wall clocks - go through UTC
+    midnight, next_midnight = (
+        datetime.combine(day, datetime.min.time(), tzinfo=QUOTA_TIMEZONE).astimezone(timezone.utc)
+        for day in (local.date(), local.date() + timedelta(days=1))
+    )
+    elapsed = (now - midnight).total_seconds()
+    length = (next_midnight - midnight).total_seconds()
+    return min(1.0, max(0.0, elapsed / length))
+
+
+def paced_allowance(used_today: int, now: Optional[datetime] = None) -> int:
+    """Units that may be spent right now under the daily pacing curve
+
+    Quota resets at midnight Pacific; the release is linear over the day
+    plus QUOTA_BURST_FRACTION of the daily limit up front.
+    """
+    limit = settings.DAILY_QUOTA_LIMIT
+    released = limit * min(1.0, settings.QUOTA_BURST_FRACTION + quota_day_fraction(now))
+    return max(0, int(released) - used_today)
+
+
+def _user_weight(remaining_replies: int, expected_rate: float) -> float:
+    fairness = remaining_replies / max(1, settings.USER_DAILY_REPLY_LIMIT)
+    return fairness * math.sqrt(1 + expected_rate)
+
+
+def allocate(
+    videos: List[Dict],
+    spendable: int,
+    remaining_replies: Dict[int, int]
+) -> Dict[str, QuotaBudget]:
+    """Allocate `spendable` units to due videos; returns {video_id: budget}
+
+    `remaining_replies` maps user_id to replies left under the per-user cap.
+    """
+    by_user: Dict[int, List[Dict]] = {}
+    for video in videos:
+        by_user.setdefault(video['user_id'], []).append(video)
+
+    weights = {
+        user_id: _user_weight(
+            remaining_replies.get(user_id, 0),
+            sum(v.get('comment_rate_per_hour') or 0 for v in user_videos)
+        )
+        for user_id, user_videos in by_user.items()
+    }
+    total_weight = sum(weights.values())
+
+    budgets: Dict[str, QuotaBudget] = {}
+    for user_id, user_videos in by_user.items():
+        share = int(spendable * weights[user_id] / total_weight) if total_weight else 0
+
+        # Reads first - a video that can't be listed can't be replied to
+        read_per_video = settings.QUOTA_READ_PAGES_PER_VIDEO * settings.FETCH_COST
+        read_total = min(share, read_per_video * len(user_videos))
+        write_total = min(
+            share - read_total,
+            remaining_replies.get(user_id, 0) * settings.REPLY_COST
+        )
+
+        video_weights = [1 + (v.get('comment_rate_per_hour') or 0) for v in user_videos]
+        weight_sum = sum(video_weights)
+        for video, weight in zip(user_videos, video_weights):
+            budgets[video['video_id']] = QuotaBudget(
+                read_units=read_total // len(user_videos),
+                write_units=int(write_total * weight / weight_sum)
+            )
+
+    return budgets
+
+
+async def outstanding_budgets() -> Tuple[int, Dict[int, int]]:
+    """Units and replies still reserved by queued or running jobs
+
+    Returns (total units, {user_id: replies}). Stale reservations are
+    dropped on the way. Without Redis nothing is reserved.
+    """
+    from services.cache import cache_manager
+
+    if cache_manager.redis is None:
+        return 0, {}
+
+    entries = await cache_manager.redis.hgetall(RESERVATIONS_KEY)
+    cutoff = time.time() - RESERVATION_MAX_AGE
+    units = 0
+    replies: Dict[int, int] = {}
+    stale = []
+    for task_id, raw in entries.items():
+        reservation = json.loads(raw)
+        if reservation['at'] < cutoff:
+            stale.append(task_id)
+            continue
+        units += reservation['units']
+        user_id = reservation['user_id']
+        replies[user_id] = replies.get(user_id, 0) + reservation['replies']
+    if stale:
+        logger.warning("Dropping %d stale quota reservations", len(stale))
+        await cache_manager.redis.hdel(RESERVATIONS_KEY, *stale)
+    return units, replies
+
+
+async def reserve_budgets(jobs: List[Tuple[str, int, QuotaBudget]]):
+    """Reserve the budgets of dispatched (task_id, user_id, budget) jobs"""
+    from services.cache import cache_manager
+
+    if cache_manager.redis is None or not jobs:
+        return
+    now = time.time()
+    await cache_manager.redis.hset(RESERVATIONS_KEY, mapping={
+        task_id: json.dumps({
+            "user_id": user_id,
+            "units": budget.read_units + budget.write_units,
+            "replies": budget.max_replies,
+            "at": now,
+        })
+        for task_id, user_id, budget in jobs
+    })
+
+
+async def release_budget(task_id: str):
+    """Drop a dispatch's reservation once its job has finished (spent or not)"""
+    from services.cache import cache_manager
+
+    if cache_manager.redis is None:
+        return
+    try:
+        await cache_manager.redis.hdel(RESERVATIONS_KEY, task_id)
+    except Exception as e:
+        # Expires via RESERVATION_MAX_AGE
+        logger.warning("Could not release quota reservation for %s: %s", task_id, e)
+
+
+async def plan_tick(videos: List[Dict], quota_mgr) -> Dict[str, QuotaBudget]:
+    """Budget every due video for this scheduler tick"""
+    if not videos:
+        return {}
+
+    used_today = await quota_mgr.get_current_usage()
+    # What running jobs were handed is as good as spent - their actual
+    # spend so far is also in used_today, so this errs on the safe side
+    reserved_units, reserved_replies = await outstanding_budgets()
+    spendable = max(0, min(
+        paced_allowance(used_today),
+        settings.DAILY_QUOTA_LIMIT - used_today
+    ) - reserved_units)
+
+    remaining_replies = {}
+    for user_id in {v['user_id'] for v in videos}:
+        try:
+            remaining = await quota_mgr.get_user_remaining_replies(user_id)
+        except Exception as e:
+            # One user's lookup failing shouldn't stall everyone's tick
+            logger.warning("Reply count unavailable for user %s, skipping this tick: %s", user_id, e)
+            remaining = 0
+        remaining_replies[user_id] = max(0, remaining - reserved_replies.get(user_id, 0))
+
+    return allocate(videos, spendable, remaining_replies)
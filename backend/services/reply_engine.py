@@ -1,10 +1,21 @@
 import asyncio
-import random
-from typing import List, Dict, TYPE_CHECKING
-from db import has_replied_batch, mark_comment_replied
+import aiohttp
+import logging
+from contextlib import aclosing
+from typing import List, Dict, Optional, AsyncIterator, Awaitable, Callable, Union, TYPE_CHECKING
+from db import (
+    has_replied_batch, enqueue_reply_intents, claim_reply_intents,
+    complete_reply_intent, fail_reply_intent, release_reply_intents
+)
 from config import settings
 from utils.human_delays import HumanDelayGenerator
-from utils.text_variation import TextVariation
+from utils.text_variation import TextVariation, TemplateSet
+from services.youtube_client import CommentRecord
+from services.quota_planner import QuotaBudget
+from services.video_config import KeywordMatcher
+from services.cache import invalidate_user_caches
+from services.metrics import record_comment_stats
+from utils.tracing import span
 
 # Import QuotaManager for type hints
 if TYPE_CHECKING:
@@ -16,6 +27,11 @@ else:
     except ImportError:
         QuotaManager = None  # Will be passed as instance anyway
 
+logger = logging.getLogger(__name__)
+
+# Awaited with (event, data) as a reply job makes progress
+ProgressCallback = Callable[[str, Dict], Awaitable[None]]
+
 class ReplyEngine:
     """Core auto-reply logic"""
     
@@ -27,94 +43,317 @@ class ReplyEngine:
     
     def filter_comments_by_keywords(
         self, 
-        comments: List[Dict], 
-        keywords: List[str]
-    ) -> List[Dict]:
-        """Filter comments that match keywords"""
-        if not keywords:
+        comments: List[CommentRecord], 
+        keywords: Union[List[str], KeywordMatcher]
+    ) -> List[CommentRecord]:
+        """Filter comments that match keywords (case-insensitive, first keyword wins)"""
+        matcher = keywords if isinstance(keywords, KeywordMatcher) else KeywordMatcher(keywords)
+        if not matcher:
             return []
         
         filtered = []
-        
         for comment in comments:
-            try:
-                # Get comment text and normalize for case‑insensitive matching
-                text = comment['snippet']['topLevelComment']['snippet']['textDisplay']
-                text_normalized = text.casefold()
-
-                # Check if any keyword matches (case‑insensitive)
-                for keyword in keywords:
-                    if keyword.casefold() in text_normalized:
-                        comment['matched_keyword'] = keyword
-                        filtered.append(comment)
-                        break  # Only match once per comment
-            except (KeyError, AttributeError):
-                continue
+            keyword = matcher.match(comment.text)
+            if keyword is not None:
+                comment.matched_keyword = keyword
+                filtered.append(comment)
         
         return filtered
     
-    async def filter_non_replied(self, comments: List[Dict]) -> List[Dict]:
+    async def filter_non_replied(self, comments: List[CommentRecord]) -> List[CommentRecord]:
         """Filter out already-replied comments (FAST)"""
         if not comments:
             return []
         
-        # Extract comment IDs
-        comment_ids = []
-        for c in comments:
-            try:
-                comment_id = c['id']
-                comment_ids.append(comment_id)
-            except KeyError:
-                continue
-        
         # Batch check (2-5ms for 100 comments)
-        replied_ids = await has_replied_batch(comment_ids)
+        with span("filter_non_replied", comments=len(comments)) as dedupe_span:
+            replied_ids = await has_replied_batch([c.id for c in comments])
+            dedupe_span.set_attribute("already_replied", len(replied_ids))
         
         # Filter out replied comments
-        return [c for c in comments if c['id'] not in replied_ids]
+        return [c for c in comments if c.id not in replied_ids]
+    
+    async def stream_reply_candidates(
+        self,
+        pages: AsyncIterator[List[CommentRecord]],
+        keywords: Union[List[str], KeywordMatcher],
+        stats: Optional[Dict] = None,
+        seen_before: Optional[str] = None,
+        budget: Optional[QuotaBudget] = None
+    ) -> AsyncIterator[List[CommentRecord]]:
+        """Keyword-filter and dedupe comment pages as they arrive
+        
+        Yields the not-yet-replied matches of each page. `stats`, if given,
+        keeps running totals under total_comments / matched_keywords /
+        new_comments, plus newest_published_at and arrived_since_last_poll
+        (comments published after `seen_before`) for the adaptive scheduler.
+        Each page is charged to `budget`, if given; no further page is
+        fetched once its read allowance is used up.
+        """
+        if stats is None:
+            stats = {}
+        for key in ("total_comments", "matched_keywords", "new_comments", "arrived_since_last_poll"):
+            stats.setdefault(key, 0)
+        stats.setdefault("newest_published_at", None)
+        
+        if not isinstance(keywords, KeywordMatcher):
+            keywords = KeywordMatcher(keywords)
+        
+        async with aclosing(pages):
+            async for page in pages:
+                stats["total_comments"] += len(page)
+                out_of_reads = budget is not None and not budget.spend_read()
+                
+                # publishedAt is fixed-width ISO 8601, so strings compare in time order
+                for comment in page:
+                    published = comment.published_at
+                    if not published:
+                        continue
+                    if stats["newest_published_at"] is None or published > stats["newest_published_at"]:
+                        stats["newest_published_at"] = published
+                    if seen_before is not None and published > seen_before:
+                        stats["arrived_since_last_poll"] += 1
+                
+                with span("filter_comments_by_keywords", comments=len(page)) as match_span:
+                    filtered = self.filter_comments_by_keywords(page, keywords)
+                    match_span.set_attribute("matched", len(filtered))
+                if not filtered:
+                    if out_of_reads:
+                        break
+                    continue
+                stats["matched_keywords"] += len(filtered)
+                
+                # One dedupe query per page
+                to_reply = await self.filter_non_replied(filtered)
+                stats["new_comments"] += len(to_reply)
+                
+                if to_reply:
+                    yield to_reply
+                
+                if out_of_reads:
+                    break
+    
+    async def reply_to_comment_stream(
+        self,
+        pages: AsyncIterator[List[CommentRecord]],
+        video_id: str,
+        user_id: int,
+        keywords: Union[List[str], KeywordMatcher],
+        reply_templates: Union[List[str], TemplateSet],
+        max_replies: Optional[int] = None,
+        batch_size: int = 50,
+        max_concurrent: int = 5,
+        pause_between_batches: float = 0,
+        seen_before: Optional[str] = None,
+        budget: Optional[QuotaBudget] = None,
+        video_title: Optional[str] = None,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> Dict:
+        """Reply to matching comments while later pages are still to be fetched
+        
+        Candidates are sent in batches of `batch_size` as soon as they
+        accumulate; pagination stops once `max_replies` have been queued
+        or `budget` (reads and writes) is spent. `on_progress`, if given,
+        is awaited with ("scan", running totals) per page of candidates and
+        ("reply", result) per delivered comment.
+        """
+        if budget is not None:
+            affordable = budget.max_replies
+            max_replies = affordable if max_replies is None else min(max_replies, affordable)
+        stats = {
+            "total_comments": 0,
+            "matched_keywords": 0,
+            "new_comments": 0,
+            "arrived_since_last_poll": 0,
+            "newest_published_at": None,
+            "succeeded": 0,
+            "failed": 0
+        }
+        pending: List[CommentRecord] = []
+        queued = 0
+        batches = 0
+        
+        async def flush():
+            nonlocal batches
+            if not pending:
+                return
+            if batches and pause_between_batches:
+                # Brief pause between batches to avoid rate limiting
+                await asyncio.sleep(pause_between_batches)
+            batches += 1
+            results = await self.reply_to_comments_batch(
+                list(pending),
+                video_id,
+                user_id,
+                reply_templates,
+                max_concurrent=max_concurrent,
+                video_title=video_title,
+                on_progress=on_progress
+            )
+            pending.clear()
+            stats["succeeded"] += sum(1 for r in results if r.get('success'))
+            stats["failed"] += sum(1 for r in results if not r.get('success'))
+            if budget is not None:
+                # Released, failed and recovered replies posted nothing this run
+                posted = sum(1 for r in results if r.get('success') and not r.get('recovered'))
+                budget.spend_write(settings.REPLY_COST * posted)
+        
+        if not isinstance(reply_templates, TemplateSet):
+            reply_templates = TemplateSet(reply_templates)
+        
+        if max_replies is not None and max_replies <= 0:
+            await pages.aclose()
+            return stats
+        
+        candidates = self.stream_reply_candidates(pages, keywords, stats, seen_before, budget)
+        async with aclosing(candidates):
+            async for page_candidates in candidates:
+                if on_progress is not None:
+                    await on_progress("scan", {
+                        key: stats[key]
+                        for key in ("total_comments", "matched_keywords", "new_comments")
+                    })
+                for comment in page_candidates:
+                    pending.append(comment)
+                    queued += 1
+                    if len(pending) >= batch_size:
+                        await flush()
+                    if max_replies is not None and queued >= max_replies:
+                        break
+                if max_replies is not None and queued >= max_replies:
+                    break
+        
+        await flush()
+        record_comment_stats(stats)
+        return stats
     
     def get_varied_reply(
         self, 
-        templates: List[str], 
+        templates: Union[List[str], TemplateSet], 
         variables: Dict
     ) -> str:
         """Generate a varied reply from templates"""
         if not templates:
             return "Thanks for your comment!"
         
-        # Select random template
-        template = random.choice(templates)
+        if not isinstance(templates, TemplateSet):
+            templates = TemplateSet(templates)
         
-        # Apply text variation
-        reply = self.text_var.generate_reply(template, variables)
+        # Select random template (pre-parsed) and apply text variation
+        return self.text_var.generate_reply(templates.choose(), variables)
+    
+    def render_replies(
+        self,
+        comments: List[CommentRecord],
+        templates: Union[List[str], TemplateSet],
+        video_title: Optional[str] = None
+    ) -> List[str]:
+        """Render a personalised reply for each comment in one pass"""
+        if not templates:
+            return ["Thanks for your comment!"] * len(comments)
+        
+        if not isinstance(templates, TemplateSet):
+            templates = TemplateSet(templates)
         
-        return reply
+        return self.text_var.generate_replies(
+            templates,
+            [
+                {
+                    "name": comment.author,
+                    "video_title": video_title,
+                    "keyword": comment.matched_keyword
+                }
+                for comment in comments
+            ]
+        )
     
     async def reply_to_comments_batch(
         self,
-        comments: List[Dict],
+        comments: List[CommentRecord],
         video_id: str,
         user_id: int,
-        reply_templates: List[str],
-        max_concurrent: int = 5
+        reply_templates: Union[List[str], TemplateSet],
+        max_concurrent: int = 5,
+        video_title: Optional[str] = None,
+        on_progress: Optional[ProgressCallback] = None
     ) -> List[Dict]:
-        """Reply to comments with controlled concurrency"""
+        """Queue replies in the outbox, then deliver them
+        
+        Intents are persisted before anything is posted, so a crash at any
+        point leaves a row the next delivery run picks up instead of a lost
+        or duplicated reply.
+        """
         
         if not comments:
             return []
         
+        reply_texts = self.render_replies(comments, reply_templates, video_title)
+        
+        intents = [
+            {
+                "comment_id": comment.id,
+                "video_id": video_id,
+                "user_id": user_id,
+                "comment_text": comment.text,
+                "comment_author": comment.author,
+                "keyword_matched": comment.matched_keyword or '',
+                "reply_text": reply_text
+            }
+            for comment, reply_text in zip(comments, reply_texts)
+        ]
+        
+        await enqueue_reply_intents(intents)
+        
+        return await self.deliver_outbox(
+            user_id,
+            video_id=video_id,
+            limit=len(comments),
+            comment_ids=[comment.id for comment in comments],
+            max_concurrent=max_concurrent,
+            on_progress=on_progress
+        )
+    
+    async def deliver_outbox(
+        self,
+        user_id: int,
+        video_id: Optional[str] = None,
+        limit: int = 50,
+        comment_ids: Optional[List[str]] = None,
+        max_concurrent: int = 5,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> List[Dict]:
+        """Claim and post pending outbox replies for a user (optionally one video or set of comments)"""
+        claimed = await claim_reply_intents(
+            user_id, video_id=video_id, limit=limit, comment_ids=comment_ids
+        )
+        
+        if not claimed:
+            return []
+        
         semaphore = asyncio.Semaphore(max_concurrent)
-        results = []
         
-        async def reply_with_control(comment: Dict):
-            """Reply to single comment with concurrency control"""
+        async def deliver_with_control(intent: Dict):
+            """Deliver single intent with concurrency control"""
             async with semaphore:
+                comment_id = intent['comment_id']
                 try:
-                    comment_id = comment['id']
-                    snippet = comment['snippet']['topLevelComment']['snippet']
+                    # A reclaimed claim may already be on YouTube - verify first
+                    if intent.get('prev_status') == 'sending':
+                        existing = await self.youtube.find_existing_reply(
+                            comment_id, intent['reply_text']
+                        )
+                        if existing:
+                            await complete_reply_intent(intent['id'], existing.get('id'))
+                            return {
+                                "success": True,
+                                "comment_id": comment_id,
+                                "reply_text": intent['reply_text'],
+                                "recovered": True
+                            }
                     
                     # Check user's daily limit first
                     if not await self.quota_manager.can_user_reply(user_id):
+                        await release_reply_intents([intent['id']])
                         return {
                             "success": False,
                             "comment_id": comment_id,
@@ -123,6 +362,7 @@ class ReplyEngine:
                     
                     # Check global quota
                     if not await self.quota_manager.can_make_request(50):
+                        await release_reply_intents([intent['id']])
                         return {
                             "success": False,
                             "comment_id": comment_id,
@@ -130,53 +370,78 @@ class ReplyEngine:
                         }
                     
                     # Human delay BEFORE posting
-                    await self.delay_gen.before_reply()
+                    with span("human_delay.before_reply"):
+                        await self.delay_gen.before_reply()
                     
-                    # Generate reply
-                    reply_text = self.get_varied_reply(
-                        reply_templates,
-                        {
-                            "name": snippet.get('authorDisplayName', 'there'),
-                            "video_title": "this video"
+                    # Post reply - an error response means nothing was posted
+                    try:
+                        result = await self.youtube.post_comment_reply(comment_id, intent['reply_text'])
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        # The POST may have reached YouTube - keep the claim so the
+                        # reclaim verifies with find_existing_reply before re-posting
+                        logger.warning("Reply to %s may not have been delivered: %s", comment_id, e)
+                        return {
+                            "success": False,
+                            "comment_id": comment_id,
+                            "error": str(e)
                         }
-                    )
-                    
-                    # Post reply
-                    result = await self.youtube.post_comment_reply(comment_id, reply_text)
-                    
-                    # Track quota
-                    await self.quota_manager.track_request(50, user_id=user_id)
-                    
-                    # Human delay AFTER posting
-                    await self.delay_gen.after_reply()
-                    
-                    # Mark as replied in DB
-                    await mark_comment_replied(
-                        comment_id=comment_id,
-                        video_id=video_id,
-                        user_id=user_id,
-                        comment_text=snippet.get('textDisplay', ''),
-                        comment_author=snippet.get('authorDisplayName', ''),
-                        keyword_matched=comment.get('matched_keyword', ''),
-                        reply_text=reply_text
-                    )
-                    
-                    return {
-                        "success": True,
-                        "comment_id": comment_id,
-                        "reply_text": reply_text
-                    }
-                
+
                 except Exception as e:
-                    print(f"Error replying to {comment_id}: {e}")
+                    logger.warning("Error replying to %s: %s", comment_id, e)
+                    try:
+                        await fail_reply_intent(intent['id'], str(e))
+                    except Exception as record_error:
+                        # Row stays 'sending' and is reclaimed after the claim timeout
+                        logger.error("Error recording failed delivery for %s: %s", comment_id, record_error)
                     return {
                         "success": False,
                         "comment_id": comment_id,
                         "error": str(e)
                     }
+
+                # Posted - from here on the row must never go back to 'pending'
+                try:
+                    await self.quota_manager.track_request(50, user_id=user_id)
+                except Exception as e:
+                    logger.warning("Quota tracking failed after replying to %s: %s", comment_id, e)
+
+                try:
+                    # Record delivery + dedupe row atomically
+                    await complete_reply_intent(intent['id'], result.get('id'))
+                except Exception as e:
+                    # Left 'sending': the reclaim finds the posted reply instead of posting again
+                    logger.error("Error recording delivered reply to %s: %s", comment_id, e)
+
+                # Human delay AFTER posting
+                with span("human_delay.after_reply"):
+                    await self.delay_gen.after_reply()
+
+                return {
+                    "success": True,
+                    "comment_id": comment_id,
+                    "reply_text": intent['reply_text']
+                }
         
-        # Process all comments with controlled concurrency
-        tasks = [reply_with_control(c) for c in comments]
+        # Process all intents with controlled concurrency
+        async def deliver_and_report(intent: Dict):
+            with span(
+                "reply.deliver",
+                comment_id=intent['comment_id'],
+                user_id=user_id,
+                **{"youtube.quota_cost": settings.REPLY_COST}
+            ) as deliver_span:
+                result = await deliver_with_control(intent)
+                deliver_span.set_attribute("success", result.get('success'))
+            if on_progress is not None:
+                await on_progress("reply", result)
+            return result
+        
+        tasks = [deliver_and_report(i) for i in claimed]
         results = await asyncio.gather(*tasks, return_exceptions=True)
+        results = [r for r in results if isinstance(r, dict)]
+        
+        # New replies change the dashboard numbers
+        if any(r.get('success') for r in results):
+            await invalidate_user_caches(user_id, videos=False)
         
-        return [r for r in results if isinstance(r, dict)]
+        return results
@@ -0,0 +1,112 @@
+"""
+Compiled Per-Video Reply Config
+
+Keywords and templates are stored as JSON on the videos row. Parsing them,
+and building the matcher and template set, happens once per settings
+version instead of on every scheduler tick:
+- Cached by (video_id, updated_at) - any write to the row bumps updated_at,
+  so other processes pick up new settings on their next read
+- update_video_settings also drops the local entry straight away
+"""
+import json
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from utils.text_variation import TemplateSet
+
+
+class KeywordMatcher:
+    """Case-insensitive keyword matcher
+
+    Keywords are casefolded once, so each comment costs one casefold plus
+    a substring scan per keyword. The first keyword in list order that
+    the text contains is reported, as before.
+    """
+
+    __slots__ = ("keywords", "_normalized")
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = list(keywords)
+        self._normalized = [(k, k.casefold()) for k in self.keywords if k]
+
+    def __bool__(self):
+        return bool(self._normalized)
+
+    def match(self, text: str) -> Optional[str]:
+        """Return the first keyword (in list order) contained in `text`"""
+        if not self._normalized:
+            return None
+        text = text.casefold()
+        for keyword, normalized in self._normalized:
+            if normalized in text:
+                return keyword
+        return None
+
+
+class CompiledVideoConfig:
+    """Ready-to-use reply settings for one video"""
+
+    __slots__ = ("video_id", "version", "title", "matcher", "templates")
+
+    def __init__(self, video: Dict):
+        self.video_id = video['video_id']
+        self.version = video.get('updated_at')
+        self.title = video_display_title(video)
+        self.matcher = KeywordMatcher(_load_list(video.get('keywords')))
+        self.templates = TemplateSet(_load_list(video.get('reply_templates')))
+
+    @property
+    def active(self) -> bool:
+        """Both keywords and templates are configured"""
+        return bool(self.matcher) and bool(self.templates)
+
+
+def video_display_title(video: Dict) -> Optional[str]:
+    """Title to use in replies, or None while the row only has the
+    "Video <id>" placeholder written by update_video_settings
+    """
+    title = video.get('title')
+    if not title or title == f"Video {video['video_id']}":
+        return None
+    return title
+
+
+def _load_list(value) -> List[str]:
+    if isinstance(value, str):
+        value = json.loads(value or '[]')
+    return list(value or [])
+
+
+class VideoConfigCache:
+    """Process-local LRU of compiled configs keyed by (video_id, updated_at)"""
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[object, CompiledVideoConfig]]" = OrderedDict()
+
+    def get(self, video: Dict) -> CompiledVideoConfig:
+        """Compiled config for a videos row, recompiling if the row changed"""
+        video_id = video['video_id']
+        version = video.get('updated_at')
+
+        entry = self._entries.get(video_id)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(video_id)
+            return entry[1]
+
+        config = CompiledVideoConfig(video)
+        self._entries[video_id] = (version, config)
+        self._entries.move_to_end(video_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return config
+
+    def invalidate(self, video_id: str):
+        self._entries.pop(video_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Global instance
+video_config_cache = VideoConfigCache()
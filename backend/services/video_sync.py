@@ -0,0 +1,76 @@
+"""
+Incremental Channel Sync
+
+Delta sync of a user's uploads:
+- Pages through the uploads playlist only until a known video is reached
+- Inserts just the new uploads
+- Refreshes statistics for known videos in 50-id batches, writing only
+  rows whose counts actually changed
+- On request, backfills older uploads by paging past the known ones (for
+  channels first synced when only the newest 100 videos were fetched)
+"""
+from typing import Dict, List
+
+from config import settings
+from services.youtube_client import AsyncYouTubeClient
+
+
+def playlist_item_to_video(item: Dict) -> Dict:
+    """Convert an uploads playlist item (with merged statistics) to a videos row"""
+    snippet = item['snippet']
+    stats = item.get('statistics', {})
+
+    return {
+        'video_id': item['contentDetails']['videoId'],
+        'title': snippet['title'],
+        'description': snippet.get('description', ''),
+        'thumbnail_url': snippet['thumbnails']['high']['url'],
+        'published_at': snippet['publishedAt'],
+        'view_count': int(stats.get('viewCount', 0)),
+        'comment_count': int(stats.get('commentCount', 0))
+    }
+
+
+async def sync_channel_videos(youtube: AsyncYouTubeClient, user: Dict, backfill: bool = False) -> Dict:
+    """Sync new uploads and refresh stats for known videos
+
+    With `backfill`, the whole uploads playlist is walked and every
+    unknown video is inserted (up to SYNC_MAX_NEW_VIDEOS), not just the
+    ones newer than the last sync.
+    """
+    from database_pg import get_user_video_ids, upsert_videos_batch, update_video_stats_batch
+
+    user_id = user['id']
+    known_ids = await get_user_video_ids(user_id)
+
+    if backfill:
+        new_items: List[Dict] = await youtube.get_channel_videos(
+            user['channel_id'],
+            max_results=settings.SYNC_MAX_NEW_VIDEOS,
+            skip=known_ids
+        )
+    else:
+        # New uploads only - stops at the newest video we already store
+        new_items = await youtube.get_channel_videos(
+            user['channel_id'],
+            max_results=settings.SYNC_MAX_NEW_VIDEOS,
+            stop_at=known_ids
+        )
+    inserted = await upsert_videos_batch(
+        user_id,
+        [playlist_item_to_video(item) for item in new_items]
+    )
+
+    # Known videos only need fresh counts
+    refreshed = 0
+    if known_ids:
+        # Sorted so each 50-id batch is the same request every sync (ETag hits)
+        stats = await youtube.get_video_stats(sorted(known_ids))
+        refreshed = await update_video_stats_batch(user_id, stats)
+
+    return {
+        "synced": inserted,
+        "new_videos": inserted,
+        "stats_updated": refreshed,
+        "total_videos": len(known_ids) + inserted
+    }
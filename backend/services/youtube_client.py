@@ -1,9 +1,98 @@
 import aiohttp
 import asyncio
+import logging
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Callable, Awaitable
+from typing import List, Dict, Optional, Set, Callable, Awaitable, AsyncIterator
 
 from config import settings
+from services.etag_cache import etag_cache
+from services.metrics import YOUTUBE_REQUEST_SECONDS, endpoint_name
+from utils.tracing import current_span, span
+
+logger = logging.getLogger(__name__)
+
+
+# Partial-response projections for commentThreads - only what the reply
+# pipeline reads is downloaded and parsed
+COMMENT_THREAD_FIELDS = (
+    "nextPageToken,"
+    "items(id,snippet/topLevelComment/snippet(textDisplay,authorDisplayName,publishedAt))"
+)
+COMMENT_THREAD_FIELDS_WITH_REPLIES = (
+    "nextPageToken,"
+    "items(id,snippet/topLevelComment/snippet(textDisplay,authorDisplayName,publishedAt),"
+    "replies/comments(id,snippet(textDisplay,authorDisplayName,publishedAt)))"
+)
+
+
+class CommentRecord:
+    """Lean top-level comment, parsed once from a commentThreads item"""
+    
+    __slots__ = ('id', 'text', 'author', 'published_at', 'matched_keyword', 'replies')
+    
+    def __init__(
+        self,
+        id: str,
+        text: str,
+        author: str,
+        published_at: Optional[str] = None,
+        matched_keyword: Optional[str] = None,
+        replies: Optional[tuple] = None
+    ):
+        self.id = id
+        self.text = text
+        self.author = author
+        self.published_at = published_at
+        self.matched_keyword = matched_keyword
+        self.replies = replies
+    
+    @classmethod
+    def from_thread(cls, item: Dict) -> 'CommentRecord':
+        """Build from a commentThreads API item"""
+        snippet = item['snippet']['topLevelComment']['snippet']
+        replies = None
+        if 'replies' in item:
+            replies = tuple(
+                cls(r['id'], r['snippet'].get('textDisplay', ''),
+                    r['snippet'].get('authorDisplayName', ''), r['snippet'].get('publishedAt'))
+                for r in item['replies'].get('comments', [])
+            )
+        return cls(
+            item['id'],
+            snippet.get('textDisplay', ''),
+            snippet.get('authorDisplayName', ''),
+            snippet.get('publishedAt'),
+            replies=replies
+        )
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CommentRecord':
+        """Build from to_dict() output (Celery task args) or a raw API item"""
+        if 'snippet' in data:
+            record = cls.from_thread(data)
+            record.matched_keyword = data.get('matched_keyword')
+            return record
+        return cls(
+            data['id'],
+            data.get('text', ''),
+            data.get('author', ''),
+            data.get('published_at'),
+            data.get('matched_keyword')
+        )
+    
+    def to_dict(self) -> Dict:
+        """JSON-serialisable form for passing through Celery"""
+        return {
+            'id': self.id,
+            'text': self.text,
+            'author': self.author,
+            'published_at': self.published_at,
+            'matched_keyword': self.matched_keyword
+        }
+    
+    def __repr__(self) -> str:
+        return f"CommentRecord(id={self.id!r}, author={self.author!r})"
 
 
 class AsyncYouTubeClient:
@@ -20,13 +109,18 @@ class AsyncYouTubeClient:
         self.refresh_token = refresh_token
         self.user_id = user_id
         self.on_token_refresh = on_token_refresh
-        self.base_url = "https://www.googleapis.com/youtube/v3"
+        self.base_url = settings.YOUTUBE_API_BASE_URL
+        self.token_url = settings.GOOGLE_OAUTH_TOKEN_URL
     
     async def _refresh_access_token(self) -> Dict:
         """Use refresh_token to get a new access_token from Google"""
         if not self.refresh_token:
             raise Exception("No refresh token available - user needs to re-authenticate")
         
+        with span("youtube.token_refresh", user_id=self.user_id):
+            return await self._post_refresh()
+    
+    async def _post_refresh(self) -> Dict:
         async with aiohttp.ClientSession() as session:
             payload = {
                 "client_id": settings.GOOGLE_CLIENT_ID,
@@ -35,7 +129,11 @@ class AsyncYouTubeClient:
                 "grant_type": "refresh_token"
             }
             
-            async with session.post("https://oauth2.googleapis.com/token", data=payload) as resp:
+            started = time.perf_counter()
+            async with session.post(self.token_url, data=payload) as resp:
+                YOUTUBE_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, endpoint="token", method="POST", status=resp.status
+                )
                 if resp.status != 200:
                     error_data = await resp.json()
                     error_desc = error_data.get('error_description', error_data.get('error', 'Unknown error'))
@@ -49,7 +147,7 @@ class AsyncYouTubeClient:
                 expires_in = data.get("expires_in", 3599)
                 new_expiry = datetime.utcnow() + timedelta(seconds=expires_in)
                 
-                print(f"✅ Token refreshed for user {self.user_id}, expires in {expires_in}s")
+                logger.info("Token refreshed for user %s, expires in %ss", self.user_id, expires_in)
                 
                 return {
                     "access_token": self.access_token,
@@ -61,12 +159,59 @@ class AsyncYouTubeClient:
         url: str, 
         params: Optional[Dict] = None, 
         method: str = "GET",
-        json_body: Optional[Dict] = None
+        json_body: Optional[Dict] = None,
+        use_etag: bool = False
+    ) -> Dict:
+        """Make request, auto-refresh token if expired, retry
+        
+        With use_etag, GETs are sent with If-None-Match and a 304 is served
+        from the ETag cache instead of re-downloading the payload.
+        """
+        with span(
+            f"youtube.{endpoint_name(url)}",
+            user_id=self.user_id,
+            **{
+                "http.method": method,
+                "youtube.quota_cost": settings.REPLY_COST if method == "POST" else settings.FETCH_COST,
+            }
+        ):
+            return await self._send(url, params, method, json_body, use_etag)
+    
+    async def _send(
+        self, 
+        url: str, 
+        params: Optional[Dict], 
+        method: str,
+        json_body: Optional[Dict],
+        use_etag: bool
     ) -> Dict:
-        """Make request, auto-refresh token if expired, retry"""
         if params is None:
             params = {}
         
+        cache_key = None
+        cached = None
+        headers = {}
+        if use_etag and method == "GET":
+            # mine=true responses depend on the caller, not just the URL
+            scope = str(self.user_id) if "mine" in params else None
+            cache_key = etag_cache.make_key(url, params, scope)
+            cached = await etag_cache.get(cache_key)
+            if cached:
+                headers["If-None-Match"] = cached[0]
+        
+        async def read_response(resp) -> Dict:
+            if resp.status == 304 and cached:
+                return cached[1]
+            if resp.status != 200:
+                error_text = await resp.text()
+                return {"error": error_text, "status": resp.status}
+            data = await resp.json()
+            if cache_key:
+                etag = resp.headers.get("ETag") or data.get("etag")
+                if etag:
+                    await etag_cache.set(cache_key, etag, data)
+            return data
+        
         async with aiohttp.ClientSession() as session:
             # 1. Try with current token
             params["access_token"] = self.access_token
@@ -74,10 +219,18 @@ class AsyncYouTubeClient:
             kwargs = {"params": params}
             if json_body:
                 kwargs["json"] = json_body
+            if headers:
+                kwargs["headers"] = headers
             
+            endpoint = endpoint_name(url)
+            started = time.perf_counter()
             async with session.request(method, url, **kwargs) as resp:
+                YOUTUBE_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, endpoint=endpoint, method=method, status=resp.status
+                )
+                current_span().set_attribute("http.status_code", resp.status)
                 if resp.status == 401:  # Token likely expired
-                    print(f"⚠️ 401 encountered for user {self.user_id}. Attempting refresh...")
+                    logger.warning("401 encountered for user %s. Attempting refresh...", self.user_id)
                     
                     try:
                         # 2. Refresh token
@@ -93,23 +246,21 @@ class AsyncYouTubeClient:
                         
                         # 4. Retry with new token
                         params["access_token"] = self.access_token
+                        started = time.perf_counter()
                         async with session.request(method, url, **kwargs) as retry_resp:
-                            if retry_resp.status != 200:
-                                error_text = await retry_resp.text()
-                                return {"error": error_text, "status": retry_resp.status}
-                            return await retry_resp.json()
+                            YOUTUBE_REQUEST_SECONDS.observe(
+                                time.perf_counter() - started, endpoint=endpoint, method=method, status=retry_resp.status
+                            )
+                            current_span().set_attribute("http.status_code", retry_resp.status)
+                            return await read_response(retry_resp)
                             
                     except Exception as e:
-                        print(f"❌ Refresh failed for user {self.user_id}: {e}")
+                        logger.error("Refresh failed for user %s: %s", self.user_id, e)
                         # Return the original 401 response if refresh fails
                         return await resp.json()
                 
                 # Return normal response
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    return {"error": error_text, "status": resp.status}
-                
-                return await resp.json()
+                return await read_response(resp)
     
     async def get_channel_info(self) -> Optional[Dict]:
         """Get the authenticated user's YouTube channel info"""
@@ -122,7 +273,7 @@ class AsyncYouTubeClient:
         data = await self._request_with_retry(url, params)
         
         if "error" in data or not data.get('items'):
-            print(f"Failed to fetch channel info: {data}")
+            logger.warning("Failed to fetch channel info: %s", data)
             return None
         
         channel = data['items'][0]
@@ -134,8 +285,20 @@ class AsyncYouTubeClient:
             'video_count': channel['statistics'].get('videoCount')
         }
     
-    async def get_channel_videos(self, channel_id: str, max_results: int = 50) -> List[Dict]:
-        """Fetch all videos from a channel"""
+    async def get_channel_videos(
+        self, 
+        channel_id: str, 
+        max_results: int = 50,
+        stop_at: Optional[Set[str]] = None,
+        skip: Optional[Set[str]] = None
+    ) -> List[Dict]:
+        """Fetch videos from a channel, newest first
+        
+        With `stop_at`, pagination ends at the first video id already in
+        that set, so only uploads newer than the last sync are returned.
+        Ids in `skip` are passed over (and don't count towards max_results)
+        while paging continues - used to backfill older uploads.
+        """
         # Step 1: Get uploads playlist ID
         url = f"{self.base_url}/channels"
         params = {
@@ -143,7 +306,7 @@ class AsyncYouTubeClient:
             "id": channel_id
         }
         
-        data = await self._request_with_retry(url, params)
+        data = await self._request_with_retry(url, params, use_etag=True)
         
         if "error" in data or not data.get('items'):
             raise Exception(f"Failed to fetch channel: {data}")
@@ -164,22 +327,31 @@ class AsyncYouTubeClient:
             if page_token:
                 params["pageToken"] = page_token
             
-            data = await self._request_with_retry(url, params)
+            data = await self._request_with_retry(url, params, use_etag=True)
             
             if "error" in data:
                 break
             
-            videos.extend(data.get('items', []))
+            reached_known = False
+            for item in data.get('items', []):
+                if stop_at and item['contentDetails']['videoId'] in stop_at:
+                    reached_known = True
+                    break
+                if skip and item['contentDetails']['videoId'] in skip:
+                    continue
+                videos.append(item)
+                if len(videos) >= max_results:
+                    break
             
             page_token = data.get('nextPageToken')
-            if not page_token or len(videos) >= max_results:
+            if reached_known or not page_token or len(videos) >= max_results:
                 break
             
-            await asyncio.sleep(0.2)  # Rate limiting
+            await asyncio.sleep(0.2 * settings.HUMAN_DELAY_SCALE)  # Rate limiting
         
         # Step 3: Get video statistics
         video_ids = [v['contentDetails']['videoId'] for v in videos]
-        video_stats = await self._get_video_stats(video_ids)
+        video_stats = await self.get_video_stats(video_ids)
         
         # Combine data
         for video in videos:
@@ -189,8 +361,8 @@ class AsyncYouTubeClient:
         
         return videos
     
-    async def _get_video_stats(self, video_ids: List[str]) -> Dict:
-        """Get statistics for multiple videos"""
+    async def get_video_stats(self, video_ids: List[str]) -> Dict:
+        """Get statistics for multiple videos (50 ids per request)"""
         stats = {}
         
         # YouTube API allows max 50 IDs per request
@@ -202,31 +374,37 @@ class AsyncYouTubeClient:
                 "id": ",".join(batch)
             }
             
-            data = await self._request_with_retry(url, params)
+            data = await self._request_with_retry(url, params, use_etag=True)
             
             if "error" not in data:
                 for item in data.get('items', []):
                     stats[item['id']] = item['statistics']
             
-            await asyncio.sleep(0.2)
+            await asyncio.sleep(0.2 * settings.HUMAN_DELAY_SCALE)
         
         return stats
     
-    async def get_video_comments(
+    async def iter_comment_pages(
         self, 
         video_id: str, 
-        max_results: int = 100
-    ) -> List[Dict]:
-        """Fetch all comments for a video"""
-        comments = []
+        max_results: int = 100,
+        include_replies: bool = False
+    ) -> AsyncIterator[List[CommentRecord]]:
+        """Yield comment records one API page at a time (newest first)
+        
+        Lets callers filter and reply while later pages are still being
+        fetched, and stop paginating as soon as they have enough.
+        """
+        fetched = 0
         page_token = None
         
         while True:
             url = f"{self.base_url}/commentThreads"
             params = {
-                "part": "snippet,replies",
+                "part": "snippet,replies" if include_replies else "snippet",
+                "fields": COMMENT_THREAD_FIELDS_WITH_REPLIES if include_replies else COMMENT_THREAD_FIELDS,
                 "videoId": video_id,
-                "maxResults": min(max_results, 100),
+                "maxResults": min(max_results - fetched, 100),
                 "textFormat": "plainText",
                 "order": "time"  # Get newest first
             }
@@ -236,19 +414,67 @@ class AsyncYouTubeClient:
             data = await self._request_with_retry(url, params)
             
             if "error" in data:
-                print(f"Error fetching comments: {data}")
-                break
+                logger.warning("Error fetching comments for %s: %s", video_id, data.get("status"), extra={"error": data.get("error")})
+                return
             
-            comments.extend(data.get('items', []))
+            records = []
+            for item in data.get('items', []):
+                try:
+                    records.append(CommentRecord.from_thread(item))
+                except (KeyError, TypeError):
+                    continue
             
+            fetched += len(records)
             page_token = data.get('nextPageToken')
-            if not page_token or len(comments) >= max_results:
-                break
             
-            await asyncio.sleep(0.2)
-        
+            if records:
+                yield records
+            
+            if not page_token or fetched >= max_results:
+                return
+            
+            await asyncio.sleep(0.2 * settings.HUMAN_DELAY_SCALE)
+    
+    async def get_video_comments(
+        self, 
+        video_id: str, 
+        max_results: int = 100,
+        include_replies: bool = False
+    ) -> List[CommentRecord]:
+        """Fetch all comments for a video"""
+        comments = []
+        async for page in self.iter_comment_pages(
+            video_id, max_results=max_results, include_replies=include_replies
+        ):
+            comments.extend(page)
         return comments
     
+    async def find_existing_reply(self, parent_id: str, text: str) -> Optional[Dict]:
+        """Look for a reply with this exact text under a comment (1 quota unit)
+        
+        Used to verify outbox deliveries that were interrupted after posting.
+        """
+        url = f"{self.base_url}/comments"
+        params = {
+            "part": "snippet",
+            "parentId": parent_id,
+            "maxResults": 100,
+            "textFormat": "plainText"
+        }
+        
+        data = await self._request_with_retry(url, params)
+        
+        if "error" in data:
+            raise Exception(f"Failed to list replies: {data}")
+        
+        wanted = text.strip()
+        for item in data.get('items', []):
+            snippet = item.get('snippet', {})
+            if (snippet.get('textOriginal') or snippet.get('textDisplay') or '').strip() == wanted:
+                return item
+        
+        return None
+    
     async def post_comment_reply(self, parent_id: str, text: str) -> Dict:
         """Post a reply to a comment"""
         url = f"{self.base_url}/comments"
@@ -16,8 +16,14 @@ if backend_dir not in sys.path:
 
 from worker import celery_app, run_async
 from celery import Task, group, chord
-from typing import List, Dict
+from typing import List, Dict, Optional
 import asyncio
+import logging
+
+from utils.log import bind_context, log_context
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
 
 
 class DatabaseTask(Task):
@@ -40,21 +46,136 @@ class DatabaseTask(Task):
         
         # Don't initialize the pool - Celery tasks will use direct connections
         # This avoids event loop conflicts between pool and task execution
-        print("✓ Celery worker ready (using direct DB connections)")
+        logger.info("Celery worker ready (using direct DB connections)")
         
         # Initialize Redis cache if available
         try:
             from services.cache import init_cache
             await init_cache()
-            print("✓ Redis cache initialized in Celery worker")
+            logger.info("Redis cache initialized in Celery worker")
         except Exception as e:
-            print(f"Warning: Redis cache init failed: {e}")
+            logger.warning("Redis cache init failed: %s", e)
+
+
+# Attempts after the first before a manual reply job is reported failed
+PROCESS_VIDEO_REPLIES_MAX_RETRIES = 3
+
+
+async def process_video_replies_async(
+    video_id: str,
+    user_id: int,
+    keywords: List[str],
+    reply_templates: List[str],
+    max_comments: int = 1000,
+    video_title: Optional[str] = None,
+    job_id: Optional[str] = None,
+    attempt: int = 0
+) -> Dict:
+    """
+    Process all comments for a video and reply to matching ones
+    
+    This is the main background job for auto-reply functionality.
+    Progress is published under `job_id` when given (see services/progress.py).
+    `attempt` is the retry count (0 on the first run); a failure that will
+    be retried is published as "retrying", only the last one as "error".
+    Returns: Stats about the job execution
+    """
+    from database_pg import get_user_by_id
+    from services.youtube_client import AsyncYouTubeClient
+    from services.reply_engine import ReplyEngine
+    from services.cache import cache_manager, QuotaManager
+    from services.progress import ProgressPublisher
+    from config import settings
+
+    bind_context(user_id=user_id, video_id=video_id)
+    progress = ProgressPublisher(job_id)
+    await progress.publish("started", video_id=video_id)
+
+    try:
+        # Get user
+        user = await get_user_by_id(user_id)
+        if not user:
+            result = {"error": "User not found", "succeeded": 0, "failed": 0}
+            await progress.publish("done", **result)
+            return result
+
+        # Initialize services
+        from database_pg import update_user_tokens
+        youtube = AsyncYouTubeClient(
+            user['access_token'], 
+            user['refresh_token'],
+            user_id=user_id,
+            on_token_refresh=update_user_tokens
+        )
+
+        if settings.USE_REDIS:
+            quota_mgr = QuotaManager(cache_manager)
+        else:
+            from services.quota_manager import QuotaManager as LocalQuota
+            quota_mgr = LocalQuota()
+
+        engine = ReplyEngine(youtube, quota_mgr)
+
+        # Check quota before starting
+        if settings.USE_REDIS:
+            remaining = await quota_mgr.get_remaining_quota(user_id)
+        else:
+            remaining = await quota_mgr.get_remaining_quota()
+
+        if remaining < 100:
+            result = {"error": "Insufficient quota", "quota_remaining": remaining}
+            await progress.publish("done", **result)
+            return result
+
+        # Stream comment pages - replies start as soon as the first batch fills
+        logger.info("Streaming comments")
+        stats = await engine.reply_to_comment_stream(
+            youtube.iter_comment_pages(video_id, max_results=max_comments),
+            video_id,
+            user_id,
+            keywords,
+            reply_templates,
+            batch_size=50,
+            max_concurrent=5,
+            pause_between_batches=2,
+            video_title=video_title,
+            on_progress=progress.report
+        )
+        logger.info(
+            "%d comments matched keywords, %d new", stats['matched_keywords'], stats['new_comments'],
+            extra={"scanned": stats['total_comments'], "replied": stats['succeeded']}
+        )
+
+        succeeded = stats['succeeded']
+
+        result = {
+            "total_comments": stats['total_comments'],
+            "matched_keywords": stats['matched_keywords'],
+            "new_comments": stats['new_comments'],
+            "succeeded": succeeded,
+            "failed": stats['failed'],
+            "quota_used": succeeded * 50  # Each reply costs 50 units
+        }
+        await progress.publish("done", **result)
+        return result
+
+    except Exception as e:
+        logger.exception("process_video_replies failed: %s", e)
+        if attempt < PROCESS_VIDEO_REPLIES_MAX_RETRIES:
+            # Not terminal - the stream stays open for the next attempt
+            await progress.publish(
+                "retrying", error=str(e), attempt=attempt + 1, max_retries=PROCESS_VIDEO_REPLIES_MAX_RETRIES
+            )
+        else:
+            await progress.publish("error", error=str(e))
+        raise
 
 
 @celery_app.task(
     base=DatabaseTask,
     bind=True,
-    max_retries=3,
+    autoretry_for=(Exception,),  # Also honoured by the async worker runtime
+    max_retries=PROCESS_VIDEO_REPLIES_MAX_RETRIES,
     default_retry_delay=60
 )
 def process_video_replies(
@@ -63,7 +184,9 @@ def process_video_replies(
     user_id: int,
     keywords: List[str],
     reply_templates: List[str],
-    max_comments: int = 1000
+    max_comments: int = 1000,
+    video_title: Optional[str] = None,
+    job_id: Optional[str] = None
 ) -> Dict:
     """
     Process all comments for a video and reply to matching ones
@@ -71,96 +194,54 @@ def process_video_replies(
     This is the main background job for auto-reply functionality.
     Returns: Stats about the job execution
     """
-    async def _process():
-        from database_pg import get_user_by_id
-        from services.youtube_client import AsyncYouTubeClient
-        from services.reply_engine import ReplyEngine
-        from services.cache import cache_manager, QuotaManager
-        from config import settings
-        
-        try:
-            # Get user
-            user = await get_user_by_id(user_id)
-            if not user:
-                return {"error": "User not found", "succeeded": 0, "failed": 0}
-            
-            # Initialize services
-            from database_pg import update_user_tokens
-            youtube = AsyncYouTubeClient(
-                user['access_token'], 
-                user['refresh_token'],
-                user_id=user_id,
-                on_token_refresh=update_user_tokens
-            )
-            
-            if settings.USE_REDIS:
-                quota_mgr = QuotaManager(cache_manager)
-            else:
-                from services.quota_manager import QuotaManager as LocalQuota
-                quota_mgr = LocalQuota()
-            
-            engine = ReplyEngine(youtube, quota_mgr)
-            
-            # Check quota before starting
-            if settings.USE_REDIS:
-                remaining = await quota_mgr.get_remaining_quota(user_id)
-            else:
-                remaining = await quota_mgr.get_remaining_quota()
-            
-            if remaining < 100:
-                return {"error": "Insufficient quota", "quota_remaining": remaining}
-            
-            # Fetch comments
-            print(f"📥 Fetching comments for video {video_id}...")
-            comments = await youtube.get_video_comments(video_id, max_results=max_comments)
-            
-            # Filter by keywords
-            filtered = engine.filter_comments_by_keywords(comments, keywords)
-            print(f"🎯 {len(filtered)} comments matched keywords")
-            
-            # Filter out already replied
-            to_reply = await engine.filter_non_replied(filtered)
-            print(f"✨ {len(to_reply)} new comments to reply to")
-            
-            # Process in batches of 50
-            batch_size = 50
-            all_results = []
-            
-            for i in range(0, len(to_reply), batch_size):
-                batch = to_reply[i:i + batch_size]
-                print(f"📤 Processing batch {i//batch_size + 1} ({len(batch)} comments)...")
-                
-                results = await engine.reply_to_comments_batch(
-                    batch,
-                    video_id,
-                    user_id,
-                    reply_templates,
-                    max_concurrent=5
-                )
-                all_results.extend(results)
-                
-                # Brief pause between batches to avoid rate limiting
-                if i + batch_size < len(to_reply):
-                    await asyncio.sleep(2)
-            
-            succeeded = sum(1 for r in all_results if r.get('success'))
-            failed = sum(1 for r in all_results if not r.get('success'))
-            
-            return {
-                "total_comments": len(comments),
-                "matched_keywords": len(filtered),
-                "new_comments": len(to_reply),
-                "succeeded": succeeded,
-                "failed": failed,
-                "quota_used": succeeded * 50  # Each reply costs 50 units
-            }
-            
-        except Exception as e:
-            print(f"❌ Error in process_video_replies: {e}")
-            # Retry the task
-            raise self.retry(exc=e)
-    
-    return run_async(_process())
+    return run_async(process_video_replies_async(
+        video_id, user_id, keywords, reply_templates, max_comments, video_title, job_id,
+        attempt=self.request.retries
+    ))
+
+
+async def reply_to_comments_batch_async(
+    comments: List[Dict],
+    video_id: str,
+    user_id: int,
+    reply_templates: List[str]
+) -> Dict:
+    """Reply to a batch of comments with rate limiting"""
+    from database_pg import get_user_by_id
+    from services.youtube_client import AsyncYouTubeClient, CommentRecord
+    from services.reply_engine import ReplyEngine
+    from services.cache import cache_manager, QuotaManager
+    from config import settings
+
+    user = await get_user_by_id(user_id)
+    from database_pg import update_user_tokens
+    youtube = AsyncYouTubeClient(
+        user['access_token'], 
+        user['refresh_token'],
+        user_id=user_id,
+        on_token_refresh=update_user_tokens
+    )
+
+    if settings.USE_REDIS:
+        quota_mgr = QuotaManager(cache_manager)
+    else:
+        from services.quota_manager import QuotaManager as LocalQuota
+        quota_mgr = LocalQuota()
+
+    engine = ReplyEngine(youtube, quota_mgr)
+
+    results = await engine.reply_to_comments_batch(
+        [CommentRecord.from_dict(c) for c in comments],
+        video_id,
+        user_id,
+        reply_templates
+    )
+
+    return {
+        "processed": len(comments),
+        "succeeded": sum(1 for r in results if r.get('success')),
+        "failed": sum(1 for r in results if not r.get('success'))
+    }
 
 
 @celery_app.task(
@@ -176,283 +257,510 @@ def reply_to_comments_batch(
     reply_templates: List[str]
 ) -> Dict:
     """Reply to a batch of comments with rate limiting"""
-    async def _reply():
-        from database_pg import get_user_by_id
-        from services.youtube_client import AsyncYouTubeClient
-        from services.reply_engine import ReplyEngine
-        from services.cache import cache_manager, QuotaManager
-        from config import settings
-        
-        user = await get_user_by_id(user_id)
-        from database_pg import update_user_tokens
+    return run_async(reply_to_comments_batch_async(
+        comments, video_id, user_id, reply_templates
+    ))
+
+
+async def deliver_reply_outbox_async(limit_per_user: int = 50) -> Dict:
+    """Resume outbox delivery - picks up pending intents and claims left by dead workers"""
+    from database_pg import get_outbox_pending_users, get_user_by_id, update_user_tokens
+    from services.youtube_client import AsyncYouTubeClient
+    from services.reply_engine import ReplyEngine
+    from services.cache import cache_manager, QuotaManager
+    from config import settings
+
+    user_ids = await get_outbox_pending_users()
+    succeeded = 0
+    failed = 0
+
+    for user_id in user_ids:
+        user = await get_user_by_id(user_id, use_direct=True)
+        if not user or not user.get('access_token'):
+            continue
+
         youtube = AsyncYouTubeClient(
             user['access_token'], 
             user['refresh_token'],
             user_id=user_id,
             on_token_refresh=update_user_tokens
         )
-        
+
         if settings.USE_REDIS:
             quota_mgr = QuotaManager(cache_manager)
         else:
             from services.quota_manager import QuotaManager as LocalQuota
             quota_mgr = LocalQuota()
-        
+
         engine = ReplyEngine(youtube, quota_mgr)
-        
-        results = await engine.reply_to_comments_batch(
-            comments,
-            video_id,
-            user_id,
-            reply_templates
-        )
-        
-        return {
-            "processed": len(comments),
-            "succeeded": sum(1 for r in results if r.get('success')),
-            "failed": sum(1 for r in results if not r.get('success'))
-        }
-    
-    return run_async(_reply())
+
+        try:
+            with log_context(user_id=user_id):
+                results = await engine.deliver_outbox(user_id, limit=limit_per_user)
+        except Exception as e:
+            logger.exception("Outbox delivery failed for user %s: %s", user_id, e)
+            continue
+
+        succeeded += sum(1 for r in results if r.get('success'))
+        failed += sum(1 for r in results if not r.get('success'))
+
+    return {
+        "users": len(user_ids),
+        "succeeded": succeeded,
+        "failed": failed
+    }
 
 
 @celery_app.task(base=DatabaseTask, bind=True)
-def sync_user_videos(self, user_id: int) -> Dict:
-    """Sync all videos from YouTube for a user"""
-    async def _sync():
-        from database_pg import get_user_by_id, upsert_videos_batch
-        from services.youtube_client import AsyncYouTubeClient
-        
-        user = await get_user_by_id(user_id)
-        if not user:
-            return {"error": "User not found"}
-        
-        from database_pg import update_user_tokens
+def deliver_reply_outbox(self, limit_per_user: int = 50) -> Dict:
+    """Resume outbox delivery - picks up pending intents and claims left by dead workers"""
+    return run_async(deliver_reply_outbox_async(limit_per_user))
+
+
+async def sync_user_videos_async(user_id: int, backfill: bool = False) -> Dict:
+    """Sync new videos and refresh stats from YouTube for a user"""
+    from database_pg import get_user_by_id
+    from services.youtube_client import AsyncYouTubeClient
+    from services.video_sync import sync_channel_videos
+
+    user = await get_user_by_id(user_id)
+    if not user:
+        return {"error": "User not found"}
+
+    from database_pg import update_user_tokens
+    youtube = AsyncYouTubeClient(
+        user['access_token'], 
+        user['refresh_token'],
+        user_id=user_id,
+        on_token_refresh=update_user_tokens
+    )
+
+    # Delta sync - new uploads + changed stats only (backfill: every missing upload)
+    result = await sync_channel_videos(youtube, user, backfill=backfill)
+
+    # Invalidate cache
+    from services.cache import invalidate_user_caches
+    await invalidate_user_caches(user_id, analytics=False)
+
+    return result
+
+
+@celery_app.task(base=DatabaseTask, bind=True)
+def sync_user_videos(self, user_id: int, backfill: bool = False) -> Dict:
+    """Sync new videos and refresh stats from YouTube for a user"""
+    return run_async(sync_user_videos_async(user_id, backfill))
+
+
+async def sync_replied_comments_cache_async(user_id: int = None) -> Dict:
+    """Sync replied comments from DB to Redis cache"""
+    from config import settings
+    if not settings.USE_REDIS:
+        return {"error": "Redis not enabled"}
+
+    from database_pg import get_direct_connection
+    from services.cache import cache_manager
+
+    async with get_direct_connection() as conn:
+        if user_id:
+            rows = await conn.fetch(
+                "SELECT comment_id FROM replied_comments WHERE user_id = $1",
+                user_id
+            )
+        else:
+            rows = await conn.fetch("SELECT comment_id FROM replied_comments")
+
+        comment_ids = [row['comment_id'] for row in rows]
+
+        # Sync to Redis
+        await cache_manager.sync_replied_comments(comment_ids)
+
+        return {"synced": len(comment_ids)}
+
+
+@celery_app.task(base=DatabaseTask)
+def sync_replied_comments_cache(user_id: int = None) -> Dict:
+    """Sync replied comments from DB to Redis cache"""
+    return run_async(sync_replied_comments_cache_async(user_id))
+
+
+async def cleanup_old_results_async() -> Dict:
+    """Cleanup old Celery results (runs daily)"""
+    # Celery automatically expires results after 1 hour
+    # This is just a placeholder for any custom cleanup
+    return {"cleaned": 0}
+
+
+@celery_app.task(base=DatabaseTask)
+def cleanup_old_results():
+    """Cleanup old Celery results (runs daily)"""
+    return run_async(cleanup_old_results_async())
+
+
+# Leases (services/lease.py): the tick is short now, per-video checks may
+# run for minutes of human-like delays; both heartbeat every ttl/3
+TICK_LEASE_TTL = 60
+TICK_LEASE_MAX_RUNTIME = 300
+VIDEO_LEASE_TTL = 180
+VIDEO_LEASE_MAX_RUNTIME = 1800
+
+
+def video_lease_name(video_id: str) -> str:
+    return f"video:{video_id}"
+
+
+def scheduled_video_task_id(video_id: str, previous_checked_at) -> str:
+    """Deterministic task id for one due check of a video
+    
+    A video is claimed at most once per last_checked_at value, so the pair
+    identifies the check; re-dispatching it reuses the same id.
+    """
+    slot = int(previous_checked_at.timestamp()) if previous_checked_at else 0
+    return f"scheduled-video:{video_id}:{slot}"
+
+
+async def _reserve_task_id(task_id: str) -> bool:
+    """Redis SET NX guard - False if this task id was already enqueued"""
+    from services.cache import cache_manager
+
+    if cache_manager.redis is None:
+        return True  # claim_due_videos already prevents double dispatch
+    try:
+        return bool(await cache_manager.redis.set(f"dispatched:{task_id}", 1, nx=True, ex=3600))
+    except Exception as e:
+        logger.warning("Dispatch guard unavailable for %s: %s", task_id, e)
+        return True
+
+
+async def process_scheduled_video_async(
+    video_id: str,
+    user_id: int,
+    budget: Dict,
+    previous_checked_at: Optional[str] = None
+) -> Dict:
+    """
+    Scheduled check of one video - enqueued by the scheduler tick
+
+    The video was already claimed (last_checked_at bumped) by the tick;
+    `previous_checked_at` is the value before that claim, which the
+    adaptive schedule needs to measure comment velocity. A per-video lease
+    keeps a second job for the same video from running alongside.
+    """
+    from datetime import datetime
+    from services.lease import hold_lease
+    from services.quota_planner import release_budget
+
+    bind_context(user_id=user_id, video_id=video_id)
+    # The tick reserved this budget under the dispatch's task id - give it
+    # back however the job ends (checked, skipped or failed)
+    task_id = scheduled_video_task_id(
+        video_id,
+        datetime.fromisoformat(previous_checked_at) if previous_checked_at else None
+    )
+    try:
+        with span(
+            "scheduled_video",
+            video_id=video_id,
+            user_id=user_id,
+            **{"quota.read_units": budget.get('read_units'), "quota.write_units": budget.get('write_units')}
+        ) as video_span:
+            async with hold_lease(video_lease_name(video_id), ttl=VIDEO_LEASE_TTL, max_runtime=VIDEO_LEASE_MAX_RUNTIME) as lease:
+                if lease is None:
+                    logger.info("Video is already being checked, skipping")
+                    video_span.set_attribute("skipped", True)
+                    return {"video_id": video_id, "replied": 0, "failed": 0, "scanned": 0, "skipped": True}
+                result = await _check_scheduled_video(video_id, user_id, budget, previous_checked_at, lease)
+                video_span.set_attributes({k: v for k, v in result.items() if k in ("replied", "failed", "scanned")})
+                return result
+    finally:
+        await release_budget(task_id)
+
+
+async def _check_scheduled_video(
+    video_id: str,
+    user_id: int,
+    budget: Dict,
+    previous_checked_at: Optional[str],
+    lease
+) -> Dict:
+    from database_pg import (
+        get_scheduled_video, get_user_by_id, get_recent_reply_count,
+        record_video_poll, update_user_tokens
+    )
+    from services.youtube_client import AsyncYouTubeClient
+    from services.reply_engine import ReplyEngine
+    from services.adaptive_scheduler import plan_next_check, format_published_at
+    from services.quota_planner import QuotaBudget
+    from services.video_config import video_config_cache
+    from utils.human_delays import HumanDelayGenerator
+    from config import settings
+    from datetime import datetime
+
+    result = {"video_id": video_id, "replied": 0, "failed": 0, "scanned": 0}
+
+    try:
+        video = await get_scheduled_video(video_id, use_direct=True)
+        if not video:
+            return result
+
+        # Compiled once per settings version
+        config = video_config_cache.get(video)
+        if not config.active:
+            return result
+
+        user = await get_user_by_id(user_id, use_direct=True)
+        if not user or not user.get('access_token'):
+            return result
+
+        if settings.USE_REDIS:
+            from services.cache import cache_manager, QuotaManager
+            quota_mgr = QuotaManager(cache_manager)
+        else:
+            from services.quota_manager import QuotaManager as LocalQuota
+            quota_mgr = LocalQuota()
+
         youtube = AsyncYouTubeClient(
             user['access_token'], 
             user['refresh_token'],
             user_id=user_id,
             on_token_refresh=update_user_tokens
         )
-        
-        # Fetch videos
-        videos = await youtube.get_channel_videos(user['channel_id'], max_results=100)
-        
-        # Prepare video data
-        video_data = []
-        for video in videos:
-            snippet = video['snippet']
-            stats = video.get('statistics', {})
-            
-            video_data.append({
-                'video_id': video['contentDetails']['videoId'],
-                'title': snippet['title'],
-                'description': snippet.get('description', ''),
-                'thumbnail_url': snippet['thumbnails']['high']['url'],
-                'published_at': snippet['publishedAt'],
-                'view_count': int(stats.get('viewCount', 0)),
-                'comment_count': int(stats.get('commentCount', 0))
-            })
-        
-        # Bulk insert
-        count = await upsert_videos_batch(user_id, video_data)
-        
-        # Invalidate cache
-        from config import settings
-        if settings.USE_REDIS:
-            from services.cache import cache_manager
-            await cache_manager.invalidate_user_videos(user_id)
-        
-        return {
-            "synced": count,
-            "total_videos": len(videos)
-        }
-    
-    return run_async(_sync())
+        engine = ReplyEngine(youtube, quota_mgr)
+
+        # Only process one batch per run to spread load - pagination
+        # stops as soon as enough new matches have been found
+        batch_size = HumanDelayGenerator.get_batch_size()
+        stats = await engine.reply_to_comment_stream(
+            youtube.iter_comment_pages(video_id),
+            video_id,
+            user_id,
+            config.matcher,
+            config.templates,
+            max_replies=batch_size,
+            batch_size=batch_size,
+            seen_before=format_published_at(video.get('newest_comment_at')),
+            budget=QuotaBudget(**budget),
+            video_title=config.title
+        )
+        logger.info(
+            "%d comments scanned, %d needing replies", stats['total_comments'], stats['new_comments']
+        )
+
+        # Schedule the next check from the observed comment velocity,
+        # measured since the check before this claim
+        video['last_checked_at'] = datetime.fromisoformat(previous_checked_at) if previous_checked_at else None
+        replies_in_window = 0
+        if video.get('adaptive_schedule') and video.get('comment_rate_per_hour') is None:
+            replies_in_window = await get_recent_reply_count(video_id, use_direct=True)
+        plan = plan_next_check(video, stats, replies_in_window)
+        # Fenced - a reclaimed (stuck) run must not overwrite the new schedule
+        if await lease.is_held():
+            await record_video_poll(video_id, use_direct=True, **plan)
+
+        result.update(
+            replied=stats['succeeded'],
+            failed=stats['failed'],
+            scanned=stats['total_comments']
+        )
+        if stats['succeeded']:
+            logger.info("Replied to %d comments", stats['succeeded'])
+        return result
+
+    except Exception as e:
+        logger.exception("Error processing video %s: %s", video_id, e)
+        result["error"] = str(e)
+        return result
 
 
 @celery_app.task(base=DatabaseTask)
-def sync_replied_comments_cache(user_id: int = None) -> Dict:
-    """Sync replied comments from DB to Redis cache"""
-    async def _sync():
-        from config import settings
-        if not settings.USE_REDIS:
-            return {"error": "Redis not enabled"}
-        
-        from database_pg import get_direct_connection
-        from services.cache import cache_manager
-        
-        async with get_direct_connection() as conn:
-            if user_id:
-                rows = await conn.fetch(
-                    "SELECT comment_id FROM replied_comments WHERE user_id = $1",
-                    user_id
-                )
-            else:
-                rows = await conn.fetch("SELECT comment_id FROM replied_comments")
-            
-            comment_ids = [row['comment_id'] for row in rows]
-            
-            # Sync to Redis
-            await cache_manager.sync_replied_comments(comment_ids)
-            
-            return {"synced": len(comment_ids)}
-    
-    return run_async(_sync())
+def process_scheduled_video(
+    video_id: str,
+    user_id: int,
+    budget: Dict,
+    previous_checked_at: Optional[str] = None
+) -> Dict:
+    """Scheduled check of one video - enqueued by the scheduler tick"""
+    return run_async(process_scheduled_video_async(video_id, user_id, budget, previous_checked_at))
+
+
+async def aggregate_scheduled_results_async(results: List[Dict], dispatched_at: Optional[str] = None) -> Dict:
+    """Chord callback - totals for one scheduler tick"""
+    results = [r for r in results if isinstance(r, dict)]
+    errors = [f"Error processing video {r['video_id']}: {r['error']}" for r in results if r.get('error')]
+    summary = {
+        "dispatched_at": dispatched_at,
+        "processed_videos": sum(1 for r in results if r['replied'] or r['failed']),
+        "total_replied": sum(r['replied'] for r in results),
+        "total_failed": sum(r['failed'] for r in results),
+        "errors": errors[:5]  # Only first 5 errors
+    }
+    logger.info(
+        "Auto-reply tick complete. Processed %d videos, %d replies",
+        summary['processed_videos'], summary['total_replied'], extra={"errors": len(errors)}
+    )
+    return summary
 
 
 @celery_app.task(base=DatabaseTask)
-def cleanup_old_results():
-    """Cleanup old Celery results (runs daily)"""
-    # Celery automatically expires results after 1 hour
-    # This is just a placeholder for any custom cleanup
-    return {"cleaned": 0}
+def aggregate_scheduled_results(results: List[Dict], dispatched_at: Optional[str] = None) -> Dict:
+    """Chord callback - totals for one scheduler tick"""
+    return run_async(aggregate_scheduled_results_async(results, dispatched_at))
 
 
-@celery_app.task(base=DatabaseTask, bind=True)
-def process_auto_replies_all(self) -> Dict:
+async def process_auto_replies_all_async() -> Dict:
     """
-    Main auto-reply job - processes videos that are DUE based on their custom intervals
+    Main auto-reply job - dispatches videos that are DUE based on their custom intervals
     
-    Runs every minute via Celery Beat.
-    Uses human-like delays for each video processed.
+    Runs every minute via Celery Beat. The tick itself only budgets and
+    claims due videos, then enqueues one process_scheduled_video job per
+    video, so a slow video no longer holds up the rest. A chord callback
+    (aggregate_scheduled_results) totals the outcome.
     """
-    import random
+    from services.lease import hold_lease
     
     # IMMEDIATE LOG - confirms task was received by worker
-    print("=" * 50)
-    print("🚀 TASK RECEIVED: process_auto_replies_all")
-    print("=" * 50)
+    logger.info("Scheduler tick received")
     
-    async def _process_all():
-        from database_pg import get_auto_reply_videos, get_user_by_id
-        from services.youtube_client import AsyncYouTubeClient
-        from services.reply_engine import ReplyEngine
-        from config import settings
-        import json
-        
-        print("🤖 Starting scheduled auto-reply job...")
-        
-        # Get videos that are due for a check (based on schedule_interval_minutes)
-        videos = await get_auto_reply_videos(use_direct=True)
-        print(f"Found {len(videos)} videos due for auto-reply")
-        
-        if not videos:
-            return {"message": "No videos due", "total_replied": 0}
-        
-        total_replied = 0
-        processed_videos = 0
-        errors = []
-        
-        for video in videos:
-            try:
-                # Get user for this video
-                user = await get_user_by_id(video['user_id'], use_direct=True)
-                if not user:
-                    continue
-                
-                # Update last checked timestamp immediately so we don't re-process in the next minute
-                from database_pg import update_last_checked
-                await update_last_checked(video['video_id'], use_direct=True)
-                
-                # Check if user has tokens
-                if not user.get('access_token'):
-                    continue
-                
-                # Initialize services
-                from database_pg import update_user_tokens
-                youtube = AsyncYouTubeClient(
-                    user['access_token'], 
-                    user['refresh_token'],
-                    user_id=video['user_id'],
-                    on_token_refresh=update_user_tokens
-                )
-                
-                if settings.USE_REDIS:
-                    from services.cache import cache_manager, QuotaManager
-                    quota_mgr = QuotaManager(cache_manager)
-                else:
-                    from services.quota_manager import QuotaManager as LocalQuota
-                    quota_mgr = LocalQuota()
-                
-                engine = ReplyEngine(youtube, quota_mgr)
-                
-                # Check quota
-                remaining = await quota_mgr.get_remaining_quota() if not settings.USE_REDIS else await quota_mgr.get_remaining_quota(video['user_id'])
-                if remaining < 100:
-                    print(f"Low quota for user {video['user_id']}, skipping")
-                    continue
-                
-                # Fetch comments
-                comments = await youtube.get_video_comments(video['video_id'])
-                print(f"Video {video['video_id']}: {len(comments)} comments")
-                
-                if not comments:
-                    continue
-                
-                # Parse keywords and templates from JSON if needed
-                keywords = video.get('keywords', [])
-                if isinstance(keywords, str):
-                    keywords = json.loads(keywords)
-                
-                templates = video.get('reply_templates', [])
-                if isinstance(templates, str):
-                    templates = json.loads(templates)
-                
-                if not keywords or not templates:
-                    continue
-                
-                # Filter by keywords
-                filtered = engine.filter_comments_by_keywords(comments, keywords)
-                
-                # Filter non-replied
-                to_reply = await engine.filter_non_replied(filtered)
-                print(f"Found {len(to_reply)} comments needing replies")
-                
-                if not to_reply:
-                    continue
-                
-                # Use human-like batch processing
-                from utils.human_delays import HumanDelayGenerator
-                batch_size = HumanDelayGenerator.get_batch_size()
-                
-                # Only process one batch per run to spread load
-                batch = to_reply[:batch_size]
-                
-                results = await engine.reply_to_comments_batch(
-                    batch,
-                    video['video_id'],
-                    video['user_id'],
-                    templates
-                )
-                
-                replied = sum(1 for r in results if r.get('success'))
-                total_replied += replied
-                processed_videos += 1
-                print(f"✅ Replied to {replied} comments on {video['video_id']}")
-                
-                # Professional delay between videos (5-15 seconds)
-                if videos.index(video) < len(videos) - 1:
-                    delay = random.uniform(5, 15)
-                    print(f"Waiting {delay:.1f}s before next video...")
-                    import asyncio
-                    await asyncio.sleep(delay)
-                
-            except Exception as e:
-                error_msg = f"Error processing video {video.get('video_id')}: {e}"
-                print(f"❌ {error_msg}")
-                errors.append(error_msg)
-                continue
-        
-        print(f"🎉 Auto-reply job complete. Processed {processed_videos} videos, {total_replied} replies")
-        
-        return {
-            "processed_videos": processed_videos,
-            "total_replied": total_replied,
-            "errors": errors[:5]  # Only first 5 errors
-        }
+    # One tick at a time - an overlapping beat fire just returns
+    with span("scheduler.tick") as tick_span:
+        async with hold_lease("scheduler:tick", ttl=TICK_LEASE_TTL, max_runtime=TICK_LEASE_MAX_RUNTIME) as lease:
+            if lease is None:
+                logger.warning("Previous scheduler tick still running, skipping")
+                tick_span.set_attribute("skipped", True)
+                return {"message": "Previous tick still running", "dispatched": 0}
+            result = await _dispatch_due_videos()
+            tick_span.set_attribute("dispatched", result.get("dispatched", 0))
+            return result
+
+
+async def _dispatch_due_videos() -> Dict:
+    import random
+    from datetime import datetime
+    from database_pg import get_auto_reply_videos, claim_due_videos
+    from services.lease import held_leases
+    from services.metrics import SCHEDULER_LAG_SECONDS
+    from services.quota_planner import plan_tick, reserve_budgets
+    from config import settings
+
+    # Get videos that are due for a check (based on next_check_at / schedule_interval_minutes)
+    videos = await get_auto_reply_videos(use_direct=True)
+    logger.info("Found %d videos due for auto-reply", len(videos))
+
+    now = datetime.utcnow()
+    for video in videos:
+        if video.get('next_check_at'):
+            SCHEDULER_LAG_SECONDS.observe(max(0.0, (now - video['next_check_at']).total_seconds()))
+
+    if not videos:
+        return {"message": "No videos due", "dispatched": 0}
+
+    if settings.USE_REDIS:
+        from services.cache import cache_manager, QuotaManager
+        quota_mgr = QuotaManager(cache_manager)
+    else:
+        from services.quota_manager import QuotaManager as LocalQuota
+        quota_mgr = LocalQuota()
+
+    # Split what's left of today's quota across the due videos. Videos
+    # without a budget are left due so a later tick can pick them up.
+    try:
+        budgets = await plan_tick(videos, quota_mgr)
+    except Exception as e:
+        # Videos stay due - the next tick plans again
+        logger.exception("Quota planning failed, dispatching nothing this tick: %s", e)
+        return {"message": "Quota planning failed", "dispatched": 0, "error": str(e)}
+    budgeted = []
+    for video in videos:
+        budget = budgets.get(video['video_id'])
+        if budget is None or not budget.max_pages or not budget.max_replies:
+            logger.info("No quota budget for video %s this tick, skipping", video['video_id'])
+            continue
+        budgeted.append(video)
+
+    # A video whose previous check is still running isn't claimed again
+    busy = await held_leases(video_lease_name(v['video_id']) for v in budgeted)
+    budgeted = [v for v in budgeted if video_lease_name(v['video_id']) not in busy]
+
+    # Only videos this tick wins are dispatched - an overlapping tick gets
+    # the rest (or nothing)
+    claimed = await claim_due_videos([v['video_id'] for v in budgeted], use_direct=True)
+
+    jobs = []
+    reservations = []
+    user_offsets: Dict[int, float] = {}
+    for video in budgeted:
+        video_id = video['video_id']
+        if video_id not in claimed:
+            continue
+
+        previous_checked_at = claimed[video_id]
+        task_id = scheduled_video_task_id(video_id, previous_checked_at)
+        if not await _reserve_task_id(task_id):
+            logger.info("Video %s already queued as %s, skipping", video_id, task_id)
+            continue
+
+        # Professional delay between one channel's videos (5-15 seconds);
+        # different channels run in parallel
+        countdown = user_offsets.get(video['user_id'], 0.0)
+        user_offsets[video['user_id']] = countdown + random.uniform(5, 15) * settings.HUMAN_DELAY_SCALE
+
+        jobs.append(process_scheduled_video.s(
+            video_id,
+            video['user_id'],
+            budgets[video_id].to_dict(),
+            previous_checked_at.isoformat() if previous_checked_at else None
+        ).set(task_id=task_id, countdown=countdown))
+        reservations.append((task_id, video['user_id'], budgets[video_id]))
+
+    if not jobs:
+        return {"message": "Nothing to dispatch", "dispatched": 0}
+
+    # Held until each job finishes, so the next tick plans around them
+    try:
+        await reserve_budgets(reservations)
+    except Exception as e:
+        logger.warning("Could not reserve quota for dispatched jobs: %s", e)
+
+    dispatched_at = datetime.utcnow().isoformat()
+    await publish_scheduled_jobs(jobs, aggregate_scheduled_results.s(dispatched_at))
+
+    logger.info("Dispatched %d video jobs", len(jobs))
+    return {"dispatched": len(jobs), "dispatched_at": dispatched_at}
+
+
+async def _publish_chord(jobs: List, callback):
+    # Publishing talks to the broker synchronously - keep it off the loop
+    await asyncio.to_thread(lambda: chord(jobs)(callback))
+
+
+# How the tick hands its per-video jobs to the broker - swapped out by
+# tests/benchmark_pipeline.py to run them in-process
+publish_scheduled_jobs = _publish_chord
+
+
+@celery_app.task(base=DatabaseTask, bind=True)
+def process_auto_replies_all(self) -> Dict:
+    """
+    Main auto-reply job - dispatches videos that are DUE based on their custom intervals
     
-    return run_async(_process_all())
+    Runs every minute via Celery Beat; per-video work runs in
+    process_scheduled_video.
+    """
+    return run_async(process_auto_replies_all_async())
+
+
+# Coroutine behind each task - used by the async worker runtime (async_worker.py)
+# to run tasks on its own long-lived event loop instead of through run_async
+ASYNC_TASKS = {
+    'tasks.process_video_replies': process_video_replies_async,
+    'tasks.reply_to_comments_batch': reply_to_comments_batch_async,
+    'tasks.deliver_reply_outbox': deliver_reply_outbox_async,
+    'tasks.sync_user_videos': sync_user_videos_async,
+    'tasks.sync_replied_comments_cache': sync_replied_comments_cache_async,
+    'tasks.cleanup_old_results': cleanup_old_results_async,
+    'tasks.process_auto_replies_all': process_auto_replies_all_async,
+    'tasks.process_scheduled_video': process_scheduled_video_async,
+    'tasks.aggregate_scheduled_results': aggregate_scheduled_results_async,
+}
 
 
 # Periodic tasks (Celery Beat schedule)
@@ -461,19 +769,25 @@ celery_app.conf.beat_schedule = {
     'auto-reply-scheduler': {
         'task': 'tasks.process_auto_replies_all',
         'schedule': 60.0,  # Every minute
-        'options': {'queue': 'celery'}  # MUST match worker's queue!
+        'options': {'queue': 'scheduled'}
+    },
+    # Resume undelivered outbox replies every 5 minutes
+    'deliver-reply-outbox': {
+        'task': 'tasks.deliver_reply_outbox',
+        'schedule': 300.0,
+        'options': {'queue': 'bulk'}
     },
     # Sync cache every hour
     'sync-cache-every-hour': {
         'task': 'tasks.sync_replied_comments_cache',
         'schedule': 3600.0,  # Every hour
-        'options': {'queue': 'celery'}
+        'options': {'queue': 'cache'}
     },
     # Cleanup every day
     'cleanup-every-day': {
         'task': 'tasks.cleanup_old_results',
         'schedule': 86400.0,  # Every day
-        'options': {'queue': 'celery'}
+        'options': {'queue': 'cache'}
     },
 }
 
@@ -0,0 +1,293 @@
+"""
+End-to-End Auto-Reply Benchmark
+
+Seeds N users x M videos into Postgres (and Redis, if enabled), serves K
+comments per video from the fake YouTube API (tests/fake_youtube.py) and
+runs the real scheduler path - process_auto_replies_all_async, quota
+planning, claims, leases, process_scheduled_video_async - with pacing
+scaled to zero (HUMAN_DELAY_SCALE=0). Per-video jobs run in-process instead
+of through the broker, at --concurrency at a time like the scheduled worker.
+Seeding uses the web pool; the ticks then run as in a worker process, with
+no web pool and every query on the worker pool (WORKER_DB_POOL_MAX_SIZE).
+
+Reports replies/sec, quota units per reply, DB statements per reply,
+p50/p99 tick latency and peak RSS as JSON, so runs on two commits can be
+compared with --baseline.
+
+Run against a scratch database - every due auto-reply video in it is
+picked up by the tick, and quota is tracked in the configured Redis:
+    DATABASE_URL=postgresql://localhost/reply_bench REDIS_URL=redis://localhost:6379/15 \\
+        python tests/benchmark_pipeline.py --users 10 --videos 5 --comments 5000 --ticks 20 \\
+        --output bench.json
+
+    python tests/benchmark_pipeline.py ... --baseline bench-main.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("HUMAN_DELAY_SCALE", "0")
+
+from config import settings
+from fake_youtube import FakeYouTube, FakeYouTubeServer
+
+KEYWORDS = ["link", "price", "info"]
+TEMPLATES = ["Thanks for watching!", "Check the description 👇", "Glad it helped!"]
+
+# Metrics where a higher number is the better one (for --baseline)
+HIGHER_IS_BETTER = {"replies_per_sec"}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+async def seed(fake: FakeYouTube, run_id: str, users: int, videos: int, comments: int) -> List[int]:
+    """Bench users with auto-reply on every video; returns the user ids"""
+    import database_pg as db
+
+    user_ids = []
+    for u in range(users):
+        channel_id = f"UCbench{run_id}{u:04d}"
+        channel = fake.add_channel(channel_id, videos=videos, comments_per_video=comments)
+        user = await db.create_or_update_user(
+            email=f"bench-{run_id}-{u}@example.com",
+            google_id=f"bench-{run_id}-{u}",
+            channel_id=channel_id,
+            channel_name=channel.title,
+            channel_thumbnail="",
+            access_token=f"token-{channel_id}",
+            refresh_token=f"refresh-{channel_id}",
+            token_expiry=datetime.utcnow() + timedelta(hours=1)
+        )
+        await db.upsert_videos_batch(user["id"], [{
+            "video_id": video.video_id,
+            "title": video.title,
+            "description": "",
+            "thumbnail_url": "",
+            "published_at": video.published_at,
+            "view_count": video.view_count,
+            "comment_count": video.comment_count,
+        } for video in channel.videos])
+        for video in channel.videos:
+            await db.update_video_settings(video.video_id, user["id"], {
+                "auto_reply_enabled": True,
+                "keywords": KEYWORDS,
+                "reply_templates": TEMPLATES,
+                "schedule_type": "hourly",
+                "schedule_interval_minutes": 5,
+            })
+        user_ids.append(user["id"])
+    return user_ids
+
+
+async def make_due(user_ids: List[int]):
+    import database_pg as db
+
+    async with db.acquire_connection() as conn:
+        await conn.execute(
+            "UPDATE videos SET next_check_at = NOW() - interval '1 second' WHERE user_id = ANY($1::int[])",
+            user_ids
+        )
+
+
+async def become_worker():
+    """Drop the web pool, as workers never open it (no init_db there)
+
+    From here on acquire_connection() and get_direct_connection() go to
+    the worker pool, and anything still using the web pool fails loudly.
+    """
+    import database_pg as db
+
+    if db.pool is not None:
+        await db.pool.close()
+        db.pool = None
+
+
+async def cleanup(user_ids: List[int]):
+    import database_pg as db
+
+    async with db.acquire_connection() as conn:
+        # videos, replied_comments and reply_outbox cascade
+        await conn.execute("DELETE FROM users WHERE id = ANY($1::int[])", user_ids)
+
+
+def db_statements() -> float:
+    from services.metrics import DB_QUERIES
+    return DB_QUERIES.get(pool="web") + DB_QUERIES.get(pool="worker")
+
+
+async def run(args) -> Dict:
+    import database_pg as db
+    import tasks
+
+    if not settings.USE_POSTGRES:
+        raise SystemExit("Set DATABASE_URL to a scratch Postgres database first")
+
+    # Enough quota for the whole run - the planner would otherwise ration it
+    settings.DAILY_QUOTA_LIMIT = args.daily_quota
+    settings.USER_DAILY_REPLY_LIMIT = args.daily_quota // settings.REPLY_COST
+    settings.QUOTA_BURST_FRACTION = 1.0
+
+    fake = FakeYouTube(
+        seed=args.seed,
+        keywords=tuple(KEYWORDS),
+        keyword_rate=args.keyword_rate,
+        daily_quota=args.daily_quota,
+        latency=args.latency,
+        jitter=args.jitter,
+        now=datetime.utcnow()
+    )
+    run_id = uuid.uuid4().hex[:8]
+
+    await db.init_db()
+    if settings.USE_REDIS:
+        from services.cache import init_cache
+        await init_cache()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    tick_results: List[Dict] = []
+
+    async def run_in_process(jobs, callback):
+        """Stand-in for the chord: run the per-video jobs on this loop"""
+        async def run_job(signature):
+            countdown = signature.options.get("countdown") or 0
+            if countdown:
+                await asyncio.sleep(countdown)
+            async with semaphore:
+                return await tasks.process_scheduled_video_async(*signature.args)
+
+        results = await asyncio.gather(*(run_job(job) for job in jobs))
+        tick_results.append(await tasks.aggregate_scheduled_results_async(list(results), *callback.args))
+
+    tasks.publish_scheduled_jobs = run_in_process
+
+    user_ids: List[int] = []
+    async with FakeYouTubeServer(fake) as server:
+        settings.YOUTUBE_API_BASE_URL = server.base_url
+        settings.GOOGLE_OAUTH_TOKEN_URL = server.token_url
+        try:
+            user_ids = await seed(fake, run_id, args.users, args.videos, args.comments)
+            await become_worker()
+
+            tick_seconds = []
+            statements_before = db_statements()
+            started = time.perf_counter()
+            for tick in range(args.ticks):
+                if tick:
+                    for video_id in fake.videos:
+                        fake.add_comments(video_id, args.new_comments)
+                await make_due(user_ids)
+
+                tick_started = time.perf_counter()
+                await tasks.process_auto_replies_all_async()
+                tick_seconds.append(time.perf_counter() - tick_started)
+            elapsed = time.perf_counter() - started
+            statements = db_statements() - statements_before
+        finally:
+            if user_ids and not args.keep:
+                await cleanup(user_ids)
+            await db.close_db()
+            if settings.USE_REDIS:
+                from services.cache import close_cache
+                await close_cache()
+
+    replies = sum(r["total_replied"] for r in tick_results)
+    failed = sum(r["total_failed"] for r in tick_results)
+    return {
+        "commit": git_commit(),
+        "config": {
+            "users": args.users,
+            "videos_per_user": args.videos,
+            "comments_per_video": args.comments,
+            "new_comments_per_tick": args.new_comments,
+            "ticks": args.ticks,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "keyword_rate": args.keyword_rate,
+            "redis": settings.USE_REDIS,
+        },
+        "replies": replies,
+        "failed": failed,
+        "elapsed_seconds": round(elapsed, 3),
+        "replies_per_sec": round(replies / elapsed, 2) if elapsed else 0.0,
+        "quota_units_per_reply": round(fake.quota_used / replies, 2) if replies else None,
+        "db_statements_per_reply": round(statements / replies, 2) if replies else None,
+        "tick_p50_ms": round(percentile(tick_seconds, 50) * 1000, 1),
+        "tick_p99_ms": round(percentile(tick_seconds, 99) * 1000, 1),
+        "tick_mean_ms": round(statistics.mean(tick_seconds) * 1000, 1) if tick_seconds else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "youtube_calls": dict(fake.calls),
+    }
+
+
+def compare(result: Dict, baseline: Dict):
+    print(f"\nvs {baseline.get('commit', 'baseline')}:")
+    for key, value in result.items():
+        before = baseline.get(key)
+        if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+            continue
+        change = (value - before) / before * 100
+        better = change > 0 if key in HIGHER_IS_BETTER else change < 0
+        marker = "" if abs(change) < 5 else (" (better)" if better else " (WORSE)")
+        print(f"  {key:26} {before:>12} -> {value:<12} {change:+.1f}%{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end auto-reply throughput benchmark")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--videos", type=int, default=5, help="Videos per user")
+    parser.add_argument("--comments", type=int, default=2000, help="Comments per video at start")
+    parser.add_argument("--new-comments", type=int, default=50, help="Comments arriving per video between ticks")
+    parser.add_argument("--ticks", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4, help="Per-video jobs at once (scheduled worker concurrency)")
+    parser.add_argument("--keyword-rate", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake API latency per call (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--daily-quota", type=int, default=10_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Leave the seeded rows in the database")
+    parser.add_argument("--output", help="Write the JSON result here")
+    parser.add_argument("--baseline", help="Earlier JSON result to compare against")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,508 @@
+"""
+Fake YouTube Data API + Google OAuth token endpoint
+
+A deterministic, in-process stand-in for googleapis.com so the client,
+reply engine and tasks can be exercised and benchmarked offline:
+- channels, playlistItems, videos, commentThreads (pagination, order=time),
+  comments list/insert and the OAuth token endpoint
+- Synthetic channels with any number of comments - comments are derived
+  from (seed, video, index) on demand, so millions cost no memory
+- Configurable latency, error injection (401 / 403 quotaExceeded / 429 /
+  5xx) and quota accounting with the real unit costs
+- ETag / If-None-Match on the cacheable list endpoints
+
+Point the app at it with:
+    YOUTUBE_API_BASE_URL=http://127.0.0.1:8765/youtube/v3
+    GOOGLE_OAUTH_TOKEN_URL=http://127.0.0.1:8765/token
+
+Run standalone:
+    python tests/fake_youtube.py --port 8765 --videos 5 --comments 1000000
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+# Quota units per call (YouTube Data API v3 cost table)
+QUOTA_COSTS = {
+    "channels": 1,
+    "playlistItems": 1,
+    "videos": 1,
+    "commentThreads": 1,
+    "comments.list": 1,
+    "comments.insert": 50,
+}
+
+ERROR_REASONS = {
+    401: ("authError", "Invalid Credentials"),
+    403: ("quotaExceeded", "The request cannot be completed because you have exceeded your quota."),
+    429: ("rateLimitExceeded", "Too many requests."),
+    500: ("backendError", "Backend Error"),
+    503: ("backendError", "The service is currently unavailable."),
+}
+
+_WORDS = (
+    "great video thanks love this content so helpful please make more "
+    "awesome tutorial learned a lot can you share amazing explained well"
+).split()
+
+
+@dataclass
+class FakeVideo:
+    video_id: str
+    title: str
+    comment_count: int
+    published_at: datetime
+    first_comment_at: datetime
+    view_count: int = 0
+
+
+@dataclass
+class FakeChannel:
+    channel_id: str
+    title: str
+    videos: List[FakeVideo] = field(default_factory=list)
+
+    @property
+    def uploads_playlist(self) -> str:
+        return "UU" + self.channel_id[2:]
+
+
+@dataclass
+class ErrorRule:
+    endpoint: str  # "commentThreads", "comments.insert", "token", ... or "*"
+    status: int
+    remaining: Optional[int] = 1  # None = until cleared
+    reason: Optional[str] = None
+
+
+class FakeYouTube:
+    """State and behaviour of the fake API (no networking)
+
+    Everything derives from `seed`: the same seed always produces the same
+    channels, comments and keyword hits.
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        keywords: Tuple[str, ...] = ("link", "price", "info"),
+        keyword_rate: float = 0.1,
+        daily_quota: int = 10_000,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        now: Optional[datetime] = None,
+        comment_interval: timedelta = timedelta(minutes=1)
+    ):
+        self.seed = seed
+        self.keywords = keywords
+        self.keyword_rate = keyword_rate
+        self.daily_quota = daily_quota
+        self.latency = latency
+        self.jitter = jitter
+        self.now = now or datetime(2024, 1, 1, 12, 0, 0)
+        self.comment_interval = comment_interval
+
+        self.channels: Dict[str, FakeChannel] = {}
+        self.videos: Dict[str, FakeVideo] = {}
+        self.tokens: Dict[str, str] = {}  # access token -> channel id
+        self.refresh_tokens: Dict[str, str] = {}  # refresh token -> channel id
+        self.replies: Dict[str, List[Dict]] = {}  # parent comment id -> replies
+        self.error_rules: List[ErrorRule] = []
+
+        self.quota_used = 0
+        self.calls: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._token_counter = 0
+
+    # ----- setup -----
+
+    def add_channel(
+        self,
+        channel_id: str,
+        videos: int = 1,
+        comments_per_video: int = 1000,
+        access_token: Optional[str] = None,
+        refresh_token: Optional[str] = None
+    ) -> FakeChannel:
+        channel = FakeChannel(channel_id, f"Channel {channel_id}")
+        for i in range(videos):
+            video = FakeVideo(
+                video_id=f"{channel_id}-v{i:04d}",
+                title=f"Video {i} of {channel_id}",
+                comment_count=comments_per_video,
+                published_at=self.now - timedelta(days=i + 1),
+                first_comment_at=self.now - self.comment_interval * comments_per_video,
+                view_count=comments_per_video * 20,
+            )
+            channel.videos.append(video)
+            self.videos[video.video_id] = video
+        self.channels[channel_id] = channel
+        self.tokens[access_token or f"token-{channel_id}"] = channel_id
+        self.refresh_tokens[refresh_token or f"refresh-{channel_id}"] = channel_id
+        return channel
+
+    def add_comments(self, video_id: str, count: int):
+        """New comments arrive on a video (newer than all existing ones)"""
+        video = self.videos[video_id]
+        video.comment_count += count
+        self.now = max(self.now, video.first_comment_at + self.comment_interval * video.comment_count)
+
+    def expire_token(self, access_token: str):
+        """Next request with this token gets a 401 until it is refreshed"""
+        self.tokens.pop(access_token, None)
+
+    def inject_error(self, endpoint: str, status: int, times: Optional[int] = 1, reason: Optional[str] = None):
+        """Fail the next `times` calls to `endpoint` ("*" = any) with `status`"""
+        self.error_rules.append(ErrorRule(endpoint, status, times, reason))
+
+    def clear_errors(self):
+        self.error_rules.clear()
+
+    def reset_quota(self):
+        self.quota_used = 0
+        self.calls.clear()
+
+    # ----- synthetic comments -----
+
+    def comment(self, video_id: str, index: int) -> Dict:
+        """Top-level comment `index` (0 = newest) of a video, as a commentThreads item
+
+        Ids and text depend on the comment's position from the oldest, so
+        they stay the same as newer comments arrive.
+        """
+        video = self.videos[video_id]
+        seq = video.comment_count - 1 - index
+        digest = hashlib.blake2b(f"{self.seed}:{video_id}:{seq}".encode(), digest_size=8).digest()
+        rng = random.Random(int.from_bytes(digest, "big"))
+        words = rng.choices(_WORDS, k=rng.randint(3, 12))
+        if self.keywords and rng.random() < self.keyword_rate:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(self.keywords))
+        comment_id = f"{video_id}-c{seq:09d}"
+        published = video.first_comment_at + self.comment_interval * (seq + 1)
+        snippet = {
+            "textDisplay": " ".join(words),
+            "textOriginal": " ".join(words),
+            "authorDisplayName": f"viewer{rng.randrange(100_000)}",
+            "publishedAt": published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "videoId": video_id,
+        }
+        item = {
+            "kind": "youtube#commentThread",
+            "id": comment_id,
+            "snippet": {
+                "videoId": video_id,
+                "topLevelComment": {"kind": "youtube#comment", "id": comment_id, "snippet": snippet},
+                "totalReplyCount": len(self.replies.get(comment_id, ())),
+            },
+        }
+        if self.replies.get(comment_id):
+            item["replies"] = {"comments": list(self.replies[comment_id])}
+        return item
+
+    def keyword_hits(self, video_id: str, limit: Optional[int] = None) -> int:
+        """How many of a video's (first `limit`) comments contain a keyword"""
+        video = self.videos[video_id]
+        count = video.comment_count if limit is None else min(limit, video.comment_count)
+        hits = 0
+        for i in range(count):
+            text = self.comment(video_id, i)["snippet"]["topLevelComment"]["snippet"]["textDisplay"]
+            if any(k in text.split() for k in self.keywords):
+                hits += 1
+        return hits
+
+    # ----- request handling -----
+
+    def _take_error(self, endpoint: str) -> Optional[ErrorRule]:
+        for rule in self.error_rules:
+            if rule.endpoint in (endpoint, "*"):
+                if rule.remaining is not None:
+                    rule.remaining -= 1
+                    if rule.remaining <= 0:
+                        self.error_rules.remove(rule)
+                return rule
+        return None
+
+    def _charge(self, endpoint: str) -> bool:
+        cost = QUOTA_COSTS.get(endpoint, 0)
+        if self.quota_used + cost > self.daily_quota:
+            return False
+        self.quota_used += cost
+        return True
+
+    def issue_token(self, refresh_token: str) -> Optional[str]:
+        channel_id = self.refresh_tokens.get(refresh_token)
+        if channel_id is None:
+            return None
+        self._token_counter += 1
+        token = f"token-{channel_id}-{self._token_counter}"
+        self.tokens[token] = channel_id
+        return token
+
+    async def delay(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self._rng.uniform(0, self.jitter))
+
+
+def _error(status: int, reason: Optional[str] = None) -> web.Response:
+    default_reason, message = ERROR_REASONS.get(status, ("backendError", "Error"))
+    reason = reason or default_reason
+    body = {"error": {"code": status, "message": message, "errors": [{"reason": reason, "message": message}]}}
+    return web.json_response(body, status=status)
+
+
+def _page(request: web.Request, total: int, max_default: int, max_allowed: int) -> Tuple[int, int, Optional[str]]:
+    """(start, stop, nextPageToken) for offset-based page tokens"""
+    size = min(int(request.query.get("maxResults", max_default)), max_allowed)
+    start = int(request.query.get("pageToken") or 0)
+    stop = min(start + size, total)
+    return start, stop, str(stop) if stop < total else None
+
+
+def _with_etag(request: web.Request, body: Dict) -> web.Response:
+    etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest() + '"'
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers={"ETag": etag})
+    body["etag"] = etag
+    return web.json_response(body, headers={"ETag": etag})
+
+
+def create_app(fake: FakeYouTube) -> web.Application:
+    """aiohttp app serving the fake under /youtube/v3 and /token"""
+
+    async def guarded(request: web.Request, endpoint: str):
+        """Latency, auth, injected errors and quota - returns an error response or the channel id"""
+        fake.calls[endpoint] += 1
+        await fake.delay()
+
+        rule = fake._take_error(endpoint)
+        if rule is not None:
+            return _error(rule.status, rule.reason)
+
+        token = request.query.get("access_token")
+        auth = request.headers.get("Authorization", "")
+        if not token and auth.startswith("Bearer "):
+            token = auth[7:]
+        channel_id = fake.tokens.get(token)
+        if channel_id is None:
+            return _error(401)
+
+        if not fake._charge(endpoint):
+            return _error(403, "quotaExceeded")
+        return channel_id
+
+    async def channels(request: web.Request) -> web.Response:
+        result = await guarded(request, "channels")
+        if isinstance(result, web.Response):
+            return result
+        if request.query.get("mine") == "true":
+            selected = [fake.channels[result]]
+        else:
+            ids = request.query.get("id", "").split(",")
+            selected = [fake.channels[i] for i in ids if i in fake.channels]
+        items = [{
+            "kind": "youtube#channel",
+            "id": channel.channel_id,
+            "snippet": {"title": channel.title, "thumbnails": {"default": {"url": f"https://img.example/{channel.channel_id}.jpg"}}},
+            "contentDetails": {"relatedPlaylists": {"uploads": channel.uploads_playlist}},
+            "statistics": {"subscriberCount": "1000", "videoCount": str(len(channel.videos))},
+        } for channel in selected]
+        return _with_etag(request, {"kind": "youtube#channelListResponse", "items": items})
+
+    async def playlist_items(request: web.Request) -> web.Response:
+        result = await guarded(request, "playlistItems")
+        if isinstance(result, web.Response):
+            return result
+        playlist = request.query.get("playlistId", "")
+        channel = next((c for c in fake.channels.values() if c.uploads_playlist == playlist), None)
+        if channel is None:
+            return _error(404, "playlistNotFound")
+        start, stop, next_token = _page(request, len(channel.videos), 5, 50)
+        items = []
+        for video in channel.videos[start:stop]:
+            published = video.published_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+            items.append({
+                "kind": "youtube#playlistItem",
+                "id": f"pl-{video.video_id}",
+                "snippet": {
+                    "title": video.title,
+                    "description": "",
+                    "publishedAt": published,
+                    "thumbnails": {"high": {"url": f"https://img.example/{video.video_id}.jpg"}},
+                    "resourceId": {"kind": "youtube#video", "videoId": video.video_id},
+                },
+                "contentDetails": {"videoId": video.video_id, "videoPublishedAt": published},
+            })
+        body = {"kind": "youtube#playlistItemListResponse", "items": items}
+        if next_token:
+            body["nextPageToken"] = next_token
+        return _with_etag(request, body)
+
+    async def videos(request: web.Request) -> web.Response:
+        result = await guarded(request, "videos")
+        if isinstance(result, web.Response):
+            return result
+        ids = [i for i in request.query.get("id", "").split(",") if i in fake.videos][:50]
+        items = [{
+            "kind": "youtube#video",
+            "id": video_id,
+            "statistics": {
+                "viewCount": str(fake.videos[video_id].view_count),
+                "likeCount": "0",
+                "commentCount": str(fake.videos[video_id].comment_count),
+            },
+        } for video_id in ids]
+        return _with_etag(request, {"kind": "youtube#videoListResponse", "items": items})
+
+    async def comment_threads(request: web.Request) -> web.Response:
+        result = await guarded(request, "commentThreads")
+        if isinstance(result, web.Response):
+            return result
+        video = fake.videos.get(request.query.get("videoId", ""))
+        if video is None:
+            return _error(404, "videoNotFound")
+        # Comments are generated newest first, which is what order=time asks for
+        start, stop, next_token = _page(request, video.comment_count, 20, 100)
+        body = {
+            "kind": "youtube#commentThreadListResponse",
+            "items": [fake.comment(video.video_id, i) for i in range(start, stop)],
+        }
+        if next_token:
+            body["nextPageToken"] = next_token
+        return web.json_response(body)
+
+    async def list_comments(request: web.Request) -> web.Response:
+        result = await guarded(request, "comments.list")
+        if isinstance(result, web.Response):
+            return result
+        replies = fake.replies.get(request.query.get("parentId", ""), [])
+        return web.json_response({"kind": "youtube#commentListResponse", "items": list(replies)})
+
+    async def insert_comment(request: web.Request) -> web.Response:
+        result = await guarded(request, "comments.insert")
+        if isinstance(result, web.Response):
+            return result
+        body = await request.json()
+        snippet = body.get("snippet", {})
+        parent_id = snippet.get("parentId")
+        if not parent_id or not snippet.get("textOriginal"):
+            return _error(400, "invalidValue")
+        replies = fake.replies.setdefault(parent_id, [])
+        reply = {
+            "kind": "youtube#comment",
+            "id": f"{parent_id}.r{len(replies) + 1}",
+            "snippet": {
+                "parentId": parent_id,
+                "textOriginal": snippet["textOriginal"],
+                "textDisplay": snippet["textOriginal"],
+                "authorDisplayName": fake.channels[result].title,
+                "publishedAt": fake.now.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            },
+        }
+        replies.append(reply)
+        return web.json_response(reply)
+
+    async def token(request: web.Request) -> web.Response:
+        fake.calls["token"] += 1
+        await fake.delay()
+        rule = fake._take_error("token")
+        if rule is not None:
+            return web.json_response({"error": "server_error"}, status=rule.status)
+        form = await request.post()
+        if form.get("grant_type") != "refresh_token":
+            return web.json_response({"error": "unsupported_grant_type"}, status=400)
+        access_token = fake.issue_token(form.get("refresh_token", ""))
+        if access_token is None:
+            return web.json_response(
+                {"error": "invalid_grant", "error_description": "Token has been expired or revoked."}, status=400
+            )
+        return web.json_response({"access_token": access_token, "expires_in": 3599, "token_type": "Bearer"})
+
+    app = web.Application()
+    app.router.add_get("/youtube/v3/channels", channels)
+    app.router.add_get("/youtube/v3/playlistItems", playlist_items)
+    app.router.add_get("/youtube/v3/videos", videos)
+    app.router.add_get("/youtube/v3/commentThreads", comment_threads)
+    app.router.add_get("/youtube/v3/comments", list_comments)
+    app.router.add_post("/youtube/v3/comments", insert_comment)
+    app.router.add_post("/token", token)
+    return app
+
+
+class FakeYouTubeServer:
+    """Run a FakeYouTube on a local port
+
+        async with FakeYouTubeServer(fake) as server:
+            client.base_url = server.base_url
+            client.token_url = server.token_url
+    """
+
+    def __init__(self, fake: FakeYouTube, host: str = "127.0.0.1", port: int = 0):
+        self.fake = fake
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/youtube/v3"
+
+    @property
+    def token_url(self) -> str:
+        return f"http://{self.host}:{self.port}/token"
+
+    async def start(self):
+        self._runner = web.AppRunner(create_app(self.fake), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Port 0 = pick a free one
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeYouTubeServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake YouTube Data API for offline runs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--videos", type=int, default=5)
+    parser.add_argument("--comments", type=int, default=10_000, help="Comments per video")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--daily-quota", type=int, default=10_000)
+    args = parser.parse_args()
+
+    fake = FakeYouTube(seed=args.seed, daily_quota=args.daily_quota, latency=args.latency, jitter=args.jitter)
+    for i in range(args.channels):
+        fake.add_channel(f"UCfake{i:04d}", videos=args.videos, comments_per_video=args.comments)
+
+    print(f"Fake YouTube on http://{args.host}:{args.port}")
+    print(f"  YOUTUBE_API_BASE_URL=http://{args.host}:{args.port}/youtube/v3")
+    print(f"  GOOGLE_OAUTH_TOKEN_URL=http://{args.host}:{args.port}/token")
+    print(f"  Tokens: {', '.join(sorted(fake.tokens))}")
+    print(f"  Refresh tokens: {', '.join(sorted(fake.refresh_tokens))}")
+    web.run_app(create_app(fake), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Seed Data for Load Tests
+
+Creates users with videos and a week of reply history, and mints a signed
+HS256 token (settings.SECRET_KEY, `user_id` claim) for each, so Locust
+traffic gets past get_current_user and exercises the real DB and cache
+paths. The fixtures file is what tests/load_test.py reads.
+
+Run against a scratch database, with the same SECRET_KEY as the API:
+    python tests/load_seed.py --users 200 --videos 100 --replies 500
+    locust -f tests/load_test.py --host=http://localhost:8000
+
+Remove the seeded rows afterwards:
+    python tests/load_seed.py --cleanup
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import jwt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_fixtures.json")
+
+
+def mint_token(user_id: int, ttl_hours: int = 24) -> str:
+    """Token in the shape get_current_user accepts"""
+    payload = {
+        "user_id": user_id,
+        "iat": datetime.utcnow(),
+        "exp": datetime.utcnow() + timedelta(hours=ttl_hours),
+    }
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm="HS256")
+
+
+async def seed(users: int, videos: int, replies: int, ttl_hours: int) -> dict:
+    import database_pg as db
+
+    run_id = uuid.uuid4().hex[:8]
+    fixtures = {"run_id": run_id, "created_at": datetime.utcnow().isoformat(), "users": []}
+
+    for u in range(users):
+        channel_id = f"UCload{run_id}{u:05d}"
+        user = await db.create_or_update_user(
+            email=f"load-{run_id}-{u}@example.com",
+            google_id=f"load-{run_id}-{u}",
+            channel_id=channel_id,
+            channel_name=f"Load channel {u}",
+            channel_thumbnail="",
+            access_token=f"token-{channel_id}",
+            refresh_token=f"refresh-{channel_id}",
+            token_expiry=datetime.utcnow() + timedelta(hours=1)
+        )
+        video_ids = [f"{channel_id}-v{i:04d}" for i in range(videos)]
+        now = datetime.utcnow()
+        await db.upsert_videos_batch(user["id"], [{
+            "video_id": video_id,
+            "title": f"Load test video {i}",
+            "description": "",
+            "thumbnail_url": "",
+            "published_at": now - timedelta(hours=i),
+            "view_count": 1000 * (i + 1),
+            "comment_count": 10 * (i + 1),
+        } for i, video_id in enumerate(video_ids)])
+
+        # A week of replies spread over the user's videos, for analytics and the chart
+        async with db.acquire_connection() as conn:
+            await conn.execute("""
+                INSERT INTO replied_comments (
+                    comment_id, video_id, user_id, comment_text,
+                    comment_author, keyword_matched, reply_text, replied_at
+                )
+                SELECT
+                    $1 || '-c' || n,
+                    ($2::text[])[1 + n % array_length($2::text[], 1)],
+                    $3,
+                    'what is the price of this?',
+                    'viewer' || n,
+                    'price',
+                    'Thanks for asking!',
+                    NOW() - (n % (7 * 24 * 60)) * interval '1 minute'
+                FROM generate_series(1, $4) AS n
+                ON CONFLICT (comment_id) DO NOTHING
+            """, channel_id, video_ids, user["id"], replies)
+
+        fixtures["users"].append({
+            "user_id": user["id"],
+            "token": mint_token(user["id"], ttl_hours),
+            "video_ids": video_ids,
+        })
+
+    return fixtures
+
+
+async def cleanup(fixtures: dict) -> int:
+    import database_pg as db
+
+    user_ids = [u["user_id"] for u in fixtures["users"]]
+    async with db.acquire_connection() as conn:
+        # videos and replied_comments cascade
+        await conn.execute("DELETE FROM users WHERE id = ANY($1::int[])", user_ids)
+    return len(user_ids)
+
+
+async def main_async(args):
+    import database_pg as db
+
+    if not settings.USE_POSTGRES:
+        raise SystemExit("Set DATABASE_URL to a scratch Postgres database first")
+
+    await db.init_db()
+    try:
+        if args.cleanup:
+            with open(args.fixtures) as f:
+                fixtures = json.load(f)
+            removed = await cleanup(fixtures)
+            os.remove(args.fixtures)
+            print(f"Removed {removed} seeded users")
+            return
+
+        fixtures = await seed(args.users, args.videos, args.replies, args.ttl_hours)
+        with open(args.fixtures, "w") as f:
+            json.dump(fixtures, f)
+        print(f"Seeded {args.users} users x {args.videos} videos -> {args.fixtures}")
+    finally:
+        await db.close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed users, videos and tokens for tests/load_test.py")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--videos", type=int, default=50, help="Videos per user")
+    parser.add_argument("--replies", type=int, default=200, help="Reply history rows per user")
+    parser.add_argument("--ttl-hours", type=int, default=24, help="Token lifetime")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--cleanup", action="store_true", help="Delete the users in --fixtures")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,164 +1,233 @@
 """
 Load Testing with Locust
 
-This simulates thousands of concurrent users to test the system's performance.
+Simulates dashboard users against seeded data with real signed tokens, so
+requests get past authentication and hit the actual DB and cache paths.
+
+Seed first (same DATABASE_URL and SECRET_KEY as the API):
+    python tests/load_seed.py --users 200 --videos 100
 
 Run with:
     locust -f tests/load_test.py --host=http://localhost:8000
-    
-Then open http://localhost:8089 and start the test.
+
+Headless, failing the run (exit code 1) when a latency budget is missed:
+    locust -f tests/load_test.py --host=http://localhost:8000 \\
+        --headless --users 500 --spawn-rate 50 --run-time 5m
+
+Budgets are p95 milliseconds per endpoint (BUDGETS below); override with
+LOAD_TEST_BUDGETS="GET /api/videos/=150,GET /api/analytics/=100".
+LOAD_TEST_MAX_FAILURE_RATE (default 0.01) bounds the error rate.
 """
-from locust import HttpUser, task, between
-import random
+from locust import HttpUser, task, between, events
 import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
 
+FIXTURES = os.getenv(
+    "LOAD_TEST_FIXTURES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_fixtures.json")
+)
+
+# p95 latency budget (ms) per request name
+BUDGETS = {
+    "GET /api/videos/": 200,
+    "GET /api/videos/?cursor": 200,
+    "GET /api/videos/?auto_reply_enabled": 200,
+    "GET /api/videos/[id]/settings": 100,
+    "PUT /api/videos/[id]/settings": 250,
+    "POST /api/videos/upsert-batch": 500,
+    "GET /api/analytics/": 150,
+    "GET /api/analytics/chart": 150,
+    "GET /health": 50,
+}
+
+MAX_FAILURE_RATE = float(os.getenv("LOAD_TEST_MAX_FAILURE_RATE", "0.01"))
+
+KEYWORDS = ["price", "link", "info", "where", "how", "song", "recipe", "discount"]
+TEMPLATES = ["Thanks for watching!", "Check the description 👇", "Link is pinned!", "Glad it helped 🙏"]
+
+
+def _load_fixtures():
+    try:
+        with open(FIXTURES) as f:
+            return json.load(f)["users"]
+    except FileNotFoundError:
+        raise SystemExit(f"{FIXTURES} not found - run tests/load_seed.py first")
+
+
+def _budgets():
+    budgets = dict(BUDGETS)
+    for part in os.getenv("LOAD_TEST_BUDGETS", "").split(","):
+        if "=" in part:
+            name, ms = part.rsplit("=", 1)
+            budgets[name.strip()] = float(ms)
+    return budgets
+
+
+SEEDED_USERS = _load_fixtures()
+
+
+class SeededUser(HttpUser):
+    """Base: one seeded account per simulated user, with its real token"""
+
+    abstract = True
 
-class YouTubeAutoReplyUser(HttpUser):
-    """Simulates a user interacting with the YouTube Auto-Reply API"""
-    
-    # Wait 1-3 seconds between tasks
-    wait_time = between(1, 3)
-    
     def on_start(self):
-        """Called when a simulated user starts"""
-        # Simulate login
-        self.token = "test-token-" + str(random.randint(1000, 9999))
+        account = random.choice(SEEDED_USERS)
+        self.user_id = account["user_id"]
+        self.video_ids = account["video_ids"]
         self.headers = {
-            "Authorization": f"Bearer {self.token}",
+            "Authorization": f"Bearer {account['token']}",
             "Content-Type": "application/json"
         }
-    
-    @task(5)  # Weight: 5x more likely than other tasks
-    def get_videos(self):
-        """Fetch user's videos"""
-        with self.client.get(
-            "/api/videos/",
-            headers=self.headers,
-            catch_response=True
-        ) as response:
-            if response.status_code == 200:
-                response.success()
-            elif response.status_code in [401, 404]:
-                # Expected for test tokens
-                response.success()
-            else:
-                response.failure(f"Got status code {response.status_code}")
-    
+
+    def get(self, url, name, **kwargs):
+        return self.client.get(url, headers=self.headers, name=name, **kwargs)
+
+
+class YouTubeAutoReplyUser(SeededUser):
+    """Simulates a user working through the dashboard"""
+
+    # Wait 1-3 seconds between tasks
+    wait_time = between(1, 3)
+    weight = 8
+
+    @task(6)
+    def list_videos(self):
+        """First page, then sometimes the next one"""
+        response = self.get("/api/videos/?limit=50", name="GET /api/videos/")
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor and random.random() < 0.3:
+            self.get(f"/api/videos/?limit=50&cursor={cursor}", name="GET /api/videos/?cursor")
+
+    @task(2)
+    def list_enabled_videos(self):
+        self.get("/api/videos/?auto_reply_enabled=true", name="GET /api/videos/?auto_reply_enabled")
+
     @task(3)
-    def get_analytics(self):
-        """Fetch analytics"""
-        with self.client.get(
-            "/api/analytics/",
-            headers=self.headers,
-            catch_response=True
-        ) as response:
-            if response.status_code in [200, 401]:
-                response.success()
-            else:
-                response.failure(f"Got status code {response.status_code}")
-    
+    def view_settings(self):
+        video_id = random.choice(self.video_ids)
+        self.get(f"/api/videos/{video_id}/settings", name="GET /api/videos/[id]/settings")
+
     @task(2)
-    def sync_videos(self):
-        """Trigger video sync"""
-        with self.client.get(
-            "/api/videos/sync",
+    def update_settings(self):
+        video_id = random.choice(self.video_ids)
+        adaptive = random.random() < 0.3
+        self.client.put(
+            f"/api/videos/{video_id}/settings",
             headers=self.headers,
-            catch_response=True
-        ) as response:
-            if response.status_code in [200, 401, 500]:
-                # 500 is acceptable for test without real YouTube API
-                response.success()
-            else:
-                response.failure(f"Got status code {response.status_code}")
-    
+            name="PUT /api/videos/[id]/settings",
+            json={
+                "auto_reply_enabled": random.random() < 0.7,
+                "keywords": random.sample(KEYWORDS, random.randint(1, 4)),
+                "reply_templates": random.sample(TEMPLATES, random.randint(1, 3)),
+                "schedule_type": "hourly",
+                "schedule_interval_minutes": random.choice([15, 30, 60, 120]),
+                "adaptive_schedule": adaptive,
+            }
+        )
+
+    @task(4)
+    def view_analytics(self):
+        self.get("/api/analytics/", name="GET /api/analytics/")
+
+    @task(2)
+    def view_chart(self):
+        days = random.choice([7, 7, 7, 30])
+        self.get(f"/api/analytics/chart?days={days}", name="GET /api/analytics/chart")
+
     @task(1)
-    def trigger_reply(self):
-        """Trigger auto-reply"""
-        video_id = "test-video-" + str(random.randint(1, 100))
-        with self.client.post(
-            f"/api/videos/{video_id}/trigger-reply",
+    def upsert_batch(self):
+        """Frontend sync: refresh some known videos, add a few new ones"""
+        now = datetime.utcnow()
+        known = random.sample(self.video_ids, min(20, len(self.video_ids)))
+        new = [f"{self.video_ids[0].rsplit('-v', 1)[0]}-n{uuid.uuid4().hex[:8]}" for _ in range(random.randint(0, 3))]
+        self.client.post(
+            "/api/videos/upsert-batch",
             headers=self.headers,
-            catch_response=True
-        ) as response:
-            if response.status_code in [200, 401, 404, 503]:
-                response.success()
-            else:
-                response.failure(f"Got status code {response.status_code}")
-    
-    @task(10)  # Most frequent - health check
+            name="POST /api/videos/upsert-batch",
+            json=[{
+                "video_id": video_id,
+                "title": f"Video {video_id}",
+                "description": "",
+                "thumbnail_url": "",
+                "published_at": (now - timedelta(hours=i)).isoformat(),
+                "view_count": random.randint(100, 100000),
+                "comment_count": random.randint(0, 5000),
+            } for i, video_id in enumerate(known + new)]
+        )
+
+    @task(5)
     def health_check(self):
         """Health check endpoint"""
-        with self.client.get("/health") as response:
-            if response.status_code == 200:
-                response.success()
+        self.client.get("/health", name="GET /health")
+
 
+class HighLoadUser(SeededUser):
+    """Simulates high-frequency reads (cache hit path)"""
 
-class HighLoadUser(HttpUser):
-    """Simulates high-frequency API calls"""
-    
     wait_time = between(0.1, 0.5)  # Very fast - 100-500ms between requests
-    
-    def on_start(self):
-        self.token = "heavy-user-" + str(random.randint(1000, 9999))
-        self.headers = {"Authorization": f"Bearer {self.token}"}
-    
-    @task
+    weight = 1
+
+    @task(2)
     def rapid_video_checks(self):
-        """Rapid video list checks"""
-        self.client.get("/api/videos/", headers=self.headers)
-    
-    @task
+        self.get("/api/videos/?limit=50", name="GET /api/videos/")
+
+    @task(1)
     def rapid_analytics(self):
-        """Rapid analytics checks"""
-        self.client.get("/api/analytics/", headers=self.headers)
-
-
-class BurstUser(HttpUser):
-    """Simulates burst traffic - sudden spikes"""
-    
-    wait_time = between(0, 1)
-    
-    @task
-    def burst_requests(self):
-        """Send burst of requests"""
-        for _ in range(10):
-            self.client.get("/health")
-            self.client.get("/")
-
-
-# Custom test scenarios
-class DatabaseStressTest(HttpUser):
-    """Test database under heavy load"""
-    
+        self.get("/api/analytics/", name="GET /api/analytics/")
+
+
+class WriteHeavyUser(SeededUser):
+    """Settings churn - every write invalidates the user's cached lists"""
+
     wait_time = between(0.5, 1.5)
-    
-    def on_start(self):
-        self.user_id = random.randint(1, 100)
-        self.headers = {"Authorization": f"Bearer test-{self.user_id}"}
-    
-    @task(5)
-    def read_videos(self):
-        """Stress test video reads"""
-        self.client.get("/api/videos/", headers=self.headers)
-    
-    @task(2)
-    def read_analytics(self):
-        """Stress test analytics queries"""
-        self.client.get("/api/analytics/", headers=self.headers)
-        self.client.get("/api/analytics/chart?days=7", headers=self.headers)
-    
-    @task(1)
-    def write_operation(self):
-        """Stress test write operations"""
-        video_id = f"video-{random.randint(1, 1000)}"
-        settings = {
-            "auto_reply_enabled": random.choice([True, False]),
-            "keywords": ["test", "demo"],
-            "reply_templates": ["Thanks!"],
-            "schedule_type": "hourly"
-        }
+    weight = 1
+
+    @task(3)
+    def write_then_read(self):
+        video_id = random.choice(self.video_ids)
         self.client.put(
             f"/api/videos/{video_id}/settings",
             headers=self.headers,
-            json=settings
+            name="PUT /api/videos/[id]/settings",
+            json={
+                "auto_reply_enabled": random.choice([True, False]),
+                "keywords": random.sample(KEYWORDS, 2),
+                "reply_templates": random.sample(TEMPLATES, 1),
+                "schedule_type": "hourly",
+            }
         )
+        self.get("/api/videos/?limit=50", name="GET /api/videos/")
+
+    @task(1)
+    def chart(self):
+        self.get("/api/analytics/chart?days=7", name="GET /api/analytics/chart")
+
+
+@events.quitting.add_listener
+def enforce_budgets(environment, **kwargs):
+    """Exit non-zero when an endpoint's p95 or the overall error rate is over budget"""
+    stats = environment.stats
+    failures = []
+
+    for name, budget_ms in _budgets().items():
+        entry = stats.entries.get((name, name.split(" ", 1)[0]))
+        if entry is None or not entry.num_requests:
+            continue
+        p95 = entry.get_response_time_percentile(0.95)
+        if p95 > budget_ms:
+            failures.append(f"{name}: p95 {p95:.0f}ms > {budget_ms:.0f}ms budget")
+
+    total = stats.total
+    if total.num_requests and total.fail_ratio > MAX_FAILURE_RATE:
+        failures.append(f"failure rate {total.fail_ratio:.2%} > {MAX_FAILURE_RATE:.2%}")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ Budget exceeded - {failure}")
+        environment.process_exit_code = 1
+    else:
+        print("✅ All latency budgets met")
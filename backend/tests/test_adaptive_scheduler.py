@@ -0,0 +1,134 @@
+"""
+Adaptive polling: rate estimate and next-check interval
+
+Run:
+    pytest tests/test_adaptive_scheduler.py -v
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+
+from services.adaptive_scheduler import (
+    next_interval_minutes,
+    plan_next_check,
+    update_comment_rate,
+)
+
+
+@pytest.fixture(autouse=True)
+def adaptive_settings(monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "ADAPTIVE_TARGET_COMMENTS_PER_CHECK", 5.0)
+    monkeypatch.setattr(settings, "ADAPTIVE_RATE_SMOOTHING", 0.3)
+    monkeypatch.setattr(settings, "ADAPTIVE_MIN_INTERVAL_MINUTES", 5)
+    monkeypatch.setattr(settings, "ADAPTIVE_MAX_INTERVAL_MINUTES", 1440)
+
+
+@pytest.mark.parametrize("rate, min_minutes, max_minutes, target, expected", [
+    (0, 5, 1440, None, 1440),       # silent video: back off fully
+    (-1, 5, 1440, None, 1440),
+    (60, 5, 1440, None, 5),         # 5 comments arrive every 5 minutes
+    (1, 5, 1440, None, 300),
+    (0.001, 5, 1440, None, 1440),   # clamped to max
+    (1000, 5, 1440, None, 5),       # clamped to min
+    (1000, None, 60, None, 1),      # unset min means 1 minute
+    (1000, 0, 60, None, 1),
+    (0, 30, 10, None, 30),          # max below min is raised to min
+    (0, 30, None, None, 30),
+    (10, 5, 1440, 20, 120),         # explicit target
+])
+def test_next_interval_minutes(rate, min_minutes, max_minutes, target, expected):
+    assert next_interval_minutes(rate, min_minutes, max_minutes, target) == expected
+
+
+@pytest.mark.parametrize("previous, new_comments, elapsed_hours, smoothing, expected", [
+    (None, 5, 0, None, 0.0),        # no time passed: keep what we had
+    (2.0, 5, 0, None, 2.0),
+    (2.0, 5, -1, None, 2.0),
+    (None, 10, 2, None, 5.0),       # first observation is taken as is
+    (10.0, 20, 1, None, 13.0),      # EWMA with the configured smoothing
+    (10.0, 20, 1, 1.0, 20.0),
+    (10.0, 0, 4, 0.5, 5.0),
+])
+def test_update_comment_rate(previous, new_comments, elapsed_hours, smoothing, expected):
+    assert update_comment_rate(previous, new_comments, elapsed_hours, smoothing) == pytest.approx(expected)
+
+
+def _video(**overrides):
+    video = {
+        "video_id": "v1",
+        "adaptive_schedule": True,
+        "schedule_interval_minutes": 60,
+        "comment_rate_per_hour": None,
+        "newest_comment_at": None,
+        "last_checked_at": None,
+        "min_interval_minutes": None,
+        "max_interval_minutes": None,
+    }
+    video.update(overrides)
+    return video
+
+
+NEWEST = datetime(2024, 1, 1, 12, 0)
+
+
+@pytest.mark.parametrize("video, stats, replies_in_window, expected", [
+    # Fixed schedule: interval and rate are left alone
+    (
+        _video(adaptive_schedule=False, schedule_interval_minutes=15, comment_rate_per_hour=3.0),
+        {"newest_published_at": "2024-01-01T12:00:00Z"},
+        0,
+        {"comment_rate_per_hour": 3.0, "newest_comment_at": NEWEST, "interval_minutes": 15},
+    ),
+    (
+        _video(adaptive_schedule=False, schedule_interval_minutes=None),
+        {},
+        0,
+        {"comment_rate_per_hour": None, "newest_comment_at": None, "interval_minutes": 60},
+    ),
+    # First adaptive poll: rate seeded from a week of replies (168 -> 1/hour)
+    (
+        _video(),
+        {"newest_published_at": "2024-01-01T12:00:00Z", "arrived_since_last_poll": 40},
+        168,
+        {"comment_rate_per_hour": 1.0, "newest_comment_at": NEWEST, "interval_minutes": 300},
+    ),
+    # No history at all: poll at the video's max interval
+    (
+        _video(max_interval_minutes=720),
+        {},
+        0,
+        {"comment_rate_per_hour": 0.0, "newest_comment_at": None, "interval_minutes": 720},
+    ),
+    # Checked before, but no comment baseline yet: keep the previous rate
+    (
+        _video(comment_rate_per_hour=12.0, last_checked_at=datetime.utcnow() - timedelta(hours=1)),
+        {"arrived_since_last_poll": 100},
+        0,
+        {"comment_rate_per_hour": 12.0, "newest_comment_at": None, "interval_minutes": 25},
+    ),
+    # Newest comment kept from the row when the check saw nothing newer
+    (
+        _video(comment_rate_per_hour=12.0, newest_comment_at=NEWEST, min_interval_minutes=30),
+        {},
+        0,
+        {"comment_rate_per_hour": 12.0, "newest_comment_at": NEWEST, "interval_minutes": 30},
+    ),
+])
+def test_plan_next_check(video, stats, replies_in_window, expected):
+    assert plan_next_check(video, stats, replies_in_window) == expected
+
+
+def test_plan_next_check_blends_observed_rate():
+    video = _video(
+        comment_rate_per_hour=12.0,
+        newest_comment_at=NEWEST,
+        last_checked_at=datetime.utcnow() - timedelta(hours=1),
+    )
+    # 36 arrivals in the last hour: 0.3 * 36 + 0.7 * 12 = 19.2 per hour
+    plan = plan_next_check(video, {"arrived_since_last_poll": 36})
+    assert plan["comment_rate_per_hour"] == pytest.approx(19.2, rel=1e-3)
+    assert plan["interval_minutes"] == 15
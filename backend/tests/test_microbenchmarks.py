@@ -0,0 +1,301 @@
+"""
+Microbenchmarks for the CPU-bound reply pipeline helpers
+
+Keyword matching, already-replied filtering, reply rendering and comment
+record conversion run once per comment, so they are timed here on
+synthetic corpora (ASCII, emoji-heavy, long multilingual) of 1k/10k/100k
+comments. Corpora are generated from fixed seeds, so runs are comparable.
+
+Run (needs pytest-benchmark):
+    pytest tests/test_microbenchmarks.py --benchmark-only --benchmark-autosave
+
+Compare against the previous saved run after changing the matcher or
+record types:
+    pytest tests/test_microbenchmarks.py --benchmark-only --benchmark-compare
+
+Quick pass over the small sizes only:
+    pytest tests/test_microbenchmarks.py --benchmark-only -k "1000-"
+
+The large cases take minutes each, so a plain `pytest` run skips this
+module; it runs under --benchmark-only or with RUN_BENCHMARKS=1.
+"""
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from services.video_config import KeywordMatcher
+from utils.text_variation import TemplateSet, TextVariation, compile_template
+
+SIZES = [1_000, 10_000, 100_000]
+KEYWORD_COUNTS = [1, 10, 100, 500]
+CORPORA = ["ascii", "emoji", "multilingual"]
+
+_ASCII_WORDS = (
+    "great video thanks love this content so helpful please make more awesome "
+    "tutorial learned a lot can you share amazing explained well where did you "
+    "get that song what camera do you use first time watching subscribed"
+).split()
+_EMOJI = list("😂🔥❤👍🙏😍🎉💯✨😭🤣👏😎🥰💪🙌")
+_MULTILINGUAL_WORDS = (
+    "спасибо отличное видео очень полезно 谢谢 非常 有用的 视频 شكرا جزيلا "
+    "فيديو رائع gracias excelente vídeo muy útil ありがとう 素晴らしい 動画です "
+    "धन्यवाद बहुत अच्छा वीडियो merci beaucoup superbe vidéo danke schön tolles"
+).split()
+# Words real keyword lists look for - a share of comments contain one
+_HIT_WORDS = ["price", "link", "цена", "链接", "precio", "リンク", "السعر"]
+
+
+@lru_cache(maxsize=None)
+def make_corpus(kind: str, size: int, seed: int = 0) -> Tuple[str, ...]:
+    """`size` comment texts of one style, identical for every run"""
+    rng = random.Random(f"{kind}:{size}:{seed}")
+    texts = []
+    for _ in range(size):
+        if kind == "ascii":
+            words = rng.choices(_ASCII_WORDS, k=rng.randint(4, 20))
+        elif kind == "emoji":
+            words = [
+                rng.choice(_ASCII_WORDS) if rng.random() < 0.5 else "".join(rng.choices(_EMOJI, k=rng.randint(1, 4)))
+                for _ in range(rng.randint(4, 16))
+            ]
+        else:
+            # Long, mixed-script comments
+            words = rng.choices(_MULTILINGUAL_WORDS + _ASCII_WORDS, k=rng.randint(30, 120))
+        if rng.random() < 0.1:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(_HIT_WORDS))
+        texts.append(" ".join(words))
+    return tuple(texts)
+
+
+def make_keywords(count: int, seed: int = 0) -> List[str]:
+    """`count` keywords: mostly misses, with the real hit words last
+
+    Hit words at the end make the first-match-in-list-order scan walk the
+    whole list on every hit, the matcher's worst case.
+    """
+    rng = random.Random(f"keywords:{count}:{seed}")
+    hits = _HIT_WORDS[:max(1, min(len(_HIT_WORDS), count // 10 or 1))]
+    misses = [
+        "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(4, 10)))
+        for _ in range(count - len(hits))
+    ]
+    return misses + hits
+
+
+def make_threads(kind: str, size: int) -> List[Dict]:
+    """commentThreads API items for the corpus (newest first)"""
+    now = datetime(2024, 1, 1)
+    return [{
+        "id": f"c{i:07d}",
+        "snippet": {"topLevelComment": {"snippet": {
+            "textDisplay": text,
+            "authorDisplayName": f"viewer{i % 5000}",
+            "publishedAt": (now - timedelta(seconds=30 * i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }}},
+    } for i, text in enumerate(make_corpus(kind, size))]
+
+
+@pytest.fixture(autouse=True)
+def benchmarks_opt_in(request):
+    if not (request.config.getoption("benchmark_only", default=False) or os.getenv("RUN_BENCHMARKS")):
+        pytest.skip("microbenchmarks run with --benchmark-only or RUN_BENCHMARKS=1")
+
+
+@pytest.fixture
+def record_types():
+    """CommentRecord lives in the YouTube client module"""
+    for module in ("aiohttp", "pydantic_settings"):
+        pytest.importorskip(module)
+    from services.youtube_client import CommentRecord
+    return CommentRecord
+
+
+@pytest.fixture
+def engine_module():
+    for module in ("aiohttp", "pydantic_settings", "asyncpg", "redis"):
+        pytest.importorskip(module)
+    import services.reply_engine as reply_engine
+    return reply_engine
+
+
+# ============================================
+# KEYWORD MATCHING
+# ============================================
+
+@pytest.mark.parametrize("keyword_count", KEYWORD_COUNTS)
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("kind", CORPORA)
+def test_keyword_matcher(benchmark, kind, size, keyword_count):
+    """KeywordMatcher.match over every comment text"""
+    benchmark.group = f"keyword_matcher-{kind}"
+    texts = make_corpus(kind, size)
+    matcher = KeywordMatcher(make_keywords(keyword_count))
+
+    def run():
+        match = matcher.match
+        return sum(1 for text in texts if match(text) is not None)
+
+    hits = benchmark(run)
+    assert 0 < hits < size
+
+
+def test_keyword_matcher_compile(benchmark):
+    """Building the matcher (once per settings version)"""
+    keywords = make_keywords(500)
+    benchmark(KeywordMatcher, keywords)
+
+
+@pytest.mark.parametrize("keyword_count", [1, 100, 500])
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("kind", CORPORA)
+def test_filter_comments_by_keywords(benchmark, engine_module, record_types, kind, size, keyword_count):
+    """ReplyEngine.filter_comments_by_keywords on parsed records"""
+    benchmark.group = f"filter_comments_by_keywords-{kind}"
+    comments = [record_types.from_thread(item) for item in make_threads(kind, size)]
+    matcher = KeywordMatcher(make_keywords(keyword_count))
+    engine = engine_module.ReplyEngine(None, None)
+
+    matched = benchmark(engine.filter_comments_by_keywords, comments, matcher)
+    assert matched and all(c.matched_keyword for c in matched)
+
+
+# ============================================
+# ALREADY-REPLIED FILTERING
+# ============================================
+
+@pytest.mark.parametrize("size", SIZES)
+def test_filter_non_replied(benchmark, engine_module, record_types, monkeypatch, size):
+    """ReplyEngine.filter_non_replied with the DB lookup answered from memory
+
+    Times the engine's own work (id list, set filtering) around
+    has_replied_batch; the query itself is covered by test_performance.py.
+    """
+    comments = [record_types.from_thread(item) for item in make_threads("ascii", size)]
+    replied = {c.id for c in comments[::3]}
+
+    async def has_replied_batch(comment_ids):
+        return replied
+
+    monkeypatch.setattr(engine_module, "has_replied_batch", has_replied_batch)
+    engine = engine_module.ReplyEngine(None, None)
+    loop = asyncio.new_event_loop()
+    try:
+        remaining = benchmark(lambda: loop.run_until_complete(engine.filter_non_replied(comments)))
+    finally:
+        loop.close()
+    assert len(remaining) == size - len(replied)
+
+
+# ============================================
+# REPLY RENDERING
+# ============================================
+
+TEMPLATES = [
+    "Thanks {name}! 🙏",
+    "Hey {name}, the {keyword} is in the description of {video_title} 👇",
+    "Glad you liked {video_title}! Check {link} for more ✨",
+    "Thank you so much for watching!",
+]
+
+
+def _variables(kind: str, size: int) -> List[Dict[str, str]]:
+    return [
+        {"name": f"viewer{i % 5000}", "video_title": text[:60], "link": "https://example.com", "keyword": "price"}
+        for i, text in enumerate(make_corpus(kind, size))
+    ]
+
+
+@pytest.mark.parametrize("size", [1_000, 10_000])
+@pytest.mark.parametrize("kind", CORPORA)
+def test_generate_reply(benchmark, kind, size):
+    """TextVariation.generate_reply once per comment (compiled-template cache warm)"""
+    benchmark.group = "generate_reply"
+    variables = _variables(kind, size)
+    templates = [compile_template(t) for t in TEMPLATES]
+
+    def run():
+        random.seed(0)
+        generate = TextVariation.generate_reply
+        return [generate(templates[i % len(templates)], v) for i, v in enumerate(variables)]
+
+    replies = benchmark(run)
+    assert len(replies) == size
+
+
+@pytest.mark.parametrize("size", [1_000, 10_000])
+def test_generate_reply_from_source(benchmark, size):
+    """generate_reply with template strings, as the manual reply path passes them"""
+    benchmark.group = "generate_reply"
+    variables = _variables("ascii", size)
+
+    def run():
+        random.seed(0)
+        return [TextVariation.generate_reply(TEMPLATES[i % len(TEMPLATES)], v) for i, v in enumerate(variables)]
+
+    benchmark(run)
+
+
+@pytest.mark.parametrize("size", [1_000, 10_000])
+def test_generate_replies_batch(benchmark, size):
+    """TextVariation.generate_replies - templates drawn in one call"""
+    benchmark.group = "generate_reply"
+    variables = _variables("ascii", size)
+    templates = TemplateSet(TEMPLATES)
+
+    def run():
+        random.seed(0)
+        return TextVariation.generate_replies(templates, variables)
+
+    assert len(benchmark(run)) == size
+
+
+# ============================================
+# RECORD CONVERSION
+# ============================================
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("kind", CORPORA)
+def test_comment_record_from_thread(benchmark, record_types, kind, size):
+    """API item -> CommentRecord (every fetched comment)"""
+    benchmark.group = "comment_record_from_thread"
+    items = make_threads(kind, size)
+    records = benchmark(lambda: [record_types.from_thread(item) for item in items])
+    assert len(records) == size
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_comment_record_round_trip(benchmark, record_types, size):
+    """CommentRecord -> dict -> CommentRecord (Celery hand-off)"""
+    records = [record_types.from_thread(item) for item in make_threads("ascii", size)]
+    from_dict = record_types.from_dict
+    restored = benchmark(lambda: [from_dict(r.to_dict()) for r in records])
+    assert restored[-1].id == records[-1].id
+
+
+@pytest.mark.parametrize("size", [1_000, 10_000])
+def test_video_rows_to_json(benchmark, size):
+    """Video list rows -> JSON bytes (RecordJSONResponse encoder)"""
+    pytest.importorskip("fastapi")
+    from utils.serialization import dumps
+
+    now = datetime(2024, 1, 1)
+    rows = [{
+        "id": i,
+        "video_id": f"v{i:07d}",
+        "title": text[:80],
+        "thumbnail_url": f"https://img.example/{i}.jpg",
+        "published_at": now - timedelta(hours=i),
+        "view_count": i * 37,
+        "comment_count": i % 997,
+        "auto_reply_enabled": i % 2 == 0,
+        "next_check_at": None,
+    } for i, text in enumerate(make_corpus("multilingual", size))]
+
+    assert benchmark(dumps, rows).startswith(b"[")
@@ -177,6 +177,76 @@ def test_celery_task_submission():
     print(f"\n✓ Celery task submitted: {result.id}")
 
 
+def _sample_payloads():
+    """Synthetic /api/videos/ page and /api/analytics/ payloads"""
+    from datetime import datetime, timedelta
+    
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    videos = [
+        {
+            'id': i,
+            'video_id': f'vid_{i:06d}',
+            'title': f'Video number {i} - a reasonably long upload title',
+            'thumbnail_url': f'https://i.ytimg.com/vi/vid_{i:06d}/hqdefault.jpg',
+            'published_at': now - timedelta(hours=i),
+            'view_count': i * 137,
+            'comment_count': i % 500,
+            'auto_reply_enabled': i % 3 == 0,
+            'schedule_interval_minutes': 60,
+            'last_checked_at': now - timedelta(minutes=i)
+        }
+        for i in range(200)
+    ]
+    analytics = {
+        'total_replies': 1234,
+        'replies_today': 42,
+        'recent_replies': [
+            {
+                'id': i,
+                'comment_id': f'comment_{i}',
+                'video_id': f'vid_{i % 20:06d}',
+                'comment_text': 'Where can I get the link for this? ' * 3,
+                'comment_author': f'Viewer {i}',
+                'keyword_matched': 'link',
+                'reply_text': 'Thanks for watching! Here it is: https://example.com',
+                'replied_at': now - timedelta(minutes=i),
+                'video_title': f'Video number {i % 20}'
+            }
+            for i in range(50)
+        ]
+    }
+    return videos, analytics
+
+
+def test_response_serialization_performance():
+    """Benchmark default FastAPI JSON encoding vs RecordJSONResponse"""
+    pytest.importorskip("fastapi")
+    pytest.importorskip("orjson")
+    
+    import json
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from utils.serialization import RecordJSONResponse
+    
+    iterations = 200
+    
+    for name, payload in zip(("videos", "analytics"), _sample_payloads()):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            default_body = JSONResponse(jsonable_encoder(payload)).body
+        default_duration = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fast_body = RecordJSONResponse(payload).body
+        fast_duration = time.perf_counter() - start
+        
+        assert json.loads(fast_body) == json.loads(default_body)
+        print(f"\n✓ /api/{name}/ payload ({len(fast_body)} bytes) x{iterations}")
+        print(f"  jsonable_encoder + json: {default_duration*1000:.1f}ms")
+        print(f"  RecordJSONResponse: {fast_duration*1000:.1f}ms ({default_duration/fast_duration:.1f}x faster)")
+
+
 async def measure_throughput(func, iterations: int) -> float:
     """Helper to measure throughput"""
     start = time.time()
@@ -0,0 +1,58 @@
+"""
+Job progress stream tokens
+
+Run:
+    pytest tests/test_progress_token.py -v
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("redis")
+jwt = pytest.importorskip("jwt")
+
+from config import settings
+from services.progress import create_stream_token, verify_stream_token
+
+
+def _session_token(user_id: int) -> str:
+    return jwt.encode(
+        {"user_id": user_id, "exp": datetime.utcnow() + timedelta(hours=1)},
+        settings.SECRET_KEY,
+        algorithm="HS256"
+    )
+
+
+def test_stream_token_opens_only_its_job():
+    token = create_stream_token("job-1", 42)
+    assert verify_stream_token(token, "job-1") == 42
+    assert verify_stream_token(token, "job-2") is None
+
+
+def test_session_token_is_not_a_stream_token():
+    assert verify_stream_token(_session_token(42), "job-1") is None
+
+
+def test_expired_or_forged_stream_token_is_rejected():
+    expired = jwt.encode({
+        "scope": "job_progress",
+        "job_id": "job-1",
+        "owner": 42,
+        "exp": datetime.utcnow() - timedelta(seconds=1),
+    }, settings.SECRET_KEY, algorithm="HS256")
+    forged = jwt.encode({"scope": "job_progress", "job_id": "job-1", "owner": 42}, "wrong-key", algorithm="HS256")
+    assert verify_stream_token(expired, "job-1") is None
+    assert verify_stream_token(forged, "job-1") is None
+
+
+@pytest.mark.asyncio
+async def test_stream_token_is_not_a_session_token():
+    pytest.importorskip("fastapi")
+    pytest.importorskip("asyncpg")
+    from fastapi import HTTPException
+    from middleware.auth_middleware import get_current_user
+
+    with pytest.raises(HTTPException) as excinfo:
+        await get_current_user(f"Bearer {create_stream_token('job-1', 42)}")
+    assert excinfo.value.status_code == 401
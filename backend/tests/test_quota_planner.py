@@ -0,0 +1,136 @@
+"""
+Quota planner: daily pacing and per-tick allocation
+
+Run:
+    pytest tests/test_quota_planner.py -v
+"""
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+
+import services.quota_planner as planner
+from services.quota_planner import allocate, paced_allowance, plan_tick, quota_day_fraction
+
+
+@pytest.fixture(autouse=True)
+def quota_settings(monkeypatch):
+    from config import settings
+
+    for name, value in {
+        "DAILY_QUOTA_LIMIT": 10000,
+        "USER_DAILY_REPLY_LIMIT": 500,
+        "REPLY_COST": 50,
+        "FETCH_COST": 1,
+        "QUOTA_BURST_FRACTION": 0.2,
+        "QUOTA_READ_PAGES_PER_VIDEO": 2,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+
+
+# ============================================
+# PACING
+# ============================================
+
+@pytest.mark.parametrize("now, fraction", [
+    (datetime(2024, 1, 15, 8, 0), 0.0),      # midnight PST
+    (datetime(2024, 7, 15, 7, 0), 0.0),      # midnight PDT
+    (datetime(2024, 7, 15, 19, 0), 0.5),     # noon PDT
+    (datetime(2024, 3, 10, 19, 30), 0.5),    # 23h day: 11.5h in
+    (datetime(2024, 11, 3, 19, 30), 0.5),    # 25h day: 12.5h in
+])
+def test_quota_day_fraction(now, fraction):
+    assert quota_day_fraction(now) == pytest.approx(fraction)
+
+
+@pytest.mark.parametrize("used, now, expected", [
+    (0, datetime(2024, 1, 15, 8, 0), 2000),          # burst only at reset
+    (0, datetime(2024, 7, 15, 7, 0), 2000),          # reset follows DST
+    (0, datetime(2024, 7, 15, 19, 0), 7000),         # burst + half the day
+    (3000, datetime(2024, 7, 15, 19, 0), 4000),      # spent units come off
+    (0, datetime(2024, 1, 16, 7, 59), 10000),        # capped at the limit
+    (12000, datetime(2024, 7, 15, 19, 0), 0),        # never negative
+])
+def test_paced_allowance(used, now, expected):
+    assert paced_allowance(used, now) == expected
+
+
+# ============================================
+# ALLOCATION
+# ============================================
+
+def _video(video_id, user_id, rate=None):
+    return {"video_id": video_id, "user_id": user_id, "comment_rate_per_hour": rate}
+
+
+@pytest.mark.parametrize("videos, spendable, remaining, expected", [
+    # Nothing to spend
+    ([_video("a", 1)], 0, {1: 500}, {"a": (0, 0)}),
+    # No replies left for anyone
+    ([_video("a", 1)], 10000, {1: 0}, {"a": (0, 0)}),
+    # Reads first, writes capped by the user's remaining replies
+    ([_video("a", 1), _video("b", 1)], 10000, {1: 10}, {"a": (2, 250), "b": (2, 250)}),
+    # Too little for a full read allowance - no writes at all
+    ([_video("a", 1), _video("b", 1)], 3, {1: 10}, {"a": (1, 0), "b": (1, 0)}),
+    # Writes follow each video's comment rate
+    ([_video("a", 1, 0), _video("b", 1, 3)], 10000, {1: 10}, {"a": (2, 100), "b": (2, 400)}),
+    # A user at their cap gets nothing; the other user's share is unaffected
+    ([_video("a", 1), _video("b", 2)], 1000, {1: 500, 2: 0}, {"a": (2, 998), "b": (0, 0)}),
+    # Equal users split the quota evenly
+    ([_video("a", 1), _video("b", 2)], 1000, {1: 500, 2: 500}, {"a": (2, 498), "b": (2, 498)}),
+])
+def test_allocate(videos, spendable, remaining, expected):
+    budgets = allocate(videos, spendable, remaining)
+    assert {
+        video_id: (budget.read_units, budget.write_units)
+        for video_id, budget in budgets.items()
+    } == expected
+
+
+def test_allocate_never_exceeds_spendable():
+    videos = [_video(f"v{i}", i % 7, i % 5) for i in range(50)]
+    remaining = {user_id: 100 + 50 * user_id for user_id in range(7)}
+    budgets = allocate(videos, 1234, remaining)
+    assert sum(b.read_units + b.write_units for b in budgets.values()) <= 1234
+
+
+# ============================================
+# TICK
+# ============================================
+
+class _Quota:
+    def __init__(self, used, remaining):
+        self.used = used
+        self.remaining = remaining
+
+    async def get_current_usage(self):
+        return self.used
+
+    async def get_user_remaining_replies(self, user_id):
+        if self.remaining[user_id] is None:
+            raise RuntimeError("lookup failed")
+        return self.remaining[user_id]
+
+
+@pytest.mark.asyncio
+async def test_plan_tick_subtracts_outstanding_budgets(monkeypatch):
+    captured = {}
+
+    async def outstanding_budgets():
+        return 1500, {1: 8}
+
+    def fake_allocate(videos, spendable, remaining_replies):
+        captured.update(spendable=spendable, remaining=remaining_replies)
+        return {}
+
+    monkeypatch.setattr(planner, "outstanding_budgets", outstanding_budgets)
+    monkeypatch.setattr(planner, "allocate", fake_allocate)
+    monkeypatch.setattr(planner, "paced_allowance", lambda used: 5000 - used)
+
+    await plan_tick([_video("a", 1), _video("b", 2), _video("c", 3)], _Quota(1000, {1: 10, 2: 5, 3: None}))
+
+    # Units and replies already handed to running jobs aren't handed out again
+    assert captured["spendable"] == 4000 - 1500
+    # A failed lookup leaves that user out of this tick
+    assert captured["remaining"] == {1: 2, 2: 5, 3: 0}
@@ -0,0 +1,172 @@
+"""
+Reply outbox state transitions (needs PostgreSQL)
+
+Run:
+    DATABASE_URL=postgresql://localhost/reply_test pytest tests/test_reply_outbox.py -v
+"""
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("asyncpg")
+pytest.importorskip("pydantic_settings")
+
+
+@asynccontextmanager
+async def outbox_user(comments: int = 4):
+    """A throwaway user with `comments` queued reply intents"""
+    from config import settings
+
+    if not settings.USE_POSTGRES:
+        pytest.skip("PostgreSQL not configured")
+
+    import database_pg as db
+
+    await db.init_db()
+    run_id = uuid.uuid4().hex[:8]
+    user = await db.create_or_update_user(
+        email=f"outbox-{run_id}@example.com",
+        google_id=f"outbox-{run_id}",
+        channel_id=f"UCoutbox{run_id}",
+        channel_name="Outbox test",
+        channel_thumbnail="",
+        access_token="token",
+        refresh_token="refresh",
+        token_expiry=datetime.utcnow() + timedelta(hours=1)
+    )
+    comment_ids = [f"outbox-{run_id}-c{i}" for i in range(comments)]
+    await db.enqueue_reply_intents([{
+        "comment_id": comment_id,
+        "video_id": f"outbox-{run_id}-v",
+        "user_id": user["id"],
+        "reply_text": "Thanks!",
+    } for comment_id in comment_ids])
+    try:
+        yield user["id"], comment_ids
+    finally:
+        async with db.acquire_connection() as conn:
+            await conn.execute("DELETE FROM users WHERE id = $1", user["id"])
+        await db.close_db()
+
+
+async def _status(outbox_id: int) -> str:
+    import database_pg as db
+
+    async with db.acquire_connection() as conn:
+        return await conn.fetchval("SELECT status FROM reply_outbox WHERE id = $1", outbox_id)
+
+
+@pytest.mark.asyncio
+async def test_claim_skips_rows_locked_by_another_worker():
+    import database_pg as db
+
+    async with outbox_user(comments=4) as (user_id, comment_ids):
+        async with db.get_pool().acquire() as other:
+            async with other.transaction():
+                # Another worker is in the middle of claiming the first two
+                await other.execute("""
+                    SELECT id FROM reply_outbox
+                    WHERE comment_id = ANY($1) FOR UPDATE
+                """, comment_ids[:2])
+
+                claimed = await db.claim_reply_intents(user_id, limit=10)
+                assert sorted(r["comment_id"] for r in claimed) == sorted(comment_ids[2:])
+
+        # Nothing is handed out twice
+        assert await db.claim_reply_intents(user_id, limit=10) != []
+        assert await db.claim_reply_intents(user_id, limit=10) == []
+
+
+@pytest.mark.asyncio
+async def test_claim_by_comment_ids_leaves_older_rows_pending():
+    import database_pg as db
+
+    async with outbox_user(comments=4) as (user_id, comment_ids):
+        # Rows queued earlier are not picked up by a batch claiming its own intents
+        claimed = await db.claim_reply_intents(user_id, limit=2, comment_ids=comment_ids[2:])
+        assert sorted(r["comment_id"] for r in claimed) == sorted(comment_ids[2:])
+
+        leftover = await db.claim_reply_intents(user_id, limit=10)
+        assert sorted(r["comment_id"] for r in leftover) == sorted(comment_ids[:2])
+
+
+@pytest.mark.asyncio
+async def test_stale_claim_is_reclaimed_after_timeout():
+    import database_pg as db
+    from config import settings
+
+    async with outbox_user(comments=1) as (user_id, _):
+        (intent,) = await db.claim_reply_intents(user_id)
+        assert intent["prev_status"] == "pending"
+
+        # A live claim is not handed out again
+        assert await db.claim_reply_intents(user_id) == []
+
+        async with db.acquire_connection() as conn:
+            await conn.execute(
+                "UPDATE reply_outbox SET claimed_at = NOW() - ($2 * interval '1 second') WHERE id = $1",
+                intent["id"], settings.OUTBOX_CLAIM_TIMEOUT_SECONDS + 5
+            )
+
+        (reclaimed,) = await db.claim_reply_intents(user_id)
+        assert reclaimed["id"] == intent["id"]
+        # The deliverer verifies 'sending' rows against YouTube before re-posting
+        assert reclaimed["prev_status"] == "sending"
+        assert reclaimed["attempts"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_at_max_attempts():
+    import database_pg as db
+    from config import settings
+
+    async with outbox_user(comments=1) as (user_id, _):
+        for attempt in range(1, settings.OUTBOX_MAX_ATTEMPTS + 1):
+            (intent,) = await db.claim_reply_intents(user_id)
+            assert intent["attempts"] == attempt
+            await db.fail_reply_intent(intent["id"], "boom")
+            expected = "failed" if attempt == settings.OUTBOX_MAX_ATTEMPTS else "pending"
+            assert await _status(intent["id"]) == expected
+
+        assert await db.claim_reply_intents(user_id) == []
+
+
+@pytest.mark.asyncio
+async def test_release_does_not_charge_an_attempt():
+    import database_pg as db
+
+    async with outbox_user(comments=1) as (user_id, _):
+        (intent,) = await db.claim_reply_intents(user_id)
+        await db.release_reply_intents([intent["id"]])
+        assert await _status(intent["id"]) == "pending"
+
+        (again,) = await db.claim_reply_intents(user_id)
+        assert again["attempts"] == 1
+        assert again["prev_status"] == "pending"
+
+
+@pytest.mark.asyncio
+async def test_dedupe_covers_queued_and_sent_replies():
+    import database_pg as db
+
+    async with outbox_user(comments=2) as (user_id, comment_ids):
+        unknown = f"{comment_ids[0]}-unknown"
+
+        # Still in the outbox - counts as replied so it is never queued twice
+        assert await db.has_replied_batch(comment_ids + [unknown]) == set(comment_ids)
+
+        claimed = await db.claim_reply_intents(user_id)
+        await db.complete_reply_intent(claimed[0]["id"], "reply-1")
+        assert await _status(claimed[0]["id"]) == "sent"
+        assert await db.has_replied_batch(comment_ids + [unknown]) == set(comment_ids)
+
+        # Re-queuing a delivered comment is a no-op
+        await db.enqueue_reply_intents([{
+            "comment_id": claimed[0]["comment_id"],
+            "video_id": claimed[0]["video_id"],
+            "user_id": user_id,
+            "reply_text": "Again",
+        }])
+        assert await _status(claimed[0]["id"]) == "sent"
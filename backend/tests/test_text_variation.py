@@ -0,0 +1,61 @@
+"""
+Reply templates: placeholder rendering and fallbacks
+
+Run:
+    pytest tests/test_text_variation.py -v
+"""
+import random
+
+import pytest
+
+from utils.text_variation import CompiledTemplate, TemplateSet, TextVariation, compile_template
+
+
+@pytest.mark.parametrize("template, variables, expected", [
+    # Supplied values
+    ("Thanks {name}!", {"name": "Ann"}, "Thanks Ann!"),
+    ("{keyword}: see {link}", {"keyword": "price", "link": "https://x.example"}, "price: see https://x.example"),
+    # Missing, empty and None all fall back
+    ("Thanks {name}!", {}, "Thanks there!"),
+    ("Thanks {name}!", {"name": ""}, "Thanks there!"),
+    ("Thanks {name}!", {"name": None}, "Thanks there!"),
+    ("Glad you liked {video_title}", {}, "Glad you liked this video"),
+    ("Check {link}", {}, "Check the link in my bio"),
+    ("Asking about {keyword}?", {}, "Asking about that?"),
+    # Repeated and adjacent placeholders
+    ("{name} {name}", {"name": "Ann"}, "Ann Ann"),
+    ("{name}{keyword}", {}, "therethat"),
+    # Anything that isn't a supported placeholder stays literal
+    ("Hi {foo} {name}", {"name": "Ann", "foo": "x"}, "Hi {foo} Ann"),
+    ("Hi { name }", {"name": "Ann"}, "Hi { name }"),
+    ("Price is {}", {}, "Price is {}"),
+    ("No placeholders 🙏", {"name": "Ann"}, "No placeholders 🙏"),
+    ("", {}, ""),
+])
+def test_render(template, variables, expected):
+    assert CompiledTemplate(template).render(variables) == expected
+
+
+def test_compile_template_is_cached():
+    assert compile_template("Thanks {name}!") is compile_template("Thanks {name}!")
+
+
+def test_generate_reply_accepts_source_or_compiled():
+    random.seed(0)
+    for template in ("Thanks {name}!", compile_template("Thanks {name}!")):
+        # _vary may append an emoji closing, never change the rendered text
+        assert TextVariation.generate_reply(template, {}).startswith("Thanks there!")
+
+
+def test_generate_replies_one_per_variables():
+    random.seed(0)
+    templates = TemplateSet(["Hi {name}", "Hey {name}"])
+    replies = TextVariation.generate_replies(templates, [{"name": f"viewer{i}"} for i in range(50)])
+    assert len(replies) == 50
+    assert all(r.split()[1].startswith(f"viewer{i}") for i, r in enumerate(replies))
+    assert {r.split()[0] for r in replies} == {"Hi", "Hey"}
+
+
+def test_empty_template_set():
+    assert not TemplateSet([])
+    assert len(TemplateSet(["a", "b"])) == 2
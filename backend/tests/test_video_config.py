@@ -0,0 +1,85 @@
+"""
+Keyword matching and compiled per-video config
+
+Run:
+    pytest tests/test_video_config.py -v
+"""
+from datetime import datetime
+
+import pytest
+
+from services.video_config import CompiledVideoConfig, KeywordMatcher, VideoConfigCache
+
+
+@pytest.mark.parametrize("keywords, text, expected", [
+    # Nothing configured
+    ([], "what is the price?", None),
+    ([""], "what is the price?", None),
+    # Case-insensitive, reporting the keyword as configured
+    (["Price"], "what's the PRICE?", "Price"),
+    (["price"], "great video", None),
+    # First keyword in list order wins, not first in the text
+    (["link", "price"], "price and link please", "link"),
+    (["price", "link"], "price and link please", "price"),
+    (["pricey", "price"], "is it pricey", "pricey"),
+    (["pricey", "price"], "the price", "price"),
+    # Substring match, like the plain `in` loop it replaced
+    (["link"], "linking back here", "link"),
+    # Regex metacharacters are literal
+    (["c++"], "I love C++ tutorials", "c++"),
+    (["a.b"], "axb", None),
+    (["(price)"], "the (price) is?", "(price)"),
+    # Full Unicode case folding
+    (["straße"], "WHERE IS THE STRASSE", "straße"),
+    (["цена"], "Какая ЦЕНА?", "цена"),
+    (["链接"], "请问链接在哪里", "链接"),
+    (["السعر"], "كم السعر؟", "السعر"),
+])
+def test_keyword_matcher(keywords, text, expected):
+    assert KeywordMatcher(keywords).match(text) == expected
+
+
+@pytest.mark.parametrize("keywords, truthy", [
+    ([], False),
+    (["", ""], False),
+    (["price"], True),
+])
+def test_keyword_matcher_truthiness(keywords, truthy):
+    assert bool(KeywordMatcher(keywords)) is truthy
+
+
+def _row(**overrides):
+    row = {
+        "video_id": "v1",
+        "title": "My video",
+        "keywords": '["price"]',
+        "reply_templates": '["Thanks {name}!"]',
+        "updated_at": datetime(2024, 1, 1),
+    }
+    row.update(overrides)
+    return row
+
+
+@pytest.mark.parametrize("row, active", [
+    (_row(), True),
+    (_row(keywords="[]"), False),
+    (_row(reply_templates=None), False),
+    (_row(keywords=["price"], reply_templates=["Hi"]), True),
+])
+def test_compiled_config_active(row, active):
+    assert CompiledVideoConfig(row).active is active
+
+
+def test_config_cache_recompiles_on_new_version():
+    cache = VideoConfigCache(max_entries=2)
+    first = cache.get(_row())
+    assert cache.get(_row()) is first
+
+    updated = cache.get(_row(keywords='["link"]', updated_at=datetime(2024, 1, 2)))
+    assert updated is not first
+    assert updated.matcher.match("link?") == "link"
+
+    # Oldest entry is evicted past max_entries
+    cache.get(_row(video_id="v2"))
+    cache.get(_row(video_id="v3"))
+    assert "v1" not in cache._entries
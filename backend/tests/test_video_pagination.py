@@ -0,0 +1,80 @@
+"""
+Video list keyset pagination (needs PostgreSQL)
+
+Run:
+    DATABASE_URL=postgresql://localhost/reply_test pytest tests/test_video_pagination.py -v
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("asyncpg")
+pytest.importorskip("fastapi")
+pytest.importorskip("pydantic_settings")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("limit", [1, 3, 4, 50])
+async def test_cursor_pages_through_null_published_at(limit):
+    from config import settings
+
+    if not settings.USE_POSTGRES:
+        pytest.skip("PostgreSQL not configured")
+
+    import database_pg as db
+    from routers.videos import _decode_cursor, _encode_cursor
+
+    await db.init_db()
+    run_id = uuid.uuid4().hex[:8]
+    user = await db.create_or_update_user(
+        email=f"paging-{run_id}@example.com",
+        google_id=f"paging-{run_id}",
+        channel_id=f"UCpaging{run_id}",
+        channel_name="Paging test",
+        channel_thumbnail="",
+        access_token="token",
+        refresh_token="refresh",
+        token_expiry=datetime.utcnow() + timedelta(hours=1)
+    )
+    now = datetime(2024, 1, 1)
+    # Dated videos (two sharing a timestamp) interleaved with undated ones
+    await db.upsert_videos_batch(user["id"], [{
+        "video_id": f"paging-{run_id}-v{i}",
+        "title": f"Video {i}",
+        "thumbnail_url": "",
+        "published_at": None if i % 3 == 0 else now - timedelta(hours=i // 2),
+    } for i in range(10)])
+
+    try:
+        seen = []
+        cursor = None
+        for _ in range(20):
+            after = _decode_cursor(cursor) if cursor else None
+            rows = await db.get_user_videos_page(user["id"], limit=limit + 1, after=after)
+            page = rows[:limit]
+            seen.extend(r["video_id"] for r in page)
+            if len(rows) <= limit:
+                break
+            cursor = _encode_cursor(page[-1])
+        else:
+            pytest.fail("pagination did not terminate")
+
+        everything = await db.get_user_videos_page(user["id"], limit=100)
+        assert seen == [r["video_id"] for r in everything]
+        assert len(seen) == 10
+        # Undated videos come last
+        assert all(r["published_at"] is None for r in everything[-4:])
+    finally:
+        async with db.acquire_connection() as conn:
+            await conn.execute("DELETE FROM users WHERE id = $1", user["id"])
+        await db.close_db()
+
+
+def test_cursor_round_trip():
+    pytest.importorskip("jwt")
+    from routers.videos import _decode_cursor, _encode_cursor
+
+    dated = datetime(2024, 1, 1, 12, 30)
+    assert _decode_cursor(_encode_cursor({"published_at": dated, "id": 7})) == (dated, 7)
+    assert _decode_cursor(_encode_cursor({"published_at": None, "id": 7})) == (None, 7)
@@ -0,0 +1,88 @@
+"""
+YouTube client against the fake API (tests/fake_youtube.py)
+
+Run:
+    pytest tests/test_youtube_client.py -v
+"""
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("pydantic_settings")
+
+from fake_youtube import FakeYouTube, FakeYouTubeServer
+
+
+async def _client(server: FakeYouTubeServer, access_token: str, refresh_token: str = None):
+    from services.youtube_client import AsyncYouTubeClient
+
+    client = AsyncYouTubeClient(access_token, refresh_token, user_id=1)
+    client.base_url = server.base_url
+    client.token_url = server.token_url
+    return client
+
+
+@pytest.mark.asyncio
+async def test_comment_pagination_newest_first():
+    fake = FakeYouTube(seed=1)
+    fake.add_channel("UCtest", videos=1, comments_per_video=250)
+
+    async with FakeYouTubeServer(fake) as server:
+        client = await _client(server, "token-UCtest")
+        comments = await client.get_video_comments("UCtest-v0000", max_results=250)
+
+    assert len(comments) == 250
+    assert fake.calls["commentThreads"] == 3
+    assert fake.quota_used == 3
+    assert [c.id for c in comments[:2]] == ["UCtest-v0000-c000000249", "UCtest-v0000-c000000248"]
+
+
+@pytest.mark.asyncio
+async def test_expired_token_is_refreshed():
+    fake = FakeYouTube()
+    fake.add_channel("UCtest", videos=2)
+    fake.expire_token("token-UCtest")
+
+    async with FakeYouTubeServer(fake) as server:
+        client = await _client(server, "token-UCtest", "refresh-UCtest")
+        channel = await client.get_channel_info()
+
+    assert channel is not None
+    assert fake.calls["token"] == 1
+    assert client.access_token != "token-UCtest"
+
+
+@pytest.mark.asyncio
+async def test_quota_exhaustion_and_injected_errors():
+    fake = FakeYouTube(daily_quota=60)
+    fake.add_channel("UCtest", comments_per_video=10)
+
+    async with FakeYouTubeServer(fake) as server:
+        client = await _client(server, "token-UCtest")
+        reply = await client.post_comment_reply("UCtest-v0000-c000000000", "Thanks!")
+        assert reply["snippet"]["parentId"] == "UCtest-v0000-c000000000"
+
+        # 50 of 60 units spent - the next insert is refused
+        with pytest.raises(Exception, match="quotaExceeded"):
+            await client.post_comment_reply("UCtest-v0000-c000000001", "Thanks!")
+
+        fake.inject_error("commentThreads", 429)
+        assert await client.get_video_comments("UCtest-v0000") == []
+
+    assert fake.replies["UCtest-v0000-c000000000"][0]["snippet"]["textOriginal"] == "Thanks!"
+
+
+@pytest.mark.asyncio
+async def test_channel_videos_delta_and_backfill():
+    fake = FakeYouTube()
+    fake.add_channel("UCtest", videos=120, comments_per_video=1)
+    # Synced back when only the newest 100 uploads were kept
+    known = {f"UCtest-v{i:04d}" for i in range(100)}
+
+    async with FakeYouTubeServer(fake) as server:
+        client = await _client(server, "token-UCtest")
+        delta = await client.get_channel_videos("UCtest", max_results=500, stop_at=known)
+        backfill = await client.get_channel_videos("UCtest", max_results=500, skip=known)
+
+    assert delta == []
+    assert [v['contentDetails']['videoId'] for v in backfill] == [f"UCtest-v{i:04d}" for i in range(100, 120)]
+    assert all('statistics' in v for v in backfill)
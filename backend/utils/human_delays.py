@@ -1,32 +1,37 @@
 import asyncio
 import random
 
+from config import settings
+
+
+async def _pause(delay: float) -> float:
+    """Sleep for `delay` scaled by HUMAN_DELAY_SCALE; returns the time slept"""
+    delay *= settings.HUMAN_DELAY_SCALE
+    if delay > 0:
+        await asyncio.sleep(delay)
+    return delay
+
+
 class HumanDelayGenerator:
     """Generate realistic human-like delays"""
-    
+
     @staticmethod
     async def before_reply() -> float:
         """Delay before posting reply (reading/thinking time)"""
-        delay = random.uniform(0.8, 3.5)  # 800ms - 3.5s
-        await asyncio.sleep(delay)
-        return delay
-    
+        return await _pause(random.uniform(0.8, 3.5))  # 800ms - 3.5s
+
     @staticmethod
     async def after_reply() -> float:
         """Delay after posting reply (cool down)"""
-        delay = random.uniform(1.0, 2.5)  # 1s - 2.5s
-        await asyncio.sleep(delay)
-        return delay
-    
+        return await _pause(random.uniform(1.0, 2.5))  # 1s - 2.5s
+
     @staticmethod
     async def between_batches(batch_size: int) -> float:
         """Delay between batches (longer break)"""
         base_delay = 120  # 2 minutes
         variance = random.uniform(-30, 60)  # ±30-60 seconds
-        delay = base_delay + variance
-        await asyncio.sleep(delay)
-        return delay
-    
+        return await _pause(base_delay + variance)
+
     @staticmethod
     def get_batch_size() -> int:
         """Random batch size to avoid patterns"""
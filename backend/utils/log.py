@@ -0,0 +1,222 @@
+"""
+Structured Logging
+
+Replaces print() on the hot paths with standard `logging` records:
+- Records are queued by a QueueHandler and written to stdout by a
+  background QueueListener, so callers never block on stdout
+- JSON lines (LOG_FORMAT=json) carry the user/video/task ids bound with
+  log_context(), plus anything passed via `extra=`
+- LOG_LEVELS sets per-module levels ("services.youtube_client=WARNING,tasks=DEBUG")
+- Repeats of the same message are rate-limited per window; the first
+  record after the window reports how many were dropped
+
+Usage:
+    logger = logging.getLogger(__name__)
+    with log_context(user_id=7, video_id="abc"):
+        logger.info("Fetched %d comments", n)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+# Correlation ids for the current task/request - contextvars follow asyncio
+# tasks, so concurrent jobs in one event loop keep their own ids
+_log_context: ContextVar[Dict] = ContextVar("log_context", default={})
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "context"}
+
+
+@contextmanager
+def log_context(**ids) -> Iterator[None]:
+    """Attach ids (user_id, video_id, task_id, ...) to records logged in the block"""
+    token = _log_context.set({**_log_context.get(), **{k: v for k, v in ids.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def bind_context(**ids):
+    """Attach ids for the rest of the current context (e.g. a Celery task)"""
+    _log_context.set({**_log_context.get(), **{k: v for k, v in ids.items() if v is not None}})
+
+
+def clear_context():
+    _log_context.set({})
+
+
+def get_context() -> Dict:
+    return dict(_log_context.get())
+
+
+class ContextFilter(logging.Filter):
+    """Copy the correlation ids onto the record while still on the caller's thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _log_context.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Let through `burst` copies of a message per `window` seconds
+
+    Messages are keyed by logger and unformatted template, so "Error
+    fetching comments: %s" is one key whatever the arguments. Warnings
+    and above are never dropped.
+    """
+
+    def __init__(self, burst: int = 20, window: float = 60.0, max_level: int = logging.INFO):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.max_level = max_level
+        self._counts: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level or self.burst <= 0:
+            return True
+
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                suppressed = entry[2] if entry else 0
+                self._counts[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if entry[1] < self.burst:
+                entry[1] += 1
+                return True
+            entry[2] += 1
+            return False
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread
+
+    The stock prepare() renders the message on the caller's thread; records
+    never leave the process here, so they can be queued as they are.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        payload.update(getattr(record, "context", None) or {})
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development, ids appended"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        context = getattr(record, "context", None)
+        if context:
+            line += " [" + " ".join(f"{k}={v}" for k, v in context.items()) + "]"
+        if getattr(record, "suppressed", None):
+            line += f" ({record.suppressed} similar suppressed)"
+        return line
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """"tasks=DEBUG,services.youtube_client=WARNING" -> {logger: level}"""
+    levels = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        name, level = part.split("=", 1)
+        levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    fmt: Optional[str] = None,
+    levels: Optional[str] = None
+):
+    """Install the queue-backed root handler (idempotent)
+
+    Defaults come from settings: LOG_LEVEL, LOG_FORMAT, LOG_LEVELS,
+    LOG_SAMPLE_BURST and LOG_SAMPLE_WINDOW_SECONDS.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    from config import settings
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JSONFormatter() if (fmt or settings.LOG_FORMAT) == "json" else TextFormatter())
+
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_BURST, settings.LOG_SAMPLE_WINDOW_SECONDS))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel((level or settings.LOG_LEVEL).upper())
+
+    for name, module_level in parse_levels(levels if levels is not None else settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    # The writer thread doesn't survive fork (Celery prefork children)
+    os.register_at_fork(after_in_child=_restart_listener)
+
+
+def _restart_listener():
+    global _listener
+    if _listener is not None:
+        _listener = logging.handlers.QueueListener(
+            _listener.queue, *_listener.handlers, respect_handler_level=True
+        )
+        _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,49 @@
+"""
+Fast JSON encoding for API responses and cached payloads
+
+orjson handles datetimes, dates and UUIDs natively; asyncpg Records and
+Decimals are converted on the fly, so query results can be returned
+without first copying every row into a dict.
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+try:
+    from asyncpg import Record
+except ImportError:  # Encoder still usable without the Postgres driver
+    Record = None
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    if Record is not None and isinstance(value, Record):
+        return dict(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize to JSON bytes (Records, datetimes, Decimals included)"""
+    return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+
+def loads(data) -> Any:
+    return orjson.loads(data)
+
+
+class RecordJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also encodes asyncpg Records
+
+    Returning an instance directly from a route skips FastAPI's
+    jsonable_encoder pass as well.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,8 +1,92 @@
 import random
-from typing import Dict
+import re
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple, Union
+
+# {name}-style placeholders; anything else in braces is left as literal text
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+_TRAILING_EMOJI = tuple('😊🙏❤️🎉💯🔥🚀🎯📎✨🔗💡📌🙌')
+
+
+class CompiledTemplate:
+    """Reply template parsed once into literal and placeholder segments
+
+    `segments` alternates literal text and placeholder names; `slots` holds
+    the indices of the placeholders so rendering only fills those in.
+    """
+
+    # Placeholders substituted at render time, with their fallback text
+    SUPPORTED = {
+        "name": "there",
+        "video_title": "this video",
+        "link": "the link in my bio",
+        "keyword": "that",
+    }
+
+    __slots__ = ("source", "segments", "slots")
+
+    def __init__(self, source: str):
+        self.source = source
+        segments: List[str] = []
+        slots: List[Tuple[int, str]] = []
+
+        pos = 0
+        for match in _PLACEHOLDER_RE.finditer(source):
+            name = match.group(1)
+            if name not in self.SUPPORTED:
+                continue
+            segments.append(source[pos:match.start()])
+            slots.append((len(segments), name))
+            segments.append("")
+            pos = match.end()
+        segments.append(source[pos:])
+
+        self.segments = segments
+        self.slots = slots
+
+    def render(self, variables: Dict[str, str]) -> str:
+        if not self.slots:
+            return self.source
+        parts = list(self.segments)
+        for index, name in self.slots:
+            parts[index] = variables.get(name) or self.SUPPORTED[name]
+        return "".join(parts)
+
+    def __repr__(self):
+        return f"CompiledTemplate({self.source!r})"
+
+
+class TemplateSet:
+    """A video's compiled templates, drawn uniformly at random"""
+
+    __slots__ = ("templates",)
+
+    def __init__(self, templates: Sequence[str]):
+        self.templates = [compile_template(t) for t in templates]
+
+    def __bool__(self):
+        return bool(self.templates)
+
+    def __len__(self):
+        return len(self.templates)
+
+    def choose(self) -> CompiledTemplate:
+        return random.choice(self.templates)
+
+    def choose_many(self, k: int) -> List[CompiledTemplate]:
+        """Draw `k` templates in one call (with replacement)"""
+        return random.choices(self.templates, k=k)
+
+
+@lru_cache(maxsize=1024)
+def compile_template(template: str) -> CompiledTemplate:
+    """Parse a template once; repeat calls return the cached parse"""
+    return CompiledTemplate(template)
+
 
 class TextVariation:
-    """Generate varied reply text with link placeholder support"""
+    """Generate varied reply text with {name}, {video_title}, {link} and {keyword} support"""
     
     # Closings to occasionally add variation
     CLOSINGS = [
@@ -17,24 +101,35 @@ class TextVariation:
     @classmethod
     def generate_reply(
         cls,
-        template: str,
+        template: Union[str, CompiledTemplate],
         variables: Dict[str, str]
     ) -> str:
         """Generate a reply from template with variable substitution"""
         
-        reply = template
-        
-        # Replace {link} placeholder with actual link if provided
-        if '{link}' in reply and variables.get('link'):
-            reply = reply.replace('{link}', variables['link'])
-        elif '{link}' in reply:
-            # If no link provided, remove the placeholder nicely
-            reply = reply.replace('{link}', 'the link in my bio')
+        if isinstance(template, str):
+            template = compile_template(template)
         
+        return cls._vary(template.render(variables))
+    
+    @classmethod
+    def generate_replies(
+        cls,
+        templates: TemplateSet,
+        variables_list: List[Dict[str, str]]
+    ) -> List[str]:
+        """Render one reply per variables dict, drawing all templates up front"""
+        chosen = templates.choose_many(len(variables_list))
+        return [
+            cls._vary(template.render(variables))
+            for template, variables in zip(chosen, variables_list)
+        ]
+    
+    @classmethod
+    def _vary(cls, reply: str) -> str:
         # Small chance of adding an extra emoji
         if random.random() > 0.7:
             closing = random.choice(cls.CLOSINGS)
-            if closing and not reply.rstrip().endswith(tuple('😊🙏❤️🎉💯🔥🚀🎯📎✨🔗💡📌🙌')):
+            if closing and not reply.rstrip().endswith(_TRAILING_EMOJI):
                 reply = reply.rstrip() + closing
         
         return reply.strip()
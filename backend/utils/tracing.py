@@ -0,0 +1,305 @@
+"""
+Lightweight Tracing
+
+Spans from the scheduler tick down to each posted reply, so a slow run
+shows whether time went to the DB, Redis, comment pages, token refresh
+or human delays:
+- TRACING_EXPORTER=console|file writes finished spans as JSON lines
+  (OpenTelemetry span fields: trace_id, span_id, parent_id, start/end
+  time, attributes, status) from a background thread
+- TRACING_EXPORTER=otel hands spans to the OpenTelemetry API instead, if
+  installed - configure the SDK/exporter the usual OTel way
+- Trace context crosses Celery tasks as a W3C `traceparent` header
+- Disabled (the default) every span is a shared no-op
+
+Usage:
+    with span("youtube.commentThreads", video_id=video_id) as s:
+        ...
+        s.set_attribute("http.status_code", 200)
+
+    @traced("db.has_replied_batch")
+    async def has_replied_batch(...): ...
+"""
+import atexit
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry import propagate as otel_propagate
+except ImportError:  # Built-in exporters need nothing extra
+    otel_trace = None
+    otel_propagate = None
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """A finished-on-exit span (built-in exporters)"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status", "events")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.status = "UNSET"
+        self.events = []
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict):
+        self.attributes.update(attributes)
+
+    def record_exception(self, exc: BaseException):
+        self.status = "ERROR"
+        self.events.append({
+            "name": "exception",
+            "time_ns": time.time_ns(),
+            "attributes": {"exception.type": type(exc).__name__, "exception.message": str(exc)},
+        })
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "context": {"trace_id": self.trace_id, "span_id": self.span_id},
+            "parent_id": self.parent_id,
+            "start_time_ns": self.start_ns,
+            "end_time_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6 if self.end_ns else None,
+            "attributes": self.attributes,
+            "status": self.status,
+            "events": self.events,
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def record_exception(self, exc):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _RemoteParent:
+    """Span context received from another process (traceparent header)"""
+
+    __slots__ = ("trace_id", "span_id")
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+# Current span, _RemoteParent, or _NOOP when this trace wasn't sampled
+_current: ContextVar[Any] = ContextVar("current_span", default=None)
+
+
+class _SpanWriter:
+    """Writes finished spans as JSON lines from a daemon thread"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._queue: "queue.SimpleQueue[Optional[Dict]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="span-writer", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        self._queue.put(span.to_dict())
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self.stream.write(json.dumps(item, default=str) + "\n")
+                if self._queue.empty():
+                    self.stream.flush()
+            except Exception:
+                pass  # Tracing must never take the worker down
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=2)
+
+
+class Tracer:
+    def __init__(self):
+        self.mode = None  # None (off), "builtin" or "otel"
+        self.sample_rate = 1.0
+        self._writer: Optional[_SpanWriter] = None
+        self._otel = None
+        self._pid = None
+
+    def configure(self, exporter: str = "", path: str = "traces.jsonl", sample_rate: float = 1.0):
+        self.sample_rate = sample_rate
+        self._pid = os.getpid()
+        if exporter == "otel":
+            if otel_trace is None:
+                logger.warning("TRACING_EXPORTER=otel but opentelemetry is not installed - tracing disabled")
+                self.mode = None
+                return
+            self._otel = otel_trace.get_tracer("reply")
+            self.mode = "otel"
+        elif exporter in ("console", "file"):
+            stream = sys.stdout if exporter == "console" else open(path, "a", buffering=1)
+            self._writer = _SpanWriter(stream)
+            atexit.register(self._writer.shutdown)
+            self.mode = "builtin"
+        else:
+            self.mode = None
+
+    def _ensure_writer(self):
+        # Writer thread doesn't survive fork (Celery prefork children)
+        if self._pid != os.getpid() and self._writer is not None:
+            self._pid = os.getpid()
+            self._writer = _SpanWriter(self._writer.stream)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Any]:
+        if self.mode is None:
+            yield _NOOP
+            return
+
+        if self.mode == "otel":
+            with self._otel.start_as_current_span(name, attributes=_clean(attributes)) as otel_span:
+                yield otel_span
+            return
+
+        parent = _current.get()
+        if parent is _NOOP:
+            yield _NOOP
+            return
+        if parent is None:
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                token = _current.set(_NOOP)
+                try:
+                    yield _NOOP
+                finally:
+                    _current.reset(token)
+                return
+            trace_id, parent_id = os.urandom(16).hex(), None
+        else:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+
+        current = Span(name, trace_id, parent_id, _clean(attributes))
+        token = _current.set(current)
+        try:
+            yield current
+        except BaseException as exc:
+            current.record_exception(exc)
+            raise
+        finally:
+            _current.reset(token)
+            current.end_ns = time.time_ns()
+            if current.status == "UNSET":
+                current.status = "OK"
+            self._ensure_writer()
+            self._writer.export(current)
+
+
+def _clean(attributes: Dict) -> Dict:
+    """Drop None values - OTel attributes can't be null"""
+    return {k: v for k, v in attributes.items() if v is not None}
+
+
+tracer = Tracer()
+
+
+def configure_tracing():
+    """Set up the exporter from settings (TRACING_EXPORTER, TRACING_FILE, TRACING_SAMPLE_RATE)"""
+    from config import settings
+    tracer.configure(settings.TRACING_EXPORTER, settings.TRACING_FILE, settings.TRACING_SAMPLE_RATE)
+
+
+def span(name: str, **attributes):
+    """Context manager for a child of the current span (or a new trace)"""
+    return tracer.span(name, **attributes)
+
+
+def traced(name: str):
+    """Decorator: run an async function inside a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if tracer.mode is None:
+                return await func(*args, **kwargs)
+            with tracer.span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    """The active span (a no-op object when there is none)"""
+    if tracer.mode == "otel":
+        return otel_trace.get_current_span()
+    current = _current.get()
+    return current if isinstance(current, Span) else _NOOP
+
+
+def inject() -> Optional[str]:
+    """traceparent for the current span, to send along with a task"""
+    if tracer.mode == "otel":
+        carrier: Dict[str, str] = {}
+        otel_propagate.inject(carrier)
+        return carrier.get("traceparent")
+    current = _current.get()
+    if current is None or current is _NOOP:
+        return None
+    return current.traceparent()
+
+
+def activate(traceparent: Optional[str]):
+    """Continue the trace a task was published from; returns a token for deactivate()"""
+    if not traceparent or tracer.mode is None:
+        return None
+    if tracer.mode == "otel":
+        from opentelemetry import context as otel_context
+        return ("otel", otel_context.attach(otel_propagate.extract({"traceparent": traceparent})))
+    try:
+        _, trace_id, span_id, _ = traceparent.split("-")
+    except ValueError:
+        return None
+    return ("builtin", _current.set(_RemoteParent(trace_id, span_id)))
+
+
+def deactivate(token):
+    if token is None:
+        return
+    kind, inner = token
+    if kind == "otel":
+        from opentelemetry import context as otel_context
+        otel_context.detach(inner)
+    else:
+        _current.reset(inner)
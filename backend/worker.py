@@ -16,9 +16,17 @@ if backend_dir not in sys.path:
     sys.path.insert(0, backend_dir)
 
 from celery import Celery
-from celery.signals import worker_ready
+from celery.signals import worker_init, worker_ready, before_task_publish, task_prerun, task_postrun, setup_logging
 from config import settings
+from services.metrics import QUEUE_WAIT_SECONDS, TASK_SECONDS, start_exporter
+from utils.log import bind_context, clear_context, configure_logging
+from utils import tracing
+from typing import Dict, Optional
 import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 # Create Celery app
 # Heroku Redis requires SSL cert verification disabled
@@ -62,18 +70,22 @@ celery_app.conf.update(
     result_serializer='json',
     accept_content=['json'],
     
-    # Task routing - route to specific queues
+    # Task routing - user-triggered work never queues behind the scheduler
     task_routes={
-        'tasks.process_video_replies': {'queue': 'celery'},
-        'tasks.reply_to_comments_batch': {'queue': 'celery'},
-        'tasks.sync_user_videos': {'queue': 'celery'},
-        'tasks.sync_replied_comments_cache': {'queue': 'celery'},
-        'tasks.process_auto_replies_all': {'queue': 'celery'},
-        'tasks.cleanup_old_results': {'queue': 'celery'},
+        'tasks.process_video_replies': {'queue': 'interactive'},
+        'tasks.sync_user_videos': {'queue': 'interactive'},
+        'tasks.reply_to_comments_batch': {'queue': 'interactive'},
+        'tasks.process_auto_replies_all': {'queue': 'scheduled'},
+        'tasks.process_scheduled_video': {'queue': 'scheduled'},
+        'tasks.aggregate_scheduled_results': {'queue': 'scheduled'},
+        'tasks.deliver_reply_outbox': {'queue': 'bulk'},
+        'tasks.sync_replied_comments_cache': {'queue': 'cache'},
+        'tasks.cleanup_old_results': {'queue': 'cache'},
     },
+    task_default_queue='bulk',
     
     # Performance settings
-    worker_prefetch_multiplier=1,  # Fair distribution
+    worker_prefetch_multiplier=1,  # Fair distribution (bulk workers raise it per process, see Procfile)
     task_acks_late=True,  # Reliability - ack only after completion
     worker_max_tasks_per_child=1000,  # Prevent memory leaks
     task_time_limit=600,  # 10 minute hard timeout
@@ -100,6 +112,87 @@ celery_app.conf.update(
 )
 
 
+# Queue topology - each queue gets its own worker process (see Procfile /
+# docker-compose) so a long scheduler tick can't delay user-triggered work.
+# latency_slo: seconds a task may wait between publish and start.
+QUEUES = {
+    'interactive': {'concurrency': 4, 'prefetch': 1, 'latency_slo': 5},
+    'scheduled': {'concurrency': 4, 'prefetch': 1, 'latency_slo': 60},
+    'bulk': {'concurrency': 2, 'prefetch': 4, 'latency_slo': 300},
+    'cache': {'concurrency': 1, 'prefetch': 4, 'latency_slo': 900},
+}
+
+
+@before_task_publish.connect
+def stamp_publish_time(headers=None, **kwargs):
+    """Record when a task was published so workers can measure queue wait,
+    and the trace it was published from
+    """
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+        traceparent = tracing.inject()
+        if traceparent:
+            headers.setdefault('traceparent', traceparent)
+
+
+def check_queue_latency(queue: str, published_at: Optional[float], task_name: str) -> Optional[float]:
+    """Log tasks that waited longer than their queue's SLO; returns the wait"""
+    if not published_at:
+        return None
+    waited = time.time() - float(published_at)
+    QUEUE_WAIT_SECONDS.observe(max(0.0, waited), queue=queue or 'unknown')
+    slo = QUEUES.get(queue, {}).get('latency_slo')
+    if slo is not None and waited > slo:
+        logger.warning("Queue SLO breach: %s waited %.1fs in '%s' (SLO %ss)", task_name, waited, queue, slo)
+    return waited
+
+
+# task_id -> perf_counter at start, for task duration metrics
+_task_started: Dict[str, float] = {}
+# task_id -> (trace token, open task span), closed in task_postrun
+_task_spans: Dict[str, tuple] = {}
+
+
+@task_prerun.connect
+def measure_queue_wait(task_id=None, task=None, **kwargs):
+    request = task.request
+    queue = (request.delivery_info or {}).get('routing_key')
+    check_queue_latency(queue, getattr(request, 'published_at', None), task.name)
+    _task_started[task_id] = time.perf_counter()
+    bind_context(task_id=task_id, task=task.name)
+    token = tracing.activate(getattr(request, 'traceparent', None))
+    task_span = tracing.span(f"task {task.name}", task_id=task_id, queue=queue)
+    task_span.__enter__()
+    _task_spans[task_id] = (token, task_span)
+    # Started lazily in whichever process runs tasks (prefork child or solo)
+    if settings.WORKER_METRICS_PORT:
+        start_exporter(settings.WORKER_METRICS_PORT)
+
+
+@task_postrun.connect
+def measure_task_duration(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_SECONDS.observe(time.perf_counter() - started, task=task.name, status=(state or 'UNKNOWN').lower())
+    entry = _task_spans.pop(task_id, None)
+    if entry is not None:
+        token, task_span = entry
+        task_span.__exit__(None, None, None)
+        tracing.deactivate(token)
+    clear_context()
+
+
+@setup_logging.connect
+def use_structured_logging(**kwargs):
+    """Replace Celery's logging setup with utils.log (JSON, sampled, queued)"""
+    configure_logging()
+
+
+@worker_init.connect
+def setup_tracing(**kwargs):
+    tracing.configure_tracing()
+
+
 @worker_ready.connect
 def at_start(sender, **kwargs):
     """Initialize database connections when worker starts"""
@@ -108,62 +201,25 @@ def at_start(sender, **kwargs):
     print(f"   PostgreSQL: {settings.USE_POSTGRES}")
 
 
-# Global event loop for Celery tasks
+# Event loop for Celery tasks - one per worker process, reused by every task
+# so the asyncpg worker pool (bound to the loop that created it) stays usable
 _celery_loop = None
 
 # Helper to run async functions in Celery tasks
 def run_async(async_func):
-    """Run async function in sync Celery task - reuses event loop"""
+    """Run async function in sync Celery task - reuses the process event loop
+    
+    Each call blocks until the coroutine finishes, so a prefork/solo child
+    runs one task at a time. The async worker runtime (async_worker.py)
+    runs many task coroutines concurrently on a single loop instead.
+    """
     global _celery_loop
-    import sys
-    import os
-    # Ensure backend directory is in path before running async code
-    backend_dir = os.path.dirname(os.path.abspath(__file__))
-    if backend_dir not in sys.path:
-        sys.path.insert(0, backend_dir)
     
-    # Reuse existing loop or create new one
-    try:
-        # Check for existing running loop first
-        try:
-            loop = asyncio.get_running_loop()
-        except RuntimeError:
-            loop = None
-            
-        if loop and loop.is_running():
-            # If we are already in a running loop, we can't use run_until_complete
-            # This happens in tests or if worker is async. 
-            # For sync tasks, we shouldn't be here, but if we are, create a task?
-            # But we need result synchronously.
-            # We can't block a running loop.
-            # This signals an architecture issue if it happens in prod.
-            # But for safety, we try to create a new loop in a separate thread if needed?
-            # For now, just rely on the global one if not running.
-            pass
-
-        if _celery_loop is None or _celery_loop.is_closed():
-            _celery_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(_celery_loop)
-        
-        return _celery_loop.run_until_complete(async_func)
-    except RuntimeError as e:
-        if "Cannot run the event loop while another loop is running" in str(e):
-             # Deep fallback: Just run the coroutine directly if we are in a loop?
-             # No, you can't await in sync function.
-             # Use a new thread to run the loop
-             import threading
-             result = []
-             def run_in_thread():
-                 new_loop = asyncio.new_event_loop()
-                 asyncio.set_event_loop(new_loop)
-                 result.append(new_loop.run_until_complete(async_func))
-                 new_loop.close()
-             
-             t = threading.Thread(target=run_in_thread)
-             t.start()
-             t.join()
-             return result[0]
-        raise e
+    if _celery_loop is None or _celery_loop.is_closed():
+        _celery_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_celery_loop)
+    
+    return _celery_loop.run_until_complete(async_func)
 
 
 if __name__ == '__main__':